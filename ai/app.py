@@ -5,117 +5,121 @@ Vietnamese Teacher AI Service
 Flask API server running on port 5003
 """
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from transformers import TextIteratorStreamer
+import json
+import logging
 import os
+import threading
+import time
+
+from cancellation import DEFAULT_SHARED_DIR, CancellationRegistry, deadline_from_timeout
+from chat_logger import AsyncChatLogger
+from generation_control import token_budget
+from generation_profiler import GenerationProfiler
+from model_manager import ModelManager
+from request_scheduler import PRIORITY_CLASSES, RequestScheduler, SchedulerRejected
+from startup import StartupReadiness
+from teacher_model import VietnameseTeacherAI
+from worker_memory import process_memory
+from worker_pool import ModelWorkerPool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-class VietnameseTeacherAI:
-    def __init__(self):
-        self.model = None
-        self.tokenizer = None
-        self.load_model()
-        
-    def load_model(self):
-        """Load trained model or base model"""
-        trained_model_path = "./vietnamese_teacher_trained"
-        
-        if os.path.exists(trained_model_path) and os.listdir(trained_model_path):
-            print("📦 Loading trained Vietnamese teacher model...")
-            model_path = trained_model_path
-        else:
-            print("📦 Loading base Vietnamese model...")
-            model_path = "NlpHUST/gpt2-vietnamese"
-        
-        try:
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                model_path,
-                use_fast=False,
-                trust_remote_code=True
-            )
-            
-            # Configure special tokens
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
-            
-            # Load model
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_path,
-                torch_dtype=torch.float32,
-                low_cpu_mem_usage=True,
-                trust_remote_code=True
-            )
-            
-            print("✅ Model loaded successfully!")
-            
-        except Exception as e:
-            print(f"❌ Error loading model: {e}")
-            self.model = None
-            self.tokenizer = None
-    
-    def generate_response(self, question):
-        """Generate teacher response for student question"""
-        if self.model is None or self.tokenizer is None:
-            return "Xin lỗi, AI giáo viên hiện tại không khả dụng."
-        
-        try:
-            # Format input as conversation
-            prompt = f"Học sinh: {question}\nGiáo viên:"
-            print(f"[PROMPT] {prompt}")
-
-            # Tokenize input
-            inputs = self.tokenizer.encode(prompt, return_tensors='pt')
-            print(f"[INPUT TOKENS] {inputs}")
-
-            # Add attention_mask to avoid inf/nan errors
-            attention_mask = torch.ones_like(inputs)
-
-            # Generate response
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    inputs,
-                    attention_mask=attention_mask,
-                    max_new_tokens=150,
-                    temperature=0.5,
-                    repetition_penalty=1.2,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    do_sample=True,
-                    top_p=0.8
-                )
-
-            # Decode response
-            full_response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            print(f"[FULL RESPONSE] {full_response}")
-
-            # Log lại prompt và response vào file log
-            with open("./ai_chat_log.txt", "a", encoding="utf-8") as logf:
-                logf.write(f"PROMPT: {prompt}\nRESPONSE: {full_response}\n{'-'*40}\n")
-
-            # Extract teacher response
-            if "Giáo viên:" in full_response:
-                teacher_response = full_response.split("Giáo viên:")[-1].strip()
-                # Clean up response
-                if "<|endoftext|>" in teacher_response:
-                    teacher_response = teacher_response.split("<|endoftext|>")[0].strip()
-                print(f"[TEACHER RESPONSE] {teacher_response}")
-                return teacher_response
-            else:
-                print("[TEACHER RESPONSE] Xin lỗi, tôi không hiểu câu hỏi của em.")
-                return "Xin lỗi, tôi không hiểu câu hỏi của em."
-                
-        except Exception as e:
-            import traceback
-            print(f"[ERROR] Error generating response: {e}")
-            traceback.print_exc()
-            return f"Xin lỗi, có lỗi xảy ra khi tạo phản hồi: {e}" 
+# Prompt/response log, written by a background thread
+chat_log = AsyncChatLogger("./ai_chat_log.txt")
+
+# Worker-pool mode: AI_POOL_REPLICAS model replicas, AI_POOL_THREADS torch threads each
+POOL_REPLICAS = int(os.getenv("AI_POOL_REPLICAS", "0"))
+POOL_THREADS = int(os.getenv("AI_POOL_THREADS", "0")) or None
+POOL_START_TIMEOUT = float(os.getenv("AI_POOL_START_TIMEOUT", "600"))
+
+# Cancel markers shared by every process on this host (gunicorn workers, pool replicas); "" = this process only
+CANCEL_DIR = os.getenv("AI_CANCEL_DIR", DEFAULT_SHARED_DIR) or None
+
+# Per-phase generation timings on /debug/profile (AI_PROFILE=1, single-process mode)
+profiler = GenerationProfiler(trace_dir=os.getenv("AI_PROFILE_DIR", "./profiles")) \
+    if os.getenv("AI_PROFILE", "0") == "1" and POOL_REPLICAS == 0 else None
+
+# Model loading runs in the background so the port binds immediately
+# (AI_EAGER_LOAD=1 loads before serving, e.g. in the gunicorn pre-fork master)
+readiness = StartupReadiness()
+EAGER_LOAD = os.getenv("AI_EAGER_LOAD", "0") == "1"
+
+def load_teacher(readiness):
+    readiness.enter('loading')
+    teacher = VietnameseTeacherAI(chat_log=chat_log, profiler=profiler)
+    if teacher.model is None:
+        raise RuntimeError("Model not loaded")
+    readiness.enter('warming')
+    teacher.warm_up()
+    model_manager.install(teacher)
+
+def wait_for_pool(readiness):
+    readiness.enter('loading')
+    deadline = time.monotonic() + POOL_START_TIMEOUT
+    while worker_pool.ready_count() < POOL_REPLICAS:
+        failed = worker_pool.failed_count()
+        if failed and worker_pool.ready_count() + failed >= POOL_REPLICAS:
+            raise RuntimeError(f"{failed}/{POOL_REPLICAS} model replicas failed to load")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Only {worker_pool.ready_count()}/{POOL_REPLICAS} model replicas "
+                               f"ready after {POOL_START_TIMEOUT:.0f}s")
+        time.sleep(0.2)
 
 # Initialize AI teacher
-vietnamese_teacher = VietnameseTeacherAI()
+if POOL_REPLICAS > 0:
+    worker_pool = ModelWorkerPool(POOL_REPLICAS, threads_per_replica=POOL_THREADS, chat_log=chat_log,
+                                  cancel_dir=CANCEL_DIR).start(wait=False)
+    model_manager = None
+    readiness.start(wait_for_pool, background=not EAGER_LOAD)
+else:
+    worker_pool = None
+    # Active model (plus optional A/B candidate), swappable at runtime via /admin/*
+    model_manager = ModelManager(
+        factory=lambda model_path: VietnameseTeacherAI(chat_log=chat_log, model_path=model_path, profiler=profiler),
+        # Answers cached from the previous model must not be replayed
+        on_change=lambda: semantic_cache.clear() if semantic_cache is not None else None
+    )
+    readiness.start(load_teacher, background=not EAGER_LOAD)
+
+# /admin/* is disabled unless AI_ADMIN_TOKEN is set; reload only loads checkpoints from AI_MODEL_DIRS
+ADMIN_TOKEN = os.getenv("AI_ADMIN_TOKEN", "")
+MODEL_DIRS = [os.path.realpath(path) for path in os.getenv(
+    "AI_MODEL_DIRS", "./vietnamese_teacher_trained,./vietnamese_teacher_pruned,./vietnamese_teacher_light"
+).split(",") if path.strip()]
+
+# Semantic answer cache in front of generation (AI_SEMANTIC_CACHE=1, needs numpy + sentence-transformers)
+if os.getenv("AI_SEMANTIC_CACHE", "0") == "1":
+    from semantic_cache import SemanticCache
+    semantic_cache = SemanticCache(
+        cache_dir=os.getenv("AI_CACHE_DIR", "./semantic_cache"),
+        threshold=float(os.getenv("AI_CACHE_THRESHOLD", "0.86")),
+        max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000"))
+    )
+else:
+    semantic_cache = None
+
+# In-flight generations, cancellable via /chat/cancel, a dropped stream or X-Request-Timeout-Ms
+cancellations = CancellationRegistry(shared_dir=CANCEL_DIR)
+
+# Priority (voice > interactive > bulk) + earliest-deadline-first queue in front of the model
+scheduler = RequestScheduler(concurrency=int(os.getenv("AI_SCHED_CONCURRENCY", "0")) or max(POOL_REPLICAS, 1))
+
+def request_priority(data):
+    priority_class = data.get('priority') or request.headers.get('X-Priority') or 'interactive'
+    return priority_class if priority_class in PRIORITY_CLASSES else 'interactive'
+
+def current_teacher():
+    return model_manager.active.teacher if model_manager.active else None
+
+def model_loaded():
+    return readiness.ready
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -127,51 +131,293 @@ def chat():
             return jsonify({'error': 'Missing message field'}), 400
         
         user_message = data['message']
+
+        if not readiness.ready:
+            return jsonify({
+                'error': 'Model is still loading',
+                'response': 'Cô đang chuẩn bị bài giảng, em đợi một chút rồi hỏi lại nhé!'
+            }), 503
+
+        priority_class = request_priority(data)
+        # Only the client's time budget: requests without one are never cancelled or rejected for time
+        deadline = deadline_from_timeout(request.headers.get('X-Request-Timeout-Ms'))
+        if deadline is not None and deadline <= time.time():
+            return jsonify({'error': 'Request deadline already passed'}), 504
         
-        # Generate AI response
-        ai_response = vietnamese_teacher.generate_response(user_message)
+        with cancellations.track(request.headers.get('X-Request-Id'), deadline) as cancel:
+            # Generate AI response (pool replicas see the cancel through CANCEL_DIR)
+            if worker_pool is not None:
+                model_generate = lambda message: worker_pool.generate_response(message, cancel=cancel)
+            else:
+                model_generate = lambda message: model_manager.generate_response(message, cancel=cancel)
+            # Cache hits skip the queue; misses wait for a model slot
+            generate = lambda message: scheduler.submit(
+                lambda: model_generate(message), priority_class,
+                tokens=token_budget(message)[1], deadline=deadline, cancel=cancel
+            )
+            try:
+                if semantic_cache is not None:
+                    # Error/fallback messages all start with "Xin lỗi" and must not be cached, nor cut-off answers
+                    ai_response = semantic_cache.get_or_generate(
+                        user_message, generate,
+                        cacheable=lambda answer: not answer.startswith("Xin lỗi") and not cancel.cancelled
+                    )
+                else:
+                    ai_response = generate(user_message)
+            except SchedulerRejected:
+                # Cancelled (or out of time) while still queued: answered like a running request below
+                if not cancel.cancelled:
+                    raise
+
+            if cancel.cancelled:
+                return jsonify({
+                    'error': 'Request cancelled',
+                    'reason': cancel.reason,
+                    'request_id': cancel.request_id
+                }), (504 if cancel.reason == 'deadline' else 499)
         
         return jsonify({
             'response': ai_response,
             'status': 'success'
         })
         
+    except SchedulerRejected as e:
+        response = jsonify({'error': 'Server busy', 'reason': e.reason})
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(max(1, int(e.retry_after)))
+        return response, 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the answer as server-sent events; generation stops if the client disconnects"""
+    data = request.get_json(silent=True)
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Missing message field'}), 400
+    if model_manager is None:
+        return jsonify({'error': 'Streaming is not available in worker-pool mode'}), 400
+    if not readiness.ready:
+        return jsonify({'error': 'Model is still loading'}), 503
+
+    user_message = data['message']
+    request_id = request.headers.get('X-Request-Id')
+    priority_class = request_priority(data)
+    deadline = deadline_from_timeout(request.headers.get('X-Request-Timeout-Ms'))
+
+    def events():
+        with cancellations.track(request_id, deadline) as cancel:
+            try:
+                with scheduler.slot(priority_class, token_budget(user_message)[1], deadline, cancel) as ticket:
+                    yield from stream_answer(user_message, cancel)
+                    ticket.generated = cancel.tokens_generated
+            except SchedulerRejected as e:
+                if cancel.cancelled:
+                    yield f"data: {json.dumps({'error': 'Request cancelled', 'cancelled': cancel.reason, 'done': True})}\n\n"
+                else:
+                    yield f"data: {json.dumps({'error': 'Server busy', 'reason': e.reason, 'done': True})}\n\n"
+
+    return Response(events(), mimetype='text/event-stream')
+
+def stream_answer(user_message, cancel):
+    """Server-sent events for one answer; decoding stops if the client disconnects"""
+    with model_manager.acquire() as slot:
+        streamer = TextIteratorStreamer(slot.teacher.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+
+        def run():
+            try:
+                result['response'] = slot.teacher.generate_response(user_message, cancel=cancel, streamer=streamer)
+            finally:
+                # The speculative path never feeds the streamer
+                streamer.end()
+
+        worker = threading.Thread(target=run, name=f"stream-{cancel.request_id}", daemon=True)
+        worker.start()
+        try:
+            yield f"data: {json.dumps({'request_id': cancel.request_id})}\n\n"
+            for chunk in streamer:
+                if chunk:
+                    yield f"data: {json.dumps({'token': chunk}, ensure_ascii=False)}\n\n"
+        except GeneratorExit:
+            # Client went away: stop decoding at the next step
+            cancel.cancel('client')
+            raise
+        finally:
+            worker.join()
+
+        final = {'response': result.get('response', ''), 'done': True}
+        if cancel.cancelled:
+            final['cancelled'] = cancel.reason
+        yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+
+@app.route('/chat/cancel', methods=['POST'])
+def chat_cancel():
+    """Cancel an in-flight generation by X-Request-Id"""
+    data = request.get_json(silent=True) or {}
+    if not cancellations.cancel(data.get('request_id'), reason='upstream'):
+        return jsonify({'error': 'No such in-flight request'}), 404
+    return jsonify({'status': 'cancelled', 'request_id': data['request_id']})
+
+@app.route('/queue', methods=['GET'])
+def queue_state():
+    """Scheduler queue depth, throughput and backlog (for autoscaling)"""
+    return jsonify(scheduler.state())
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness: the process is up and serving HTTP"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: the model is loaded and warmed up"""
+    return jsonify(readiness.status()), (200 if readiness.ready else 503)
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     trained_model_exists = os.path.exists("./vietnamese_teacher_trained")
-    return jsonify({
-        'status': 'healthy',
-        'model_loaded': vietnamese_teacher.model is not None,
-        'trained_model_available': trained_model_exists
-    })
+    status = {
+        'status': 'healthy' if readiness.ready else ('unhealthy' if readiness.phase == 'failed' else 'starting'),
+        'live': True,
+        'ready': readiness.ready,
+        'startup': readiness.status(),
+        'model_loaded': model_loaded(),
+        'trained_model_available': trained_model_exists,
+        'chat_log': chat_log.stats(),
+        'cancellation': cancellations.stats()
+    }
+    if os.path.exists("/proc/self/smaps_rollup"):
+        status['process_memory'] = process_memory(os.getpid())
+    if semantic_cache is not None:
+        status['semantic_cache'] = semantic_cache.stats()
+    if worker_pool is not None:
+        status['worker_pool'] = worker_pool.stats()
+    elif current_teacher() is not None:
+        teacher = current_teacher()
+        status['decode_stats'] = teacher.decode_stats.summary()
+        status['tokenizer'] = dict(teacher.tokenizer.cache_stats(), fast=teacher.tokenizer.is_fast)
+        if teacher.speculative is not None:
+            status['speculative'] = teacher.speculative.stats()
+        status['models'] = model_manager.status()
+    return jsonify(status)
 
 @app.route('/model-info', methods=['GET'])
 def model_info():
     """Get model information"""
-    if vietnamese_teacher.model is None:
+    if worker_pool is not None:
+        return jsonify({'error': 'Model info is not available in worker-pool mode'}), 400
+    teacher = current_teacher()
+    if teacher is None or teacher.model is None:
         return jsonify({'error': 'Model not loaded'}), 500
     
-    trained_model_path = "./vietnamese_teacher_trained"
-    model_type = "trained" if os.path.exists(trained_model_path) and os.listdir(trained_model_path) else "base"
+    model_type = "base" if teacher.model_path == "NlpHUST/gpt2-vietnamese" else "trained"
     
     return jsonify({
         'model_type': model_type,
         'model_name': 'NlpHUST/gpt2-vietnamese',
-        'parameters': vietnamese_teacher.model.num_parameters(),
-        'vocab_size': len(vietnamese_teacher.tokenizer)
+        'model_path': teacher.model_path,
+        'backend': teacher.backend_name,
+        'parameters': teacher.backend.num_parameters(),
+        'vocab_size': len(teacher.tokenizer)
     })
 
+def admin_allowed():
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+def model_path_allowed(model_path):
+    """Checkpoints load with trust_remote_code, so only allow-listed directories (or their subdirectories)"""
+    path = os.path.realpath(model_path)
+    return any(path == root or path.startswith(root + os.sep) for root in MODEL_DIRS)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Load a new checkpoint in the background, then swap it in (or A/B split with traffic_percent)"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if model_manager is None:
+        return jsonify({'error': 'Hot reload is not available in worker-pool mode'}), 400
+
+    data = request.get_json(silent=True) or {}
+    model_path = data.get('model_path', './vietnamese_teacher_trained')
+    if not isinstance(model_path, str) or not model_path_allowed(model_path):
+        return jsonify({'error': 'model_path must be inside one of AI_MODEL_DIRS'}), 400
+    if not os.path.exists(model_path):
+        return jsonify({'error': f'Model path not found: {model_path}'}), 400
+
+    try:
+        started = model_manager.reload(model_path, traffic_percent=data.get('traffic_percent'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not started:
+        return jsonify({'error': 'A reload is already in progress'}), 409
+    return jsonify({'status': 'loading', 'model_path': model_path}), 202
+
+@app.route('/admin/traffic', methods=['POST'])
+def admin_traffic():
+    """Change the share of requests served by the candidate model"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if model_manager is None:
+        return jsonify({'error': 'Not available in worker-pool mode'}), 400
+    data = request.get_json(silent=True) or {}
+    try:
+        model_manager.set_traffic(float(data.get('traffic_percent', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'traffic_percent must be a number'}), 400
+    return jsonify(model_manager.status())
+
+@app.route('/admin/promote', methods=['POST'])
+def admin_promote():
+    """Make the A/B candidate the active model"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if model_manager is None or not model_manager.promote():
+        return jsonify({'error': 'No candidate model'}), 400
+    return jsonify(model_manager.status())
+
+@app.route('/admin/rollback', methods=['POST'])
+def admin_rollback():
+    """Stop serving the A/B candidate"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if model_manager is None or not model_manager.rollback():
+        return jsonify({'error': 'No candidate model'}), 400
+    return jsonify(model_manager.status())
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if model_manager is None:
+        return jsonify({'error': 'Not available in worker-pool mode'}), 400
+    return jsonify(model_manager.status())
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Per-phase generation timings: histograms and the most recent requests"""
+    if profiler is None:
+        return jsonify({'error': 'Profiling is disabled (set AI_PROFILE=1)'}), 400
+    return jsonify(profiler.summary())
+
+@app.route('/debug/profile/trace', methods=['POST'])
+def debug_profile_trace():
+    """Capture a torch.profiler trace of the next chat request"""
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if profiler is None:
+        return jsonify({'error': 'Profiling is disabled (set AI_PROFILE=1)'}), 400
+    profiler.capture_next_trace()
+    return jsonify({'status': 'armed', 'trace_dir': profiler.trace_dir}), 202
+
 if __name__ == '__main__':
     print("🇻🇳 Vietnamese Teacher AI Service")
     print("🚀 Starting server on port 5003...")
     
-    if vietnamese_teacher.model is None:
-        print("⚠️  Warning: Model not loaded properly")
-    else:
+    if model_loaded():
         print("✅ AI Teacher ready to help!")
+    else:
+        print("⏳ Model is loading in the background, see /health/ready")
     
     app.run(host='0.0.0.0', port=5002, debug=False)
\ No newline at end of file
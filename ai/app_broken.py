@@ -3,6 +3,8 @@ import os
 import logging
 import random
 
+from intent_matcher import IntentMatcher
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,12 +14,25 @@ app = Flask(__name__)
 # Simplified Vietnamese Tutor AI without heavy dependencies
 # We'll use rule-based responses until model dependencies are resolved
 
+# Intent -> trigger keywords; the first match in this order wins
+RULE_INTENTS = {
+    'greeting': ['xin chào', 'hello', 'hi', 'chào', 'chào bạn'],
+    'thanks': ['cảm ơn', 'cám ơn', 'thank you', 'thanks'],
+    'complaint': ['ngu ngốc', 'stupid', 'tệ', 'xấu', 'không tốt', 'bad', 'phản hồi'],
+    'learning': ['học', 'learn', 'study', 'dạy', 'teach'],
+    'pronunciation': ['phát âm', 'pronunciation', 'thanh điệu', 'tone'],
+    'vocabulary': ['từ vựng', 'vocabulary', 'từ', 'word'],
+    'numbers': ['số', 'number', 'đếm', 'count'],
+    'culture': ['văn hóa', 'culture', 'truyền thống', 'tradition'],
+}
+RULE_MATCHER = IntentMatcher(RULE_INTENTS)
+
 def generate_intelligent_response(user_input):
     """Generate intelligent Vietnamese tutoring responses"""
-    user_lower = user_input.lower().strip()
+    intent = RULE_MATCHER.first(user_input.strip())
     
     # Vietnamese greetings
-    if any(word in user_lower for word in ['xin chào', 'hello', 'hi', 'chào', 'chào bạn']):
+    if intent == 'greeting':
         responses = [
             "Xin chào! Tôi là AI gia sư tiếng Việt của bạn. Tôi có thể giúp bạn học:\n• Từ vựng và ngữ pháp\n• Phát âm chuẩn\n• Văn hóa Việt Nam\n• Giao tiếp hàng ngày\n\nBạn muốn bắt đầu học gì?",
             "Chào bạn! Rất vui được gặp bạn. Hôm nay chúng ta sẽ cùng khám phá tiếng Việt nhé! Bạn đã biết những từ tiếng Việt nào chưa?"
@@ -25,7 +40,7 @@ def generate_intelligent_response(user_input):
         return random.choice(responses)
     
     # Thanks responses
-    elif any(word in user_lower for word in ['cảm ơn', 'cám ơn', 'thank you', 'thanks']):
+    elif intent == 'thanks':
         responses = [
             "Rất vui được giúp bạn! 😊 Học tiếng Việt cần kiên nhẫn, nhưng tôi tin bạn sẽ thành công. Còn gì khác tôi có thể giúp không?",
             "Không có gì! Đó là niềm vui của tôi. Bạn có muốn học thêm cách nói 'cảm ơn' trong các tình huống khác nhau không?"
@@ -33,27 +48,27 @@ def generate_intelligent_response(user_input):
         return random.choice(responses)
     
     # Handle complaints/negative feedback
-    elif any(word in user_lower for word in ['ngu ngốc', 'stupid', 'tệ', 'xấu', 'không tốt', 'bad', 'phản hồi']):
+    elif intent == 'complaint':
         return "Xin lỗi bạn rất nhiều! 🙏 Tôi thực sự muốn cải thiện để giúp bạn học tốt hơn.\n\nHãy cho tôi biết:\n• Bạn muốn học chủ đề gì?\n• Tôi có thể giải thích rõ hơn điều gì?\n• Bạn cần hỗ trợ gì cụ thể?\n\nTôi sẽ cố gắng phản hồi chính xác và hữu ích hơn!"
     
     # Learning topics
-    elif any(word in user_lower for word in ['học', 'learn', 'study', 'dạy', 'teach']):
+    elif intent == 'learning':
         return "Tuyệt vời! Bạn muốn học tiếng Việt. Chúng ta có thể bắt đầu với:\n\n🗣️ **Phát âm cơ bản:**\n- 6 thanh điệu tiếng Việt\n- Cách phát âm đúng\n\n📚 **Từ vựng thiết yếu:**\n- Chào hỏi và giới thiệu\n- Số đếm và thời gian\n- Gia đình và công việc\n\n🎭 **Văn hóa và giao tiếp:**\n- Phép lịch sự Việt Nam\n- Cách xưng hô phù hợp\n\nBạn muốn bắt đầu từ đâu?"
     
     # Pronunciation
-    elif any(word in user_lower for word in ['phát âm', 'pronunciation', 'thanh điệu', 'tone']):
+    elif intent == 'pronunciation':
         return "Tiếng Việt có 6 thanh điệu quan trọng:\n\n1. **Thanh ngang** (không dấu): ma\n2. **Thanh huyền** (dấu `): mà  \n3. **Thanh sắc** (dấu ´): má\n4. **Thanh hỏi** (dấu ?): mả\n5. **Thanh ngã** (dấu ~): mã\n6. **Thanh nặng** (dấu .): mạ\n\n💡 **Mẹo nhớ:** Hãy thử phát âm 6 từ này - chúng có nghĩa hoàn toàn khác nhau:\n- ma (ghost) - mà (but) - má (cheek) - mả (grave) - mã (code) - mạ (rice seedling)\n\nBạn thử phát âm xem sao?"
     
     # Vocabulary
-    elif any(word in user_lower for word in ['từ vựng', 'vocabulary', 'từ', 'word']):
+    elif intent == 'vocabulary':
         return "Hãy học từ vựng cơ bản theo chủ đề:\n\n👨‍👩‍👧‍👦 **Gia đình:**\n- Bố/Cha = Father\n- Mẹ/Má = Mother\n- Anh = Older brother\n- Chị = Older sister\n- Em = Younger sibling\n\n🍜 **Đồ ăn phổ biến:**\n- Cơm = Rice\n- Phở = Pho soup\n- Bánh mì = Vietnamese sandwich\n- Chả cá = Grilled fish\n- Cà phê = Coffee\n\nBạn muốn học chủ đề nào khác?"
     
     # Numbers
-    elif any(word in user_lower for word in ['số', 'number', 'đếm', 'count']):
+    elif intent == 'numbers':
         return "Học đếm số tiếng Việt:\n\n**Số cơ bản 1-10:**\n1️⃣ Một (mohdt)\n2️⃣ Hai (high)\n3️⃣ Ba (bah)\n4️⃣ Bốn (bohn)\n5️⃣ Năm (nahm)\n6️⃣ Sáu (shah-oo)\n7️⃣ Bảy (by)\n8️⃣ Tám (tahm)\n9️⃣ Chín (cheen)\n🔟 Mười (moo-uhr-ee)\n\n**Số lớn:**\n- 100 = Một trăm\n- 1000 = Một ngàn\n- 10000 = Một vạn\n\nBạn thử đếm từ 1-10 xem!"
     
     # Culture
-    elif any(word in user_lower for word in ['văn hóa', 'culture', 'truyền thống', 'tradition']):
+    elif intent == 'culture':
         return "Văn hóa Việt Nam thật phong phú! 🇻🇳\n\n🎭 **Đặc trưng văn hóa:**\n- Tôn trọng người lớn tuổi\n- Gia đình là trung tâm\n- Hiếu khách và thân thiện\n- Trọng nghĩa tình\n\n🎊 **Lễ hội truyền thống:**\n- Tết Nguyên Đán (Lunar New Year)\n- Tết Trung Thu (Mid-Autumn Festival)\n- Lễ Vu Lan (Ghost Festival)\n\n🍜 **Ẩm thực đặc sắc:**\n- Phở, Bún Bò Huế, Cơm Tấm\n- Bánh Mì, Chả Cá, Nem Nướng\n\nBạn muốn tìm hiểu về khía cạnh nào?"
     
     # Default intelligent response
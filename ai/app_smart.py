@@ -7,6 +7,9 @@ from transformers import AutoTokenizer, AutoModelForCausalLM
 import json
 import random
 
+from intent_matcher import IntentMatcher
+from tutor_intents import EXAMPLE_INTENTS, USER_INTENTS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,10 +19,11 @@ CORS(app)
 
 # Load teacher examples
 TEACHER_EXAMPLES = []
+EXAMPLES_BY_INTENT = {}
 
 def load_teacher_examples():
     """Load our teacher conversation examples"""
-    global TEACHER_EXAMPLES
+    global TEACHER_EXAMPLES, EXAMPLES_BY_INTENT
     
     try:
         with open('premium_teacher_data.txt', 'r', encoding='utf-8') as f:
@@ -44,31 +48,20 @@ def load_teacher_examples():
             
             i += 1
         
+        # Intent -> examples, matched once here instead of on every request
+        EXAMPLES_BY_INTENT = EXAMPLE_MATCHER.index(TEACHER_EXAMPLES, lambda ex: ex['student'])
         logger.info(f"Loaded {len(TEACHER_EXAMPLES)} teacher examples")
     except Exception as e:
         logger.error(f"Error loading teacher examples: {e}")
 
+USER_MATCHER = IntentMatcher(USER_INTENTS)
+EXAMPLE_MATCHER = IntentMatcher(EXAMPLE_INTENTS)
+
 def find_best_response(user_input):
     """Find the best teacher response based on context"""
-    user_lower = user_input.lower()
-    
-    # Keyword categories with responses
-    if any(word in user_lower for word in ['xin chào', 'chào', 'hello']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'chào' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['phát âm', 'thanh điệu', 'âm']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if any(w in ex['student'].lower() for w in ['phát âm', 'thanh'])]
-    elif any(word in user_lower for word in ['từ vựng', 'vocabulary', 'từ']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'từ vựng' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['anh', 'chị', 'em', 'xưng hô']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if any(w in ex['student'].lower() for w in ['anh', 'chị', 'em'])]
-    elif any(word in user_lower for word in ['động từ', 'verb']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'động từ' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['văn hóa', 'culture']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'văn hóa' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['đọc', 'sách']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'đọc' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['nói', 'speaking', 'ngại']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'nói' in ex['student'].lower()]
+    intent = USER_MATCHER.first(user_input)
+    if intent:
+        responses = [ex['teacher'] for ex in EXAMPLES_BY_INTENT.get(intent, [])]
     else:
         # Default to a random appropriate response
         responses = [ex['teacher'] for ex in TEACHER_EXAMPLES]
@@ -132,4 +125,4 @@ def health():
 
 if __name__ == '__main__':
     logger.info("Starting Smart Vietnamese Tutor Service...")
-    app.run(host='0.0.0.0', port=5002, debug=False)
+    app.run(host='0.0.0.0', port=int(os.getenv("PORT", "5002")), debug=False)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark PhoGPT attention: attn_impl torch vs sdpa on CPU
+Prefill (s x s, causal + ALiBi) and one decode step against a cache of s,
+with PhoGPT-4B shapes (24 heads x 128). Reports latency and peak RSS growth.
+Usage: HF_HUB_OFFLINE=1 python benchmark_attention.py [seq_len ...]
+"""
+
+import statistics
+import sys
+import time
+
+import torch
+
+from generation_profiler import _proc_status_kb, _reset_peak_rss
+from phogpt_loader import load_attention_module, load_phogpt_config
+
+REPEATS = 5
+
+
+def measure(fn, repeats=REPEATS):
+    """(median ms, peak RSS growth in MB) of fn()"""
+    fn()
+    rss_before = _proc_status_kb("VmRSS")
+    _reset_peak_rss()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    peak = _proc_status_kb("VmHWM")
+    growth = (peak - rss_before) / 1024 if peak is not None and rss_before is not None else float('nan')
+    return statistics.median(times), growth
+
+
+def past_for(attn_impl, k, v, n_heads):
+    """KV cache in the layout each implementation keeps (sdpa: b s (h d), like flash)"""
+    if attn_impl != 'torch':
+        return (k, v)
+    k = k.view(k.size(0), k.size(1), n_heads, -1).transpose(1, 2)
+    v = v.view(v.size(0), v.size(1), n_heads, -1).transpose(1, 2)
+    return (k.transpose(2, 3).contiguous(), v.contiguous())
+
+
+if __name__ == "__main__":
+    seq_lens = [int(a) for a in sys.argv[1:]] or [128, 256, 512, 1024, 2048]
+    attention = load_attention_module()
+    config = load_phogpt_config()
+    n_heads, d_model = config.n_heads, config.d_model
+    alibi_bias_max = config.attn_config['alibi_bias_max']
+    impls = {'torch': attention.scaled_multihead_dot_product_attention, 'sdpa': attention.sdpa_attn_fn}
+    torch.manual_seed(0)
+
+    print(f"⏱️  n_heads={n_heads} d_model={d_model} threads={torch.get_num_threads()}")
+    print(f"{'seq':>6} {'impl':>6} {'prefill ms':>11} {'prefill MB':>11} {'decode ms':>10} {'decode MB':>10}")
+    for s in seq_lens:
+        x = [torch.randn(1, s, d_model) for _ in range(3)]
+        step = [torch.randn(1, 1, d_model) for _ in range(3)]
+        bias_shape = attention.attn_bias_shape('sdpa', n_heads, s + 1, True, False, True, False)
+        attn_bias = attention.build_attn_bias('sdpa', torch.zeros(bias_shape), n_heads, s + 1, causal=True, alibi=True, alibi_bias_max=alibi_bias_max)
+        outputs = {}
+        for name, fn in impls.items():
+            past = past_for(name, x[1], x[2], n_heads)
+            prefill = lambda: fn(*x, n_heads, n_heads, attn_bias=attn_bias, is_causal=True)
+            decode = lambda: fn(*step, n_heads, n_heads, past_key_value=past, attn_bias=attn_bias, is_causal=True)
+            with torch.no_grad():
+                prefill_ms, prefill_mb = measure(prefill)
+                decode_ms, decode_mb = measure(decode)
+                outputs[name] = prefill()[0]
+            print(f"{s:>6} {name:>6} {prefill_ms:>11.2f} {prefill_mb:>11.1f} {decode_ms:>10.3f} {decode_mb:>10.1f}")
+        diff = (outputs['torch'] - outputs['sdpa']).abs().max().item()
+        print(f"{'':>6} max |torch - sdpa| = {diff:.2e}")
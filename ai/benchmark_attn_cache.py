@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Count tensor allocations per generated token in the PhoGPT attention path,
+with the ALiBi bias / causal mask cache off (MPT_ATTN_CACHE=0) and on
+A decode step rebuilds the ALiBi bias and runs attention over the cache;
+prefill also builds the causal mask.
+Usage: HF_HUB_OFFLINE=1 python benchmark_attn_cache.py [prompt_len] [new_tokens]
+"""
+
+import sys
+import time
+
+import torch
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_flatten
+
+from phogpt_loader import load_attention_module, load_phogpt_config
+
+
+class AllocationCounter(TorchDispatchMode):
+    """Counts op outputs that live in new storage (views and in-place results are free)"""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.bytes = 0
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        inputs = {t.untyped_storage().data_ptr() for t in tree_flatten((args, kwargs))[0] if isinstance(t, torch.Tensor)}
+        for t in tree_flatten(out)[0]:
+            if isinstance(t, torch.Tensor) and t.untyped_storage().data_ptr() not in inputs:
+                self.count += 1
+                self.bytes += t.untyped_storage().nbytes()
+        return out
+
+
+def simulate(attention, impl, n_heads, d_model, alibi_bias_max, prompt_len, new_tokens):
+    """(prefill allocations, decode allocations per token, decode bytes per token, ms per token)"""
+    attn_fn = attention.sdpa_attn_fn if impl == 'sdpa' else attention.scaled_multihead_dot_product_attention
+    prompt = [torch.randn(1, prompt_len, d_model) for _ in range(3)]
+    steps = [[torch.randn(1, 1, d_model) for _ in range(3)] for _ in range(new_tokens)]
+    bias = lambda s: attention.build_alibi_bias(n_heads, s, alibi_bias_max=alibi_bias_max, dtype=torch.float32)
+
+    with torch.no_grad():
+        with AllocationCounter() as prefill:
+            _, _, past = attn_fn(*prompt, n_heads, n_heads, past_key_value=(), attn_bias=bias(prompt_len), is_causal=True)
+        with AllocationCounter() as decode:
+            start = time.perf_counter()
+            for t, step in enumerate(steps):
+                _, _, past = attn_fn(*step, n_heads, n_heads, past_key_value=past, attn_bias=bias(prompt_len + t + 1), is_causal=True)
+            elapsed = time.perf_counter() - start
+    return prefill.count, decode.count / new_tokens, decode.bytes / new_tokens, elapsed * 1000 / new_tokens
+
+
+if __name__ == "__main__":
+    prompt_len = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    new_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    attention = load_attention_module()
+    config = load_phogpt_config()
+    n_heads, d_model = config.n_heads, config.d_model
+
+    print(f"⏱️  prompt={prompt_len} new_tokens={new_tokens} (one attention layer)")
+    for impl in ('torch', 'sdpa'):
+        for enabled in (False, True):
+            attention.ATTN_CACHE_ENABLED = enabled
+            attention.clear_attn_caches()
+            prefill, per_token, bytes_per_token, ms = simulate(
+                attention, impl, n_heads, d_model, config.attn_config['alibi_bias_max'], prompt_len, new_tokens
+            )
+            label = "cache on " if enabled else "cache off"
+            print(f"   {impl:>5} {label}: prefill {prefill:>3} allocs | "
+                  f"decode {per_token:5.1f} allocs/token, {bytes_per_token / 1024:8.1f} KB/token, {ms:.3f} ms/token")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark inference backends (tokens/sec) on tutoring prompts
+Usage: python benchmark_backends.py [model_dir] [onnx_dir]
+"""
+
+import sys
+import time
+
+import torch
+from transformers import AutoTokenizer
+
+from export_onnx import PARITY_PROMPTS, TRAINED_MODEL_PATH
+from inference_backends import DEFAULT_ONNX_DIR, create_backend
+
+
+def benchmark(backend, tokenizer, max_new_tokens=100, warmup=1):
+    """Return generated tokens per second over the prompt set"""
+    encoded = [tokenizer.encode(prompt, return_tensors="pt") for prompt in PARITY_PROMPTS]
+
+    def run(inputs):
+        return backend.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+
+    for inputs in encoded[:warmup]:
+        run(inputs)
+
+    generated_tokens = 0
+    start = time.perf_counter()
+    for inputs in encoded:
+        outputs = run(inputs)
+        generated_tokens += outputs.shape[1] - inputs.shape[1]
+    elapsed = time.perf_counter() - start
+
+    return generated_tokens / elapsed, generated_tokens, elapsed
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else TRAINED_MODEL_PATH
+    onnx_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_ONNX_DIR
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=False, trust_remote_code=True)
+    results = {}
+
+    for name, kwargs in [("torch", {}), ("onnx", {"onnx_dir": onnx_dir})]:
+        print(f"📦 Loading {name} backend...")
+        backend = create_backend(name, model_path, **kwargs)
+        tokens_per_sec, tokens, elapsed = benchmark(backend, tokenizer)
+        results[name] = tokens_per_sec
+        print(f"⏱️  {name}: {tokens} tokens in {elapsed:.2f}s -> {tokens_per_sec:.1f} tokens/sec")
+        del backend
+
+    print("\n" + "=" * 50)
+    print(f"🚀 ONNX Runtime speedup: {results['onnx'] / results['torch']:.2f}x")
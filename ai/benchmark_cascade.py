@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sequential fallback vs hedged cascade on mock providers (offline)
+- Primary: usually fast, but a few calls stall (10x latency) or fail
+- Secondary: a little slower, used as the fallback
+Reports latency percentiles and the extra provider calls hedging costs.
+Usage: python benchmark_cascade.py [requests] [primary_ms] [secondary_ms] [failure_rate]
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import time
+
+from provider_cascade import HedgedCascade, Provider, mock_provider
+
+TIMEOUT = 5.0
+CONCURRENCY = 20
+STALL_RATE = 0.08
+
+logging.getLogger("provider_cascade").setLevel(logging.ERROR)
+
+
+def make_providers(primary_ms, secondary_ms, failure_rate):
+    return [
+        Provider("openai", mock_provider("openai", primary_ms, failure_rate, jitter=0.2, stall_rate=STALL_RATE), TIMEOUT),
+        Provider("cohere", mock_provider("cohere", secondary_ms, failure_rate, jitter=0.2), TIMEOUT),
+    ]
+
+
+async def sequential(providers, message):
+    """The previous behaviour: each provider in turn until one answers"""
+    for provider in providers:
+        answer = await provider.call(message)
+        if answer:
+            return answer, provider.name
+    return None, None
+
+
+async def measure(run, n):
+    latencies, failures = [], 0
+
+    async def one(i):
+        nonlocal failures
+        start = time.perf_counter()
+        answer, _ = await run(f"câu hỏi {i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+        failures += answer is None
+
+    for batch in range(0, n, CONCURRENCY):
+        await asyncio.gather(*(one(i) for i in range(batch, min(n, batch + CONCURRENCY))))
+    latencies.sort()
+    pct = lambda p: latencies[int(p * (len(latencies) - 1))]
+    return statistics.mean(latencies), pct(0.5), pct(0.95), pct(0.99), failures
+
+
+async def main(n, primary_ms, secondary_ms, failure_rate):
+    print(f"⏱️  {n} requests, primary {primary_ms:.0f} ms (stalls {STALL_RATE:.0%}, "
+          f"failure {failure_rate:.0%}), "
+          f"secondary {secondary_ms:.0f} ms, timeout {TIMEOUT:.0f}s")
+    print(f"{'mode':>11} {'mean':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'failed':>7} {'calls/req':>10}")
+
+    providers = make_providers(primary_ms, secondary_ms, failure_rate)
+    mean, p50, p95, p99, failed = await measure(lambda m: sequential(providers, m), n)
+    calls = sum(p.calls for p in providers) / n
+    print(f"{'sequential':>11} {mean:>7.0f} {p50:>7.0f} {p95:>7.0f} {p99:>7.0f} {failed:>7} {calls:>10.2f}")
+
+    providers = make_providers(primary_ms, secondary_ms, failure_rate)
+    cascade = HedgedCascade(providers)
+    await measure(cascade.run, 40)     # warm-up: p95 estimates for the hedge delay
+    for p in providers:
+        p.calls = 0
+    hedged_before = cascade.hedged
+    mean, p50, p95, p99, failed = await measure(cascade.run, n)
+    calls = sum(p.calls for p in providers) / n
+    print(f"{'hedged':>11} {mean:>7.0f} {p50:>7.0f} {p95:>7.0f} {p99:>7.0f} {failed:>7} {calls:>10.2f}")
+    print(f"📈 Hedge delay {cascade.hedge_delay(providers[0]) * 1000:.0f} ms (primary p95), "
+          f"hedged {cascade.hedged - hedged_before}/{n}, cancelled {sum(p.cancelled for p in providers)}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    primary_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+    secondary_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 300
+    failure_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.05
+    asyncio.run(main(n, primary_ms, secondary_ms, failure_rate))
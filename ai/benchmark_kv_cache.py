@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-token decode latency of PhoGPT with a growing KV cache (torch.cat every
+step) vs the preallocated StaticKVCache (written in place, read as views)
+- Greedy decode for 1..N tokens (default 2048), attn_impl sdpa
+- Prints the latency curve at powers of two and checks both produce the same tokens
+Usage: HF_HUB_OFFLINE=1 python benchmark_kv_cache.py [new_tokens] [prompt]
+"""
+
+import statistics
+import sys
+import time
+
+import torch
+
+from fast_tokenizer import load_tokenizer
+from phogpt_loader import CACHE_DIR, MODEL_NAME, load_attention_module, load_phogpt
+
+DEFAULT_PROMPT = "### Câu hỏi: Hãy giới thiệu về văn hóa Việt Nam.\n### Trả lời:"
+
+
+def decode_curve(model, input_ids, new_tokens, static_cache=None):
+    """(generated ids, per-token latency in ms); the prefill step is not counted"""
+    past = static_cache.layers if static_cache is not None else None
+    tokens, latencies = [], []
+    step_ids = input_ids
+    with torch.no_grad():
+        for i in range(new_tokens + 1):
+            start = time.perf_counter()
+            out = model(step_ids, past_key_values=past, use_cache=True)
+            step_ids = out.logits[:, -1:].argmax(-1)
+            elapsed = (time.perf_counter() - start) * 1000
+            past = static_cache.layers if static_cache is not None else out.past_key_values
+            if i:
+                latencies.append(elapsed)
+            tokens.append(step_ids.item())
+    return tokens[:new_tokens], latencies
+
+
+def curve_points(latencies):
+    """Median latency in the window (n/2, n] for n = 1, 2, 4, ..."""
+    points, n = [], 1
+    while n <= len(latencies):
+        points.append((n, statistics.median(latencies[n // 2:n])))
+        n *= 2
+    return points
+
+
+if __name__ == "__main__":
+    new_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    prompt = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PROMPT
+
+    tokenizer = load_tokenizer(MODEL_NAME, cache_dir=CACHE_DIR)
+    model = load_phogpt(attn_impl="sdpa")
+    model.eval()
+    input_ids = tokenizer(prompt, return_tensors="pt").input_ids
+    max_len = input_ids.size(1) + new_tokens + 1
+
+    attention = load_attention_module()
+    cache = attention.StaticKVCache.for_config(model.config, max_len=max_len, dtype=model.dtype)
+    print(f"📦 Static KV cache: {max_len} positions, {cache.nbytes() / 2**20:.0f} MB preallocated")
+
+    dynamic_tokens, dynamic_ms = decode_curve(model, input_ids, new_tokens)
+    static_tokens, static_ms = decode_curve(model, input_ids, new_tokens, static_cache=cache)
+
+    print(f"⏱️  prompt={input_ids.size(1)} new_tokens={new_tokens} threads={torch.get_num_threads()}")
+    print(f"{'token':>6} {'cat ms':>9} {'static ms':>10} {'speedup':>8}")
+    for (n, dynamic), (_, static) in zip(curve_points(dynamic_ms), curve_points(static_ms)):
+        print(f"{n:>6} {dynamic:>9.2f} {static:>10.2f} {dynamic / static:>7.2f}x")
+    print(f"{'total':>6} {sum(dynamic_ms):>9.0f} {sum(static_ms):>10.0f}")
+    same = dynamic_tokens == static_tokens
+    print(f"{'✅' if same else '❌'} Greedy tokens {'identical' if same else 'differ'} between the two caches")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark local Q&A lookup: linear word-overlap scan vs BM25 inverted index
+- Corpus: the premium teacher questions plus synthetic questions drawn from
+  their vocabulary (Zipf-distributed), up to 100k pairs
+  (a closed vocabulary, so every posting list grows with the corpus: worst case)
+- Queries: teacher questions with a word dropped and a common word added
+- Exact BM25 top-1 vs a bounded walk (max_depth), with recall@1 of the
+  original teacher questions
+Usage: python benchmark_retrieval.py [size ...]
+"""
+
+import random
+import statistics
+import sys
+import time
+
+from retrieval_index import BM25Index, tokenize
+
+QUERIES = 200
+MAX_DEPTH = 512
+
+
+def load_questions(path="premium_teacher_data.txt"):
+    with open(path, encoding="utf-8") as f:
+        return [line.split(":", 1)[1].strip().lower() for line in f if line.strip().startswith("Học viên:")]
+
+
+def synthetic_corpus(questions, size, seed=0):
+    rng = random.Random(seed)
+    counts = {}
+    for q in questions:
+        for word in tokenize(q):
+            counts[word] = counts.get(word, 0) + 1
+    vocab = sorted(counts, key=counts.get, reverse=True)
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    corpus = list(questions)
+    while len(corpus) < size:
+        corpus.append(" ".join(rng.choices(vocab, weights, k=rng.randint(4, 14))))
+    return corpus[:size]
+
+
+def make_queries(questions, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(QUERIES):
+        words = rng.choice(questions).split()
+        if len(words) > 3:
+            words.pop(rng.randrange(len(words)))
+        words.insert(rng.randrange(len(words) + 1), rng.choice(["em", "cô", "ơi", "nhé", "tôi"]))
+        queries.append(" ".join(words))
+    return queries
+
+
+def linear_scan(corpus, query):
+    """The previous find_local_response loop: first pair with 2+ shared words"""
+    user_words = set(query.split())
+    for question in corpus:
+        if len(user_words.intersection(question.split())) >= 2 and len(user_words) <= 10:
+            return question
+    return None
+
+
+def measure(fn, queries):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.mean(times), times[int(len(times) * 0.95)]
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+    questions = load_questions()
+    queries = make_queries(questions)
+    print(f"⏱️  {len(questions)} teacher questions, {QUERIES} queries")
+    print(f"{'pairs':>7} {'build s':>8} {'scan ms':>8} {'p95':>7} | {'exact ms':>8} {'p95':>7} {'recall':>6} | "
+          f"{'depth ' + str(MAX_DEPTH):>9} {'p95':>7} {'recall':>6}")
+    for size in sizes:
+        corpus = synthetic_corpus(questions, size)
+        start = time.perf_counter()
+        index = BM25Index.build((q, q) for q in corpus)
+        build_s = time.perf_counter() - start
+        row = [*measure(lambda q: linear_scan(corpus, q), queries)]
+        for max_depth in (None, MAX_DEPTH):
+            index.max_depth = max_depth
+            row += measure(lambda q: index.search(q, top_k=1, min_overlap=2), queries)
+            top = [index.search(q, top_k=1, min_overlap=2) for q in questions]
+            row.append(sum(1 for q, hits in zip(questions, top) if hits and hits[0][0] == q) / len(questions))
+        print(f"{size:>7} {build_s:>8.2f} {row[0]:>8.3f} {row[1]:>7.3f} | {row[2]:>8.3f} {row[3]:>7.3f} {row[4]:>6.1%} | "
+              f"{row[5]:>9.3f} {row[6]:>7.3f} {row[7]:>6.1%}")
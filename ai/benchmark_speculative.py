@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark speculative decoding on the tutoring prompt set
+Reports acceptance rate, wall-clock speedup and greedy output parity
+Usage: python benchmark_speculative.py [teacher_dir] [draft_model] [k]
+"""
+
+import sys
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from export_onnx import PARITY_PROMPTS, TRAINED_MODEL_PATH
+from speculative import SpeculativeDecoder
+
+GENERATION = dict(max_new_tokens=100, temperature=0.5, top_p=0.8, repetition_penalty=1.2)
+
+
+def run_baseline(model, tokenizer, prompts, do_sample):
+    outputs, tokens = [], 0
+    start = time.perf_counter()
+    for inputs in prompts:
+        with torch.no_grad():
+            ids = model.generate(
+                inputs,
+                attention_mask=torch.ones_like(inputs),
+                do_sample=do_sample,
+                pad_token_id=tokenizer.eos_token_id,
+                eos_token_id=tokenizer.eos_token_id,
+                **GENERATION
+            )
+        outputs.append(ids)
+        tokens += ids.shape[1] - inputs.shape[1]
+    return outputs, tokens, time.perf_counter() - start
+
+
+def run_speculative(decoder, tokenizer, prompts, do_sample):
+    outputs, tokens = [], 0
+    start = time.perf_counter()
+    for inputs in prompts:
+        ids = decoder.generate(inputs, do_sample=do_sample, eos_token_id=tokenizer.eos_token_id, **GENERATION)
+        outputs.append(ids)
+        tokens += ids.shape[1] - inputs.shape[1]
+    return outputs, tokens, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    teacher_path = sys.argv[1] if len(sys.argv) > 1 else TRAINED_MODEL_PATH
+    draft_name = sys.argv[2] if len(sys.argv) > 2 else "NlpHUST/gpt2-vietnamese"
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    tokenizer = AutoTokenizer.from_pretrained(teacher_path, use_fast=False, trust_remote_code=True)
+    teacher = AutoModelForCausalLM.from_pretrained(teacher_path, torch_dtype=torch.float32, trust_remote_code=True)
+    teacher.eval()
+    decoder = SpeculativeDecoder.from_pretrained(teacher, draft_name, k=k)
+    prompts = [tokenizer.encode(prompt, return_tensors="pt") for prompt in PARITY_PROMPTS]
+
+    for do_sample in (False, True):
+        mode = "sampling" if do_sample else "greedy"
+        print(f"\n⏱️  {mode} (k={k}, draft={draft_name})")
+
+        base_out, base_tokens, base_time = run_baseline(teacher, tokenizer, prompts, do_sample)
+        before = decoder.stats()
+        spec_out, spec_tokens, spec_time = run_speculative(decoder, tokenizer, prompts, do_sample)
+        after = decoder.stats()
+
+        drafted = after['drafted'] - before['drafted']
+        accepted = after['accepted'] - before['accepted']
+        print(f"   baseline:    {base_tokens} tokens in {base_time:.2f}s ({base_tokens / base_time:.1f} tok/s)")
+        print(f"   speculative: {spec_tokens} tokens in {spec_time:.2f}s ({spec_tokens / spec_time:.1f} tok/s)")
+        print(f"   acceptance rate: {accepted / drafted if drafted else 0:.1%}")
+        print(f"   speedup: {(spec_tokens / spec_time) / (base_tokens / base_time):.2f}x")
+
+        if not do_sample:
+            same = all(torch.equal(a, b) for a, b in zip(base_out, spec_out))
+            print(f"   greedy parity: {'✅ identical' if same else '❌ differs'}")
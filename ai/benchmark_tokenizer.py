@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark encode throughput: slow tokenizer vs fast tokenizer vs LRU cache
+Uses teacher prompts built from the corpora, repeated as in real traffic
+Usage: python benchmark_tokenizer.py [model_dir] [rounds]
+"""
+
+import sys
+import time
+
+from transformers import AutoTokenizer
+
+from fast_tokenizer import CachedTokenizer
+from prune_vocab import read_corpus_lines
+
+
+def encode_all(tokenizer, prompts):
+    start = time.perf_counter()
+    tokens = sum(len(tokenizer.encode(prompt)) for prompt in prompts)
+    return tokens, time.perf_counter() - start
+
+
+def report(name, tokens, seconds, prompts, baseline=None):
+    line = f"   {name:<14} {len(prompts) / seconds:>10.0f} prompts/s {tokens / seconds:>12.0f} tokens/s"
+    if baseline:
+        line += f"   ({baseline / seconds:.1f}x)"
+    print(line)
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "./vietnamese_teacher_trained"
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    lines = read_corpus_lines() or ["Xin chào cô!", "6 thanh điệu là những thanh nào ạ?"]
+    prompts = [f"Học sinh: {line}\nGiáo viên:" for line in lines] * rounds
+    print(f"⏱️  Encoding {len(prompts)} prompts ({len(lines)} distinct x {rounds} rounds)")
+
+    slow = AutoTokenizer.from_pretrained(model_path, use_fast=False, trust_remote_code=True)
+    fast = AutoTokenizer.from_pretrained(model_path, use_fast=True, trust_remote_code=True)
+
+    tokens, slow_time = encode_all(slow, prompts)
+    report("slow", tokens, slow_time, prompts)
+    if fast.is_fast:
+        tokens, fast_time = encode_all(fast, prompts)
+        report("fast", tokens, fast_time, prompts, slow_time)
+    cached = CachedTokenizer(fast if fast.is_fast else slow)
+    tokens, cached_time = encode_all(cached, prompts)
+    report("fast+cache" if fast.is_fast else "slow+cache", tokens, cached_time, prompts, slow_time)
+    print(f"   cache: {cached.cache_stats()}")
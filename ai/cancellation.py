@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request cancellation for long generations
+- Each request gets a cancel flag, optionally with a deadline taken from the
+  caller's time budget (X-Request-Timeout-Ms, relative, so clock skew between
+  hosts does not matter)
+- The decode loop checks the flag every step (generation_control.StopOnCancel)
+- POST /chat/cancel or a dropped /chat/stream client sets it
+- With a shared directory, a cancel reaches the request in whichever process
+  runs it (pre-forked gunicorn workers, worker-pool replicas on this host)
+- Tokens not generated because of a cancel are counted as saved
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+DEFAULT_SHARED_DIR = os.path.join(tempfile.gettempdir(), "vietnamese-teacher-cancel")
+POLL_INTERVAL = 0.1
+
+
+class GenerationCancel:
+    """Cancel flag plus optional deadline for one generation"""
+
+    def __init__(self, request_id, deadline=None):
+        self.request_id = request_id
+        self.deadline = deadline
+        self.reason = None
+        self.tokens_saved = None
+        self.tokens_generated = None    # set by the teacher once decoding ends
+        self._event = threading.Event()
+
+    def cancel(self, reason='client'):
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel('deadline')
+        return self._event.is_set()
+
+
+def deadline_from_timeout(value):
+    """X-Request-Timeout-Ms header -> local deadline timestamp (None if missing/invalid)"""
+    try:
+        timeout_ms = float(value) if value else None
+    except ValueError:
+        return None
+    return time.time() + timeout_ms / 1000 if timeout_ms is not None else None
+
+
+class CancellationRegistry:
+    """In-flight requests of this process, optionally linked to the other
+    processes on the host through marker files in shared_dir:
+    active/<id> while a request runs, cancel/<id> to cancel it"""
+
+    def __init__(self, shared_dir=None):
+        self._active = {}
+        self._lock = threading.Lock()
+        self.cancelled = Counter()
+        self.tokens_saved = 0
+        self.shared_dir = shared_dir
+        self._poller_pid = None
+        if shared_dir:
+            os.makedirs(os.path.join(shared_dir, "active"), exist_ok=True)
+            os.makedirs(os.path.join(shared_dir, "cancel"), exist_ok=True)
+
+    def _marker(self, kind, request_id):
+        # Request ids come from clients: hash them into safe file names
+        return os.path.join(self.shared_dir, kind, hashlib.sha1(request_id.encode("utf-8")).hexdigest())
+
+    def _ensure_poller(self):
+        """One poller thread per process (threads do not survive a pre-fork)"""
+        if self._poller_pid == os.getpid():
+            return
+        self._poller_pid = os.getpid()
+        threading.Thread(target=self._poll, name="cancel-poller", daemon=True).start()
+
+    def _poll(self):
+        pid = os.getpid()
+        while self._poller_pid == pid:
+            time.sleep(POLL_INTERVAL)
+            try:
+                markers = set(os.listdir(os.path.join(self.shared_dir, "cancel")))
+            except OSError:
+                continue
+            if not markers:
+                continue
+            with self._lock:
+                active = list(self._active.values())
+            for cancel in active:
+                path = self._marker("cancel", cancel.request_id)
+                if os.path.basename(path) not in markers:
+                    continue
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        reason = f.read().strip() or 'upstream'
+                except OSError:
+                    reason = 'upstream'
+                cancel.cancel(reason)
+
+    @contextmanager
+    def track(self, request_id=None, deadline=None):
+        cancel = GenerationCancel(request_id or uuid.uuid4().hex, deadline)
+        with self._lock:
+            self._active[cancel.request_id] = cancel
+        if self.shared_dir:
+            self._ensure_poller()
+            open(self._marker("active", cancel.request_id), "w").close()
+        try:
+            yield cancel
+        finally:
+            with self._lock:
+                self._active.pop(cancel.request_id, None)
+                if cancel.cancelled:
+                    self.cancelled[cancel.reason] += 1
+                    self.tokens_saved += cancel.tokens_saved or 0
+            if self.shared_dir:
+                for kind in ("active", "cancel"):
+                    try:
+                        os.remove(self._marker(kind, cancel.request_id))
+                    except FileNotFoundError:
+                        pass
+
+    def cancel(self, request_id, reason='client'):
+        """Cancel a request running in this process, or (shared_dir) in any process on the host"""
+        if not request_id:
+            return False
+        with self._lock:
+            cancel = self._active.get(request_id)
+        if cancel is not None:
+            cancel.cancel(reason)
+        if self.shared_dir and os.path.exists(self._marker("active", request_id)):
+            # Also reaches a worker-pool replica decoding the same request id
+            with open(self._marker("cancel", request_id), "w", encoding="utf-8") as f:
+                f.write(reason)
+            return True
+        return cancel is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._active),
+                'cancelled': dict(self.cancelled),
+                'cancelled_tokens_saved': self.tokens_saved,
+            }
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asynchronous buffered chat logging
+- Request threads only enqueue (never block on disk I/O)
+- A background thread writes batches, rotates by size and gzips old files
+- Sampling kicks in when the request rate is high
+"""
+
+import atexit
+import gzip
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+from datetime import datetime
+
+_SENTINEL = object()
+
+
+class AsyncChatLogger:
+    def __init__(self, path="./ai_chat_log.txt", max_queue=10000, batch_size=200,
+                 flush_interval=1.0, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 sample_above_per_sec=50, sample_rate=0.1):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.sample_above_per_sec = sample_above_per_sec
+        self.sample_rate = sample_rate
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.rotations = 0
+
+        self._start_writer()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_writer(self):
+        self._thread = threading.Thread(target=self._run, name="chat-logger", daemon=True)
+        self._thread.start()
+
+    def _restart_after_fork(self):
+        """Threads do not survive fork: give the child its own queue and writer"""
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._start_writer()
+
+    def log(self, prompt, response):
+        """Enqueue a prompt/response pair, dropping it if the queue is full"""
+        if not self._should_keep():
+            self.sampled_out += 1
+            return False
+
+        record = f"[{datetime.now().isoformat()}]\nPROMPT: {prompt}\nRESPONSE: {response}\n{'-'*40}\n"
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _should_keep(self):
+        """Keep everything at normal load, sample during bursts"""
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+
+        if self._window_count <= self.sample_above_per_sec:
+            return True
+        return random.random() < self.sample_rate
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _SENTINEL:
+                return
+            batch.append(item)
+
+            # Drain whatever else is already queued, up to one batch
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _SENTINEL:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        try:
+            with open(self.path, "a", encoding="utf-8") as logf:
+                logf.write("".join(batch))
+            self.written += len(batch)
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"⚠️ Chat log write failed: {e}")
+
+    def _rotate(self):
+        """Shift path.N.gz -> path.N+1.gz and compress the current file to path.1.gz"""
+        for index in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{index}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{index + 1}.gz")
+
+        rotated = f"{self.path}.{os.getpid()}.rotating"
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        self.rotations += 1
+
+    def close(self, timeout=5.0):
+        """Flush pending records and stop the writer thread"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_SENTINEL, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+            'rotations': self.rotations,
+        }
@@ -4,10 +4,12 @@
 Test Vietnamese Teacher Model - Kiểm tra model đã train chưa
 """
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoModelForCausalLM
 import torch
 import os
 
+from fast_tokenizer import load_tokenizer
+
 def test_trained_model():
     print("🔍 KIỂM TRA MODEL ĐÃ TRAIN")
     print("=" * 50)
@@ -34,7 +36,7 @@ def test_trained_model():
     # Load và test model
     try:
         print("\n📦 Loading model...")
-        tokenizer = AutoTokenizer.from_pretrained(trained_path, use_fast=False)
+        tokenizer = load_tokenizer(trained_path)
         model = AutoModelForCausalLM.from_pretrained(trained_path, torch_dtype=torch.float32)
         
         print("✅ Model load thành công!")
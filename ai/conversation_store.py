@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bounded, persistent conversation history
+- Fixed-capacity ring buffer of the most recent entries in memory
+- Append-only JSON-lines log on disk, split into size-bounded segments
+- Compaction in the background: sealed segments are gzipped and segments
+  past the retention limit are deleted
+- Newest-first paging with a `before` id cursor and an optional source filter
+Memory is bounded by the ring capacity plus one small index entry per segment.
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+from collections import Counter, deque
+
+SEGMENT_RE = re.compile(r"^segment-(\d{9})\.jsonl(\.gz)?$")
+
+
+class Segment:
+    def __init__(self, path, first_id):
+        self.path = path
+        self.first_id = first_id
+        self.last_id = first_id - 1
+        self.sources = Counter()
+
+    @property
+    def compressed(self):
+        return self.path.endswith(".gz")
+
+    def read(self):
+        path = self.path
+        if not os.path.exists(path) and os.path.exists(path + ".gz"):
+            path += ".gz"   # gzipped by compaction meanwhile
+        opener = gzip.open if path.endswith(".gz") else open
+        entries = []
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    pass    # torn last line after a crash
+        return entries
+
+
+class ConversationStore:
+    def __init__(self, directory="./conversation_history", capacity=500,
+                 segment_bytes=1024 * 1024, max_entries=100000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_entries = max_entries
+        self.recent = deque(maxlen=capacity)
+        self.segments = []
+        self.next_id = 1
+        self.compactions = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _recover(self):
+        """Rebuild the segment index and the ring buffer from disk"""
+        names = set(os.listdir(self.directory))
+        for name in sorted(names):
+            if name.endswith(".gz.tmp"):
+                os.remove(os.path.join(self.directory, name))     # compaction crashed mid-copy
+                continue
+            match = SEGMENT_RE.match(name)
+            if not match:
+                continue
+            if not match.group(2) and name + ".gz" in names:
+                # Crashed after the .gz replaced it but before the plain file was removed:
+                # the .gz is complete (os.replace), reading both would duplicate every entry
+                os.remove(os.path.join(self.directory, name))
+                continue
+            segment = Segment(os.path.join(self.directory, name), int(match.group(1)))
+            for entry in segment.read():
+                segment.last_id = entry['id']
+                segment.sources[entry.get('source')] += 1
+            if segment.last_id < segment.first_id:
+                os.remove(segment.path)
+                continue
+            self.segments.append(segment)
+        if self.segments:
+            self.next_id = max(s.last_id for s in self.segments) + 1
+        for segment in reversed(self.segments):
+            if len(self.recent) >= self.recent.maxlen:
+                break
+            self.recent.extendleft(reversed(segment.read()[-(self.recent.maxlen - len(self.recent)):]))
+        # Always append to a fresh segment: the last one may be gzipped or end mid-line
+        self._open_segment()
+
+    def _open_segment(self):
+        if self._file:
+            self._file.close()
+        segment = Segment(os.path.join(self.directory, f"segment-{self.next_id:09d}.jsonl"), self.next_id)
+        self.segments.append(segment)
+        self._file = open(segment.path, "a", encoding="utf-8")
+
+    def append(self, entry):
+        """Store an entry (dict with at least 'source'); returns it with its id"""
+        with self._lock:
+            entry = dict(entry, id=self.next_id)
+            self.next_id += 1
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            segment = self.segments[-1]
+            segment.last_id = entry['id']
+            segment.sources[entry.get('source')] += 1
+            self.recent.append(entry)
+            if self._file.tell() >= self.segment_bytes:
+                self._open_segment()
+                threading.Thread(target=self.compact, name="history-compaction", daemon=True).start()
+        return entry
+
+    def compact(self):
+        """Drop segments past retention and gzip the sealed ones"""
+        if not self._compacting.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                oldest_kept = self.next_id - self.max_entries
+                expired = [s for s in self.segments[:-1] if s.last_id < oldest_kept]
+                self.segments = [s for s in self.segments if s not in expired]
+                sealed = [s for s in self.segments[:-1] if not s.compressed]
+            for segment in expired:
+                os.remove(segment.path)
+            for segment in sealed:
+                with open(segment.path, "rb") as src, gzip.open(segment.path + ".gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(segment.path + ".gz.tmp", segment.path + ".gz")
+                with self._lock:
+                    old_path, segment.path = segment.path, segment.path + ".gz"
+                os.remove(old_path)
+            self.compactions += 1
+        finally:
+            self._compacting.release()
+
+    def page(self, limit=10, before=None, source=None):
+        """(entries newest first, cursor for the next page or None)"""
+        before = before or self.next_id
+        with self._lock:
+            recent = list(self.recent)
+            segments = list(self.segments)
+        entries = [e for e in reversed(recent)
+                   if e['id'] < before and (source is None or e.get('source') == source)][:limit + 1]
+
+        # Older than the ring buffer: walk the segments backwards on disk
+        oldest_in_memory = recent[0]['id'] if recent else self.next_id
+        cursor = min(before, oldest_in_memory)
+        for segment in reversed(segments):
+            if len(entries) > limit:
+                break
+            if segment.first_id >= cursor or (source is not None and not segment.sources.get(source)):
+                continue
+            entries.extend(e for e in reversed(segment.read())
+                           if e['id'] < cursor and (source is None or e.get('source') == source))
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        return entries, (entries[-1]['id'] if has_more and entries else None)
+
+    def stats(self):
+        with self._lock:
+            sources = Counter()
+            for segment in self.segments:
+                sources.update(segment.sources)
+            return {
+                'total': self.next_id - 1,
+                'retained': sum(s.last_id - s.first_id + 1 for s in self.segments),
+                'in_memory': len(self.recent),
+                'segments': len(self.segments),
+                'compactions': self.compactions,
+                'by_source': {k: v for k, v in sources.items() if k is not None},
+            }
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export the Vietnamese teacher model to ONNX for CPU serving
+Usage: python export_onnx.py [model_dir] [output_dir]
+"""
+
+import sys
+
+import torch
+from transformers import AutoTokenizer
+
+from inference_backends import DEFAULT_ONNX_DIR, OnnxBackend, TorchBackend
+
+TRAINED_MODEL_PATH = "./vietnamese_teacher_trained"
+
+PARITY_PROMPTS = [
+    "Học sinh: Xin chào cô!\nGiáo viên:",
+    "Học sinh: 6 thanh điệu là những thanh nào ạ?\nGiáo viên:",
+    "Học sinh: Làm sao để nhớ lâu được từ vựng?\nGiáo viên:",
+    "Học sinh: Khi nào em nên dùng \"anh\", \"chị\", \"em\"?\nGiáo viên:",
+]
+
+
+def export_model(model_path, output_dir):
+    """Export with past key/value inputs and outputs"""
+    from optimum.exporters.onnx import main_export
+
+    print(f"📦 Exporting {model_path} -> {output_dir} ...")
+    main_export(
+        model_name_or_path=model_path,
+        output=output_dir,
+        task="text-generation-with-past",
+        trust_remote_code=True
+    )
+    print("✅ Export finished")
+
+
+def check_greedy_parity(model_path, output_dir, max_new_tokens=40):
+    """Compare greedy token ids from torch and ONNX Runtime"""
+    tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=False, trust_remote_code=True)
+    torch_backend = TorchBackend(model_path)
+    onnx_backend = OnnxBackend(model_path, onnx_dir=output_dir)
+
+    mismatches = 0
+    for prompt in PARITY_PROMPTS:
+        inputs = tokenizer.encode(prompt, return_tensors="pt")
+        generate_kwargs = dict(
+            attention_mask=torch.ones_like(inputs),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+        expected = torch_backend.generate(inputs, **generate_kwargs)
+        actual = onnx_backend.generate(inputs, **generate_kwargs)
+
+        if torch.equal(expected, actual):
+            print(f"✅ {prompt.splitlines()[0]}")
+        else:
+            mismatches += 1
+            print(f"❌ {prompt.splitlines()[0]}")
+            print(f"   torch: {tokenizer.decode(expected[0])}")
+            print(f"   onnx:  {tokenizer.decode(actual[0])}")
+
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else TRAINED_MODEL_PATH
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_ONNX_DIR
+
+    export_model(model_path, output_dir)
+
+    print("\n🧪 Checking greedy decoding parity...")
+    if check_greedy_parity(model_path, output_dir):
+        print("🎉 ONNX output matches torch for greedy decoding")
+    else:
+        print("💥 ONNX output differs from torch")
+        sys.exit(1)
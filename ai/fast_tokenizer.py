@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast tokenizer with parity verification
+- Uses the Rust (fast) tokenizer only where it yields exactly the slow
+  tokenizer's ids on our corpora; otherwise falls back to use_fast=False
+- Parity results are remembered in tokenizer_parity.json, together with a
+  fingerprint of the tokenizer files and library versions: a checkpoint
+  re-saved or swapped in place (same path) is checked again
+- CachedTokenizer: bounded LRU cache of encode() results for repeated prompts
+Usage: python fast_tokenizer.py [model_dir]   # full parity suite over the corpora
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import tokenizers
+import torch
+import transformers
+from transformers import AutoTokenizer
+
+from prune_vocab import read_corpus_lines
+
+PARITY_FILE = "./tokenizer_parity.json"
+QUICK_CORPUS_LINES = 200
+
+# Files that define how a checkpoint tokenizes
+TOKENIZER_FILES = ["tokenizer.json", "tokenizer_config.json", "special_tokens_map.json", "added_tokens.json",
+                   "vocab.json", "vocab.txt", "merges.txt", "*.model"]
+
+# Inputs that tend to expose normalization / byte-fallback differences
+EDGE_CASES = [
+    "Xin chào cô!",
+    "Học sinh: 6 thanh điệu là những thanh nào ạ?\nGiáo viên:",
+    "thanh ngang, thanh huyền, thanh sắc, thanh hỏi, thanh ngã, thanh nặng",
+    unicodedata.normalize("NFD", "Tiếng Việt có dấu tổ hợp"),
+    "  khoảng   trắng  \t lạ \n\n",
+    "Emoji 😀🇻🇳 và ký tự đặc biệt ©®™ — “ngoặc kép”",
+    "Số 1.234,56 và 2024-10-19 lúc 08:30",
+    "ĐẶNG THỊ ĐỖ Ưng Ơi",
+    "<|endoftext|>",
+    "",
+]
+
+
+def check_parity(slow, fast, texts):
+    """Texts whose ids (or decoded text) differ between slow and fast tokenizers"""
+    mismatches = []
+    for text in texts:
+        slow_ids = slow.encode(text, add_special_tokens=False)
+        fast_ids = fast.encode(text, add_special_tokens=False)
+        if slow_ids != fast_ids:
+            mismatches.append({'text': text, 'slow': slow_ids, 'fast': fast_ids})
+        elif slow.decode(slow_ids) != fast.decode(fast_ids):
+            mismatches.append({'text': text, 'decode': True})
+    return mismatches
+
+
+def tokenizer_fingerprint(model_path):
+    """sha256 of model_path's tokenizer files plus the transformers/tokenizers versions
+    (a hub id without local files is identified by its name)"""
+    digest = hashlib.sha256(f"{transformers.__version__}|{tokenizers.__version__}".encode())
+    paths = sorted({path for pattern in TOKENIZER_FILES for path in glob.glob(os.path.join(model_path, pattern))})
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    if not paths:
+        digest.update(model_path.encode())
+    return digest.hexdigest()
+
+
+def _load_parity_results():
+    if os.path.exists(PARITY_FILE):
+        with open(PARITY_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def parity_verdict(model_path, fingerprint=None):
+    """Recorded verdict for model_path, None if missing or for other tokenizer files"""
+    verdict = _load_parity_results().get(model_path)
+    if verdict is None or verdict.get('fingerprint') != (fingerprint or tokenizer_fingerprint(model_path)):
+        return None
+    return verdict
+
+
+def record_parity(model_path, fast_ok, checked, mismatches=0, fingerprint=None):
+    results = _load_parity_results()
+    results[model_path] = {'fast_ok': fast_ok, 'checked': checked, 'mismatches': mismatches,
+                           'fingerprint': fingerprint or tokenizer_fingerprint(model_path)}
+    try:
+        with open(PARITY_FILE, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    except OSError:
+        pass
+
+
+def load_tokenizer(model_path, **kwargs):
+    """Fast tokenizer if it has passed parity for model_path, else the slow one
+
+    Unknown models get a quick parity check (edge cases + a slice of the
+    corpus) on first load; run this module as a script for the full suite.
+    AI_FAST_TOKENIZER=0 always uses the slow tokenizer.
+    """
+    kwargs.setdefault('trust_remote_code', True)
+    slow = None
+    if os.getenv("AI_FAST_TOKENIZER", "1") == "1":
+        fingerprint = tokenizer_fingerprint(model_path)
+        verdict = parity_verdict(model_path, fingerprint)
+        if verdict is None or verdict['fast_ok']:
+            try:
+                fast = AutoTokenizer.from_pretrained(model_path, use_fast=True, **kwargs)
+            except Exception as e:
+                print(f"⚠️ Fast tokenizer unavailable for {model_path}: {e}")
+                fast = None
+            if fast is not None and fast.is_fast:
+                if verdict is not None:
+                    return fast
+                slow = AutoTokenizer.from_pretrained(model_path, use_fast=False, **kwargs)
+                texts = EDGE_CASES + read_corpus_lines()[:QUICK_CORPUS_LINES]
+                mismatches = check_parity(slow, fast, texts)
+                record_parity(model_path, not mismatches, len(texts), len(mismatches), fingerprint)
+                if not mismatches:
+                    print(f"⚡ Fast tokenizer verified on {len(texts)} texts")
+                    return fast
+                print(f"⚠️ Fast tokenizer differs on {len(mismatches)} texts, using slow tokenizer")
+    return slow or AutoTokenizer.from_pretrained(model_path, use_fast=False, **kwargs)
+
+
+class CachedTokenizer:
+    """Bounded LRU cache in front of tokenizer.encode; everything else is delegated"""
+
+    def __init__(self, tokenizer, max_entries=4096):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, text, return_tensors=None, **kwargs):
+        key = (text, tuple(sorted(kwargs.items())))
+        with self._lock:
+            ids = self._cache.get(key)
+            if ids is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if ids is None:
+            ids = tuple(self.tokenizer.encode(text, **kwargs))
+            with self._lock:
+                self.misses += 1
+                self._cache[key] = ids
+                if len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        if return_tensors == 'pt':
+            return torch.tensor([ids], dtype=torch.long)
+        return list(ids)
+
+    def cache_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def __call__(self, *args, **kwargs):
+        return self.tokenizer(*args, **kwargs)
+
+    def __len__(self):
+        return len(self.tokenizer)
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "./vietnamese_teacher_trained"
+    slow = AutoTokenizer.from_pretrained(model_path, use_fast=False, trust_remote_code=True)
+    fast = AutoTokenizer.from_pretrained(model_path, use_fast=True, trust_remote_code=True)
+    if not fast.is_fast:
+        print(f"❌ No fast tokenizer available for {model_path}")
+        sys.exit(1)
+
+    texts = EDGE_CASES + read_corpus_lines()
+    print(f"🔍 Checking parity on {len(texts)} texts...")
+    mismatches = check_parity(slow, fast, texts)
+    record_parity(model_path, not mismatches, len(texts), len(mismatches))
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} mismatches, serving will use the slow tokenizer")
+        for mismatch in mismatches[:10]:
+            print(f"   {mismatch}")
+        sys.exit(1)
+    print(f"✅ Fast tokenizer matches on all {len(texts)} texts (saved to {PARITY_FILE})")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generation control for the Vietnamese Teacher AI
+- Stop decoding as soon as a new speaker turn or stop string appears
+- Per question type token budgets
+- Cancellation at the next decode step
+- Decode step statistics
+"""
+
+import threading
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+# Strings that end the teacher's turn
+STOP_STRINGS = ["Học sinh:", "Học viên:", "Giáo viên:", "<|endoftext|>"]
+
+# max_new_tokens per question type
+TOKEN_BUDGETS = {
+    'greeting': 48,
+    'thanks': 40,
+    'short_question': 96,
+    'explanation': 150,
+    'default': 120,
+}
+
+QUESTION_KEYWORDS = {
+    'greeting': ['xin chào', 'chào cô', 'chào thầy', 'hello'],
+    'thanks': ['cảm ơn', 'cám ơn', 'thank'],
+    'explanation': ['tại sao', 'vì sao', 'giải thích', 'như thế nào', 'làm sao', 'ví dụ', 'phân biệt', 'khác nhau'],
+}
+
+
+def classify_question(question):
+    """Classify a student question to pick a token budget"""
+    text = question.lower().strip()
+
+    for question_type in ('greeting', 'thanks', 'explanation'):
+        if any(keyword in text for keyword in QUESTION_KEYWORDS[question_type]):
+            return question_type
+
+    if len(text.split()) <= 8:
+        return 'short_question'
+    return 'default'
+
+
+def token_budget(question):
+    """Return (question_type, max_new_tokens) for a question"""
+    question_type = classify_question(question)
+    return question_type, TOKEN_BUDGETS[question_type]
+
+
+def truncate_at_stop(text, stop_strings=STOP_STRINGS):
+    """Cut text at the first stop string"""
+    cut = len(text)
+    for stop in stop_strings:
+        index = text.find(stop)
+        if index != -1:
+            cut = min(cut, index)
+    return text[:cut].strip()
+
+
+class StopOnStrings(StoppingCriteria):
+    """Stop when the generated text contains any stop string
+
+    Only the tail of the generated tokens is decoded on each step, so the
+    check stays cheap regardless of how long the answer already is.
+    """
+
+    def __init__(self, tokenizer, prompt_length, stop_strings=STOP_STRINGS, eos_token_id=None):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_strings = stop_strings
+        self.eos_token_id = eos_token_id
+        longest = max(len(tokenizer.encode(stop, add_special_tokens=False)) for stop in stop_strings)
+        self.window = longest + 2
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = False
+        generated = input_ids[0, self.prompt_length:]
+        if generated.numel():
+            if self.eos_token_id is not None and generated[-1].item() == self.eos_token_id:
+                done = True
+            else:
+                tail = self.tokenizer.decode(generated[-self.window:], skip_special_tokens=False)
+                done = any(stop in tail for stop in self.stop_strings)
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+
+class StopOnCancel(StoppingCriteria):
+    """Stop at the next decode step once the request is cancelled or past its deadline"""
+
+    def __init__(self, cancel, prompt_length, max_new_tokens):
+        self.cancel = cancel
+        self.prompt_length = prompt_length
+        self.max_new_tokens = max_new_tokens
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = self.cancel.cancelled
+        if done and self.cancel.tokens_saved is None:
+            generated = input_ids.shape[1] - self.prompt_length
+            self.cancel.tokens_saved = max(0, self.max_new_tokens - generated)
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+
+def build_stopping_criteria(tokenizer, prompt_length, stop_strings=STOP_STRINGS, cancel=None, max_new_tokens=None):
+    criteria = StoppingCriteriaList([
+        StopOnStrings(tokenizer, prompt_length, stop_strings, eos_token_id=tokenizer.eos_token_id)
+    ])
+    if cancel is not None:
+        criteria.append(StopOnCancel(cancel, prompt_length, max_new_tokens))
+    return criteria
+
+
+class DecodeStats:
+    """Running average of decode steps per request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_steps = 0
+        self.total_budget = 0
+
+    def record(self, steps, budget):
+        with self._lock:
+            self.requests += 1
+            self.total_steps += steps
+            self.total_budget += budget
+            return self.total_steps / self.requests
+
+    def summary(self):
+        with self._lock:
+            if not self.requests:
+                return {'requests': 0, 'avg_decode_steps': 0.0, 'avg_budget': 0.0}
+            return {
+                'requests': self.requests,
+                'avg_decode_steps': self.total_steps / self.requests,
+                'avg_budget': self.total_budget / self.requests,
+                'saved_steps_ratio': 1 - self.total_steps / self.total_budget,
+            }
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-request generation profiler (AI_PROFILE=1)
+- Tokenize, prefill, time-to-first-token, inter-token latency, detokenize
+- Tokens generated and peak RSS delta (Linux, process-wide): one sampler
+  thread polls VmRSS while requests generate, instead of resetting VmHWM,
+  which would clobber the peaks of concurrent requests
+- Aggregated histograms plus the most recent requests for /debug/profile
+- Optional torch.profiler trace of the next request
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+from transformers.generation.streamers import BaseStreamer
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+RSS_SAMPLE_INTERVAL = 0.01
+
+
+def _proc_status_kb(field):
+    """A field such as VmRSS from /proc/self/status, in kB (None off Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Samples VmRSS every interval while any request is generating and raises
+    each of those requests' peak_rss_kb; the thread exits when none are left
+    (a request that failed drops out when its profile is garbage collected)"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._active = weakref.WeakSet()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def watch(self, profile):
+        if profile.rss_before_kb is None:
+            return
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            rss = _proc_status_kb("VmRSS")
+            with self._lock:
+                for profile in list(self._active):
+                    if profile.generated is not None:
+                        self._active.discard(profile)
+                    elif rss is not None:
+                        profile.peak_rss_kb = max(profile.peak_rss_kb, rss)
+                if not self._active:
+                    self._thread = None
+                    return
+
+
+class TokenTimingStreamer(BaseStreamer):
+    """Timestamps every token generate() emits; the first put() is the prompt"""
+
+    def __init__(self):
+        self.token_times = []
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        self.token_times.append(time.perf_counter())
+
+    def end(self):
+        pass
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2) if self.count else 0.0,
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.tokenized = None
+        self.generate_start = None
+        self.generated = None
+        self.finished = None
+        self.tokens = 0
+        self.prompt_tokens = 0
+        self.streamer = TokenTimingStreamer()
+        self.trace_path = None
+        self.rss_before_kb = _proc_status_kb("VmRSS")
+        self.peak_rss_kb = self.rss_before_kb
+
+    def mark_tokenized(self, prompt_tokens):
+        self.tokenized = time.perf_counter()
+        self.prompt_tokens = prompt_tokens
+
+    def mark_generate_start(self):
+        self.generate_start = time.perf_counter()
+
+    def mark_generated(self, tokens):
+        self.generated = time.perf_counter()
+        self.tokens = tokens
+        rss = _proc_status_kb("VmRSS")
+        if rss is not None and self.peak_rss_kb is not None:
+            self.peak_rss_kb = max(self.peak_rss_kb, rss)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        return self
+
+    def timings(self):
+        """Millisecond timings; ttft/inter-token are None when no streamer ran (speculative)"""
+        ms = lambda a, b: round((b - a) * 1000, 2)
+        token_times = self.streamer.token_times
+        first_token = token_times[0] if token_times else None
+        gaps = [ms(a, b) for a, b in zip(token_times, token_times[1:])]
+        result = {
+            'prompt_tokens': self.prompt_tokens,
+            'tokens': self.tokens,
+            'tokenize_ms': ms(self.start, self.tokenized),
+            'prefill_ms': ms(self.generate_start, first_token) if first_token else None,
+            'ttft_ms': ms(self.start, first_token) if first_token else None,
+            'inter_token_ms': round(sum(gaps) / len(gaps), 2) if gaps else None,
+            'max_inter_token_ms': max(gaps) if gaps else None,
+            'generate_ms': ms(self.generate_start, self.generated),
+            'detokenize_ms': ms(self.generated, self.finished),
+            'total_ms': ms(self.start, self.finished),
+        }
+        if self.rss_before_kb is not None and self.peak_rss_kb is not None:
+            result['peak_rss_delta_kb'] = max(0, self.peak_rss_kb - self.rss_before_kb)
+        if self.trace_path:
+            result['trace'] = self.trace_path
+        return result
+
+
+class GenerationProfiler:
+    METRICS = ['tokenize_ms', 'prefill_ms', 'ttft_ms', 'inter_token_ms', 'generate_ms', 'detokenize_ms', 'total_ms']
+
+    def __init__(self, recent=50, trace_dir="./profiles"):
+        self.trace_dir = trace_dir
+        self.histograms = {name: Histogram() for name in self.METRICS}
+        self.recent = deque(maxlen=recent)
+        self.requests = 0
+        self.tokens = 0
+        self._trace_next = False
+        self._lock = threading.Lock()
+        self.rss_sampler = RssSampler()
+
+    def begin(self):
+        profile = RequestProfile()
+        self.rss_sampler.watch(profile)
+        return profile
+
+    def capture_next_trace(self):
+        """Record a torch.profiler trace for the next request"""
+        with self._lock:
+            self._trace_next = True
+
+    @contextmanager
+    def trace(self, profile):
+        """Wrap generation in torch.profiler if a trace was requested"""
+        with self._lock:
+            capture, self._trace_next = self._trace_next, False
+        if not capture:
+            yield
+            return
+
+        from torch.profiler import ProfilerActivity, profile as torch_profile
+        with torch_profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield
+        os.makedirs(self.trace_dir, exist_ok=True)
+        profile.trace_path = os.path.join(self.trace_dir, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        prof.export_chrome_trace(profile.trace_path)
+        logger.info("Profiler trace saved to %s", profile.trace_path)
+
+    def record(self, profile):
+        timings = profile.timings()
+        with self._lock:
+            self.requests += 1
+            self.tokens += timings['tokens']
+            for name in self.METRICS:
+                if timings[name] is not None:
+                    self.histograms[name].observe(timings[name])
+            self.recent.append(timings)
+        logger.info("[PROFILE] %s", timings)
+        return timings
+
+    def summary(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'tokens': self.tokens,
+                'trace_pending': self._trace_next,
+                'histograms_ms': {name: hist.summary() for name, hist in self.histograms.items()},
+                'recent': list(self.recent),
+            }
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn pre-fork config for the Vietnamese Teacher AI
+The model is loaded once in the master (preload_app) with weights in shared
+memory or mmap'ed, so workers fork without duplicating them.
+Usage: gunicorn -c gunicorn_conf.py app:app
+"""
+
+import gc
+import os
+
+# Load weights in a layout that stays shared after fork (see shared_weights.py)
+os.environ.setdefault("AI_SHARED_WEIGHTS", "shm")
+# The master must finish loading before it forks, so no background loading here
+os.environ.setdefault("AI_EAGER_LOAD", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    # Objects created while loading stay out of the GC generations, so
+    # collections in the workers do not touch (and copy) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+    threads = int(os.getenv("AI_WORKER_THREADS", "0")) or max(1, (os.cpu_count() or 1) // workers)
+    torch.set_num_threads(threads)
+
+
+def post_worker_init(worker):
+    from worker_memory import process_memory
+    info = process_memory(os.getpid())
+    worker.log.info(
+        "Worker %s memory: rss=%.1fMB pss=%.1fMB uss=%.1fMB shared=%.1fMB",
+        worker.pid, info['rss_mb'], info['pss_mb'], info['uss_mb'], info['shared_mb']
+    )
@@ -7,14 +7,20 @@ Hybrid Vietnamese Teacher - Best of both worlds
 - Smart fallback system
 """
 
-import openai
-import requests
+import httpx
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import json
+import time
 from datetime import datetime
 
+from conversation_store import ConversationStore
+from intent_matcher import IntentMatcher
+from provider_cascade import HedgedCascade, Provider, parse_mock_providers
+from response_cache import ResponseCache, make_key
+from retrieval_index import BM25Index, tokenize
+
 app = Flask(__name__)
 CORS(app)
 
@@ -22,10 +28,86 @@ CORS(app)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY", "")
 
+# Cloud cascade: hedge to the next provider after the previous one's p95 latency
+PROVIDER_TIMEOUT = float(os.getenv("HYBRID_PROVIDER_TIMEOUT", "10"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HYBRID_HEDGE_DELAY", "1.0"))
+MOCK_PROVIDERS = os.getenv("HYBRID_MOCK_PROVIDERS", "")   # offline testing, e.g. "openai:800:0.1,cohere:400"
+
+# Provider request settings, also part of the response cache key
+OPENAI_SYSTEM_PROMPT = """Bạn là một giáo viên tiếng Việt chuyên nghiệp, nhiệt tình và kiên nhẫn. 
+            Hãy trả lời học sinh bằng tiếng Việt một cách tự nhiên, hữu ích và khuyến khích. 
+            Giải thích rõ ràng, đưa ví dụ cụ thể, và luôn động viên học sinh."""
+COHERE_PROMPT = """Bạn là giáo viên tiếng Việt chuyên nghiệp. Trả lời học sinh:
+            
+Học sinh: {message}
+Giáo viên:"""
+PROVIDER_REQUESTS = {
+    'openai': {'model': 'gpt-3.5-turbo', 'max_tokens': 200, 'temperature': 0.7, 'prompt': OPENAI_SYSTEM_PROMPT},
+    'cohere': {'model': 'command-light', 'max_tokens': 150, 'temperature': 0.7, 'prompt': COHERE_PROMPT},
+}
+
+# Persistent cache of cloud answers: identical questions are not paid for twice
+CACHE_PATH = os.getenv("HYBRID_CACHE_PATH", "./response_cache.db")
+CACHE_TTL_HOURS = float(os.getenv("HYBRID_CACHE_TTL_HOURS", "168"))
+CACHE_MAX_ENTRIES = int(os.getenv("HYBRID_CACHE_MAX_ENTRIES", "20000"))
+CACHE_MEMORY_ENTRIES = int(os.getenv("HYBRID_CACHE_MEMORY_ENTRIES", "500"))
+
+# Local answer lookup: BM25 walk depth per posting list (0 = exact top-1)
+LOCAL_INDEX_MAX_DEPTH = int(os.getenv("HYBRID_INDEX_MAX_DEPTH", "512")) or None
+
+# Conversation history: recent entries in memory, the rest in an on-disk log
+HISTORY_DIR = os.getenv("HYBRID_HISTORY_DIR", "./conversation_history")
+HISTORY_CAPACITY = int(os.getenv("HYBRID_HISTORY_CAPACITY", "500"))
+HISTORY_MAX_ENTRIES = int(os.getenv("HYBRID_HISTORY_MAX_ENTRIES", "100000"))
+HISTORY_SOURCES = ('local', 'openai', 'cohere', 'fallback')
+
+# Topic fallback: intent -> (keywords, response), first match in this order wins
+TOPIC_RESPONSES = {
+    'pronunciation': (['phát âm', 'pronunciation'], "Phát âm là nền tảng quan trọng nhất của tiếng Việt em ạ! Tiếng Việt có 6 thanh điệu: ngang (ba), huyền (bà), sắc (bá), hỏi (bả), ngã (bã), và nặng (bạ). Chúng ta sẽ luyện từng bước một nhé!"),
+    'tones': (['thanh điệu', 'tones'], "6 thanh điệu trong tiếng Việt: thanh ngang (ba), thanh huyền (bà), thanh sắc (bá), thanh hỏi (bả), thanh ngã (bã), và thanh nặng (bạ). Mỗi thanh có giai điệu riêng, em cần luyện thường xuyên."),
+    'vocabulary': (['từ vựng', 'vocabulary'], "Học từ vựng hiệu quả nhất là học theo chủ đề em ạ! Ví dụ: gia đình, thức ăn, quần áo. Mỗi ngày học 5-8 từ mới và tạo câu với những từ đó."),
+    'shy': (['ngại ngùng', 'shy', 'sợ'], "Đó là cảm giác bình thường em à! Đừng sợ sai, cứ thử nói. Người Việt rất hiền, họ sẽ giúp em sửa lỗi một cách tử tế. Chỉ bằng cách nói nhiều, em mới tiến bộ được."),
+    'greeting': (['xin chào', 'hello', 'chào'], "Xin chào em! Cô rất vui được gặp em hôm nay. Em muốn học gì về tiếng Việt?"),
+    'thanks': (['cảm ơn', 'thank'], "Không có gì em! Học ngôn ngữ là hành trình thú vị. Cô tin rằng với sự kiên trì, em sẽ nói tiếng Việt rất tự nhiên!"),
+}
+TOPIC_MATCHER = IntentMatcher({topic: keywords for topic, (keywords, _) in TOPIC_RESPONSES.items()})
+
 class HybridVietnameseTeacher:
     def __init__(self):
-        self.conversation_history = []
+        # One async client for every provider call: cancelling a hedged-out call closes its connection
+        self.http = httpx.AsyncClient(timeout=PROVIDER_TIMEOUT)
+        self.conversation_history = ConversationStore(HISTORY_DIR, capacity=HISTORY_CAPACITY,
+                                                      max_entries=HISTORY_MAX_ENTRIES)
         self.local_responses = self.load_local_responses()
+        self.local_index = BM25Index.build(((question, question) for question in self.local_responses),
+                                          max_depth=LOCAL_INDEX_MAX_DEPTH)
+        self.local_doc_ids = {question: doc_id for doc_id, question in enumerate(self.local_responses)}
+        self.cascade = HedgedCascade(self.load_providers(), default_delay=HEDGE_DEFAULT_DELAY)
+        self.response_cache = ResponseCache(CACHE_PATH, ttl=CACHE_TTL_HOURS * 3600, max_entries=CACHE_MAX_ENTRIES,
+                                            memory_entries=CACHE_MEMORY_ENTRIES)
+
+    def load_providers(self):
+        """Cloud providers in priority order (mock stand-ins when HYBRID_MOCK_PROVIDERS is set)"""
+        if MOCK_PROVIDERS:
+            return parse_mock_providers(MOCK_PROVIDERS, timeout=PROVIDER_TIMEOUT)
+        providers = []
+        if OPENAI_API_KEY:
+            providers.append(Provider("openai", self.call_openai_api, timeout=PROVIDER_TIMEOUT))
+        if COHERE_API_KEY:
+            providers.append(Provider("cohere", self.call_cohere_api, timeout=PROVIDER_TIMEOUT))
+        return providers
+
+    def request_settings(self, provider):
+        """Model and settings a provider answers with (mock answers never share real cache keys)"""
+        if MOCK_PROVIDERS or provider not in PROVIDER_REQUESTS:
+            return {'model': 'mock'}
+        return PROVIDER_REQUESTS[provider]
+
+    def cache_key(self, provider, user_message):
+        """Response cache key: provider, model, question and request settings"""
+        params = dict(self.request_settings(provider))
+        model = params.pop('model')
+        return make_key(provider, model, " ".join(user_message.split()), params)
         
     def load_local_responses(self):
         """Load pre-defined responses for common queries"""
@@ -55,68 +137,57 @@ class HybridVietnameseTeacher:
             return {}
     
     def find_local_response(self, user_message):
-        """Find matching local response using keyword matching"""
+        """Find matching local response: (answer, BM25 score) or None"""
         user_lower = user_message.lower()
         
         # Direct matching
         if user_lower in self.local_responses:
-            return self.local_responses[user_lower]
+            doc_id = self.local_doc_ids[user_lower]
+            return self.local_responses[user_lower], self.local_index.score(set(tokenize(user_lower)), doc_id)
         
-        # Keyword matching
-        for question, answer in self.local_responses.items():
-            # Extract key words
-            user_words = set(user_lower.split())
-            question_words = set(question.split())
-            
-            # If significant overlap, return this answer
-            overlap = len(user_words.intersection(question_words))
-            if overlap >= 2 and len(user_words) <= 10:  # For short questions
-                return answer
+        # Keyword matching: best BM25 question sharing 2+ words (short questions only)
+        if len(tokenize(user_lower)) <= 10:
+            matches = self.local_index.search(user_lower, top_k=1, min_overlap=2)
+            if matches:
+                question, score = matches[0]
+                return self.local_responses[question], score
         
         # Pattern matching for common topics
-        keywords_responses = {
-            ['phát âm', 'pronunciation']: "Phát âm là nền tảng quan trọng nhất của tiếng Việt em ạ! Tiếng Việt có 6 thanh điệu: ngang (ba), huyền (bà), sắc (bá), hỏi (bả), ngã (bã), và nặng (bạ). Chúng ta sẽ luyện từng bước một nhé!",
-            ['thanh điệu', 'tones']: "6 thanh điệu trong tiếng Việt: thanh ngang (ba), thanh huyền (bà), thanh sắc (bá), thanh hỏi (bả), thanh ngã (bã), và thanh nặng (bạ). Mỗi thanh có giai điệu riêng, em cần luyện thường xuyên.",
-            ['từ vựng', 'vocabulary']: "Học từ vựng hiệu quả nhất là học theo chủ đề em ạ! Ví dụ: gia đình, thức ăn, quần áo. Mỗi ngày học 5-8 từ mới và tạo câu với những từ đó.",
-            ['ngại ngùng', 'shy', 'sợ']: "Đó là cảm giác bình thường em à! Đừng sợ sai, cứ thử nói. Người Việt rất hiền, họ sẽ giúp em sửa lỗi một cách tử tế. Chỉ bằng cách nói nhiều, em mới tiến bộ được.",
-            ['xin chào', 'hello', 'chào']: "Xin chào em! Cô rất vui được gặp em hôm nay. Em muốn học gì về tiếng Việt?",
-            ['cảm ơn', 'thank']: "Không có gì em! Học ngôn ngữ là hành trình thú vị. Cô tin rằng với sự kiên trì, em sẽ nói tiếng Việt rất tự nhiên!"
-        }
-        
-        for keywords, response in keywords_responses.items():
-            if any(keyword in user_lower for keyword in keywords):
-                return response
+        topic = TOPIC_MATCHER.first(user_lower)
+        if topic:
+            return TOPIC_RESPONSES[topic][1], 0.0
         
         return None
     
-    def call_openai_api(self, user_message):
+    async def call_openai_api(self, user_message):
         """Use OpenAI API for complex responses"""
         if not OPENAI_API_KEY:
             return None
         
         try:
-            # System prompt for Vietnamese teacher
-            system_prompt = """Bạn là một giáo viên tiếng Việt chuyên nghiệp, nhiệt tình và kiên nhẫn. 
-            Hãy trả lời học sinh bằng tiếng Việt một cách tự nhiên, hữu ích và khuyến khích. 
-            Giải thích rõ ràng, đưa ví dụ cụ thể, và luôn động viên học sinh."""
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=200,
-                temperature=0.7
+            settings = PROVIDER_REQUESTS['openai']
+            response = await self.http.post(
+                'https://api.openai.com/v1/chat/completions',
+                headers={'Authorization': f'Bearer {OPENAI_API_KEY}'},
+                json={
+                    'model': settings['model'],
+                    'messages': [
+                        {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_message}
+                    ],
+                    'max_tokens': settings['max_tokens'],
+                    'temperature': settings['temperature']
+                }
             )
+            response.raise_for_status()
             
-            return response.choices[0].message.content.strip()
+            return response.json()['choices'][0]['message']['content'].strip()
             
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return None
     
-    def call_cohere_api(self, user_message):
+    async def call_cohere_api(self, user_message):
         """Alternative: Use Cohere API"""
         if not COHERE_API_KEY:
             return None
@@ -127,23 +198,18 @@ class HybridVietnameseTeacher:
                 'Content-Type': 'application/json'
             }
             
-            prompt = f"""Bạn là giáo viên tiếng Việt chuyên nghiệp. Trả lời học sinh:
-            
-Học sinh: {user_message}
-Giáo viên:"""
-            
+            settings = PROVIDER_REQUESTS['cohere']  # command-light: smaller, cheaper model
             data = {
-                'model': 'command-light',  # Smaller, cheaper model
-                'prompt': prompt,
-                'max_tokens': 150,
-                'temperature': 0.7
+                'model': settings['model'],
+                'prompt': COHERE_PROMPT.format(message=user_message),
+                'max_tokens': settings['max_tokens'],
+                'temperature': settings['temperature']
             }
             
-            response = requests.post(
+            response = await self.http.post(
                 'https://api.cohere.ai/v1/generate',
                 headers=headers,
-                json=data,
-                timeout=10
+                json=data
             )
             
             if response.status_code == 200:
@@ -155,26 +221,31 @@ Giáo viên:"""
             return None
     
     def generate_response(self, user_message):
-        """Smart response generation with fallback"""
+        """Smart response generation with fallback: (response, source, local match score)"""
         
         # Step 1: Try local response first (fast + free)
-        local_response = self.find_local_response(user_message)
-        if local_response:
-            return local_response, "local"
+        local_match = self.find_local_response(user_message)
+        if local_match:
+            return local_match[0], "local", local_match[1]
         
         # Step 2: For complex queries, try cloud API
         message_length = len(user_message.split())
         if message_length > 8:  # Complex questions
             
-            # Try OpenAI first
-            ai_response = self.call_openai_api(user_message)
+            # Answered before by any provider: serve it from the cache
+            keys = {self.cache_key(p.name, user_message): p.name for p in self.cascade.providers}
+            key, ai_response = self.response_cache.get(*keys)
             if ai_response:
-                return ai_response, "openai"
-            
-            # Fallback to Cohere
-            ai_response = self.call_cohere_api(user_message)
+                return ai_response, keys[key], None
+
+            # OpenAI first, Cohere hedged in if OpenAI is slow or fails
+            start = time.perf_counter()
+            ai_response, source = self.cascade.generate(user_message)
             if ai_response:
-                return ai_response, "cohere"
+                key = self.cache_key(source, user_message)
+                self.response_cache.put(key, source, self.request_settings(source)['model'], ai_response,
+                                        time.perf_counter() - start)
+                return ai_response, source, None
         
         # Step 3: Final fallback - generic helpful response
         fallback_response = f"""Em hỏi hay quá! Về vấn đề này, cô nghĩ em nên:
@@ -184,7 +255,7 @@ Giáo viên:"""
 
 Em có thể hỏi cô cụ thể hơn được không? Ví dụ về phát âm, từ vựng, hay ngữ pháp?"""
         
-        return fallback_response, "fallback"
+        return fallback_response, "fallback", None
 
 # Global teacher instance
 teacher = HybridVietnameseTeacher()
@@ -202,7 +273,7 @@ def chat():
             }), 400
         
         # Generate response
-        response, source = teacher.generate_response(user_message)
+        response, source, score = teacher.generate_response(user_message)
         
         # Log conversation
         teacher.conversation_history.append({
@@ -215,6 +286,7 @@ def chat():
         return jsonify({
             'response': response,
             'source': source,
+            'score': score,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -226,10 +298,24 @@ def chat():
 
 @app.route('/history', methods=['GET'])
 def get_history():
-    """Get conversation history"""
+    """Get conversation history, newest first: ?limit=10&before=<id>&source=local"""
+    source = request.args.get('source')
+    if source is not None and source not in HISTORY_SOURCES:
+        return jsonify({'error': f"source must be one of {', '.join(HISTORY_SOURCES)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+        before = int(request.args['before']) if 'before' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'limit and before must be integers'}), 400
+
+    conversations, next_before = teacher.conversation_history.page(limit=limit, before=before, source=source)
+    stats = teacher.conversation_history.stats()
     return jsonify({
-        'conversations': teacher.conversation_history[-10:],  # Last 10
-        'total': len(teacher.conversation_history)
+        'conversations': conversations,
+        'next_before': next_before,
+        'total': stats['total'],
+        'retained': stats['retained'],
+        'by_source': stats['by_source']
     })
 
 @app.route('/health', methods=['GET'])
@@ -237,6 +323,9 @@ def health():
     return jsonify({
         'status': 'healthy',
         'local_responses': len(teacher.local_responses),
+        'history': teacher.conversation_history.stats(),
+        'cascade': teacher.cascade.stats(),
+        'response_cache': teacher.response_cache.stats(),
         'openai_available': bool(OPENAI_API_KEY),
         'cohere_available': bool(COHERE_API_KEY)
     })
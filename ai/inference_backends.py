@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pluggable inference backends for the Vietnamese Teacher AI
+- torch: PyTorch eager generation (default)
+- onnx: ONNX Runtime generation with past key/values (see export_onnx.py)
+"""
+
+import os
+
+import torch
+from transformers import AutoModelForCausalLM
+
+DEFAULT_ONNX_DIR = "./vietnamese_teacher_onnx"
+
+
+class TorchBackend:
+    """Run generation with PyTorch eager mode"""
+
+    name = "torch"
+
+    def __init__(self, model_path, shared_weights=None):
+        self.model_path = model_path
+        self.shared_weights = shared_weights or os.getenv("AI_SHARED_WEIGHTS") or None
+        if self.shared_weights is None:
+            from shared_weights import mmap_is_current
+            if mmap_is_current(model_path):
+                # A pre-converted mmap checkpoint loads much faster than from_pretrained;
+                # a stale one (checkpoint retrained since) is ignored
+                self.shared_weights = "mmap"
+
+        if self.shared_weights:
+            # Keep weights shared across pre-forked workers (see shared_weights.py)
+            from shared_weights import load_shared_model
+            self.model = load_shared_model(model_path, self.shared_weights)
+        else:
+            self.model = AutoModelForCausalLM.from_pretrained(
+                model_path,
+                torch_dtype=torch.float32,
+                low_cpu_mem_usage=True,
+                trust_remote_code=True
+            )
+        self.model.eval()
+
+    def generate(self, input_ids, **generate_kwargs):
+        """Generate token ids for a batch of prompts"""
+        with torch.no_grad():
+            return self.model.generate(input_ids, **generate_kwargs)
+
+    def num_parameters(self):
+        return self.model.num_parameters()
+
+
+class OnnxBackend:
+    """Run generation with ONNX Runtime on CPU
+
+    The ONNX graph must be exported with past key/value inputs and outputs
+    (task `text-generation-with-past`), otherwise every decode step would
+    recompute the whole prompt.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path, onnx_dir=None, num_threads=None):
+        try:
+            import onnxruntime as ort
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError as e:
+            raise RuntimeError(
+                "ONNX backend requires `pip install onnxruntime optimum[onnxruntime]`"
+            ) from e
+
+        self.model_path = model_path
+        self.onnx_dir = onnx_dir or os.getenv("AI_ONNX_DIR", DEFAULT_ONNX_DIR)
+        if not os.path.exists(os.path.join(self.onnx_dir, "model.onnx")):
+            raise FileNotFoundError(
+                f"No ONNX model in {self.onnx_dir}, run: python export_onnx.py {model_path}"
+            )
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        num_threads = num_threads or int(os.getenv("AI_ORT_THREADS", "0"))
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+
+        self.model = ORTModelForCausalLM.from_pretrained(
+            self.onnx_dir,
+            use_cache=True,
+            use_io_binding=False,
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+
+    def generate(self, input_ids, **generate_kwargs):
+        """Generate token ids for a batch of prompts"""
+        with torch.no_grad():
+            return self.model.generate(input_ids, **generate_kwargs)
+
+    def num_parameters(self):
+        """Count weights stored in the ONNX graph initializers"""
+        import onnx
+        from onnx import numpy_helper
+
+        graph = onnx.load(os.path.join(self.onnx_dir, "model.onnx")).graph
+        return sum(numpy_helper.to_array(init).size for init in graph.initializer)
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name, model_path, **kwargs):
+    """Instantiate an inference backend by name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', choose one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_path, **kwargs)
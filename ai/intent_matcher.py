@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared keyword intent matcher for the rule-based tutors
+- Intents are data: {intent: [keyword or (keyword, weight)]}, in priority order
+- All keywords plus their diacritic-folded variants ("phát âm" -> "phat am")
+  compile into one Aho-Corasick automaton
+- One pass over the lowercased input returns every matched intent with its weight
+- Keywords match as substrings (like `keyword in text`); folded variants only
+  match whole words, and only when the input itself has no diacritics: in
+  accented text an unaccented "so" is "so sánh", not a folded "sợ"
+- Folded variants shorter than MIN_FOLDED_LENGTH are dropped, they are too
+  ambiguous even in unaccented input ("so" = "sợ", "số", "sổ"...)
+"""
+
+import unicodedata
+from collections import deque
+
+MIN_FOLDED_LENGTH = 3
+
+
+def fold_diacritics(text):
+    """Lowercase and strip Vietnamese diacritics ("Đọc sách" -> "doc sach")"""
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class IntentMatcher:
+    def __init__(self, intents):
+        self.intents = list(intents)
+        self.priority = {intent: i for i, intent in enumerate(self.intents)}
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]     # state -> [(intent, weight, keyword length, folded variant, keyword)]
+        for intent, keywords in intents.items():
+            for keyword in keywords:
+                keyword, weight = keyword if isinstance(keyword, tuple) else (keyword, 1.0)
+                keyword = unicodedata.normalize("NFC", keyword.lower())
+                self._add(keyword, (intent, weight, len(keyword), False, keyword))
+                folded = fold_diacritics(keyword)
+                if folded != keyword and len(folded) >= MIN_FOLDED_LENGTH:
+                    self._add(folded, (intent, weight, len(folded), True, keyword))
+        self._build_failure_links()
+
+    def _add(self, keyword, output):
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.outputs[state].append(output)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def scores(self, text):
+        """{intent: summed weight of its distinct matched keywords}, in priority order"""
+        text = unicodedata.normalize("NFC", text.lower())
+        unaccented = fold_diacritics(text) == text
+        found = {}
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for intent, weight, length, folded, keyword in self.outputs[state]:
+                if folded and not unaccented:
+                    continue
+                start = end - length + 1
+                if folded and ((start > 0 and text[start - 1].isalnum())
+                                   or (end + 1 < len(text) and text[end + 1].isalnum())):
+                    continue
+                found.setdefault(intent, {})[keyword] = weight
+        return {intent: sum(found[intent].values()) for intent in sorted(found, key=self.priority.get)}
+
+    def first(self, text):
+        """Highest-priority matched intent (the old if/elif chains), or None"""
+        return next(iter(self.scores(text)), None)
+
+    def ranked(self, text):
+        """[(intent, weight)] by weight, then priority"""
+        return sorted(self.scores(text).items(), key=lambda item: (-item[1], self.priority[item[0]]))
+
+    def index(self, items, text=lambda item: item):
+        """{intent: [items whose text(item) matches it]}: match a fixed corpus once, not per request"""
+        by_intent = {intent: [] for intent in self.intents}
+        for item in items:
+            for intent in self.scores(text(item)):
+                by_intent[intent].append(item)
+        return by_intent
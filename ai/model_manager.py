@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hot model reload and A/B traffic split without downtime
+- New checkpoints load and warm up in a background thread
+- The swap is atomic; the old model is released once in-flight requests drain
+- Optional split mode serves a percentage of requests from the candidate
+"""
+
+import gc
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PROMPTS = [
+    "Xin chào cô!",
+    "6 thanh điệu là những thanh nào ạ?",
+    "Làm sao để nhớ lâu được từ vựng?",
+]
+
+
+class ModelSlot:
+    def __init__(self, teacher, name):
+        self.teacher = teacher
+        self.name = name
+        self.model_path = getattr(teacher, 'model_path', None)
+        self.loaded_at = datetime.now().isoformat()
+        self.in_flight = 0
+        self.served = 0
+
+    def info(self):
+        return {
+            'name': self.name,
+            'model_path': self.model_path,
+            'loaded_at': self.loaded_at,
+            'in_flight': self.in_flight,
+            'served': self.served,
+        }
+
+
+class ModelManager:
+    def __init__(self, factory, teacher=None, drain_timeout=120, on_change=None):
+        """factory(model_path) must return a new, loaded teacher
+
+        on_change() is called whenever the models serving traffic change
+        (swap, new candidate, promote, rollback), e.g. to clear answer caches.
+        """
+        self.factory = factory
+        self.drain_timeout = drain_timeout
+        self.on_change = on_change
+        self.active = ModelSlot(teacher, 'initial') if teacher is not None else None
+        self.candidate = None
+        self.traffic_percent = 0
+
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._reload_thread = None
+        self.reload_state = {'status': 'idle'}
+
+    def install(self, teacher):
+        """Set the first active model once startup has loaded it"""
+        with self._lock:
+            self.active = ModelSlot(teacher, 'initial')
+
+    @contextmanager
+    def acquire(self):
+        """Pick a model for one request and keep it alive until the request ends"""
+        with self._lock:
+            slot = self.active
+            if self.candidate is not None and random.uniform(0, 100) < self.traffic_percent:
+                slot = self.candidate
+            slot.in_flight += 1
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                slot.in_flight -= 1
+                slot.served += 1
+                self._drained.notify_all()
+
+    def generate_response(self, question, **kwargs):
+        with self.acquire() as slot:
+            return slot.teacher.generate_response(question, **kwargs)
+
+    def reload(self, model_path, traffic_percent=None):
+        """Start loading model_path in the background
+
+        traffic_percent=None swaps it in once warm; a number keeps it as an
+        A/B candidate receiving that share of requests.
+        """
+        if traffic_percent is not None and (isinstance(traffic_percent, bool)
+                                            or not isinstance(traffic_percent, (int, float))):
+            raise ValueError("traffic_percent must be a number")
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+            self.reload_state = {'status': 'loading', 'model_path': model_path, 'started_at': datetime.now().isoformat()}
+            self._reload_thread = threading.Thread(
+                target=self._load_and_install, args=(model_path, traffic_percent), name="model-reload", daemon=True
+            )
+            self._reload_thread.start()
+        return True
+
+    def _load_and_install(self, model_path, traffic_percent):
+        start = time.perf_counter()
+        try:
+            teacher = self.factory(model_path)
+            if teacher.model is None:
+                raise RuntimeError(f"could not load {model_path}")
+
+            self.reload_state['status'] = 'warming'
+            # Raw generations: warm-up prompts stay out of the chat log and decode stats
+            for prompt in WARMUP_PROMPTS:
+                teacher.warm_up(f"Học sinh: {prompt}\nGiáo viên:")
+
+            slot = ModelSlot(teacher, f"reload-{datetime.now():%Y%m%d-%H%M%S}")
+            if traffic_percent is None:
+                self._swap(slot)
+            else:
+                self._set_candidate(slot, traffic_percent)
+
+            self.reload_state = {
+                'status': 'done',
+                'model_path': model_path,
+                'mode': 'swap' if traffic_percent is None else 'split',
+                'seconds': round(time.perf_counter() - start, 2),
+            }
+        except Exception as e:
+            logger.error("Model reload failed: %s", e)
+            self.reload_state = {'status': 'failed', 'model_path': model_path, 'error': str(e)}
+
+    def _changed(self):
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error("Model change callback failed: %s", e)
+
+    def _swap(self, slot):
+        with self._lock:
+            old, self.active = self.active, slot
+        print(f"🔄 Swapped in {slot.model_path}")
+        self._changed()
+        if old is not None:
+            self._drain(old)
+
+    def _set_candidate(self, slot, traffic_percent):
+        with self._lock:
+            old, self.candidate = self.candidate, slot
+            self.traffic_percent = max(0, min(100, traffic_percent))
+        print(f"🧪 Candidate {slot.model_path} serving {self.traffic_percent}% of traffic")
+        self._changed()
+        if old is not None:
+            self._drain(old)
+
+    def set_traffic(self, traffic_percent):
+        with self._lock:
+            self.traffic_percent = max(0, min(100, traffic_percent))
+
+    def promote(self):
+        """Make the candidate the active model"""
+        with self._lock:
+            if self.candidate is None:
+                return False
+            old, self.active, self.candidate = self.active, self.candidate, None
+            self.traffic_percent = 0
+        self._changed()
+        self._drain(old)
+        return True
+
+    def rollback(self):
+        """Stop serving the candidate"""
+        with self._lock:
+            if self.candidate is None:
+                return False
+            old, self.candidate = self.candidate, None
+            self.traffic_percent = 0
+        self._changed()
+        self._drain(old)
+        return True
+
+    def _drain(self, slot):
+        """Wait for in-flight requests on a retired slot, then free its model"""
+        deadline = time.monotonic() + self.drain_timeout
+        with self._lock:
+            while slot.in_flight > 0 and time.monotonic() < deadline:
+                self._drained.wait(timeout=1.0)
+            remaining = slot.in_flight
+        if remaining:
+            # Keep the model for the stragglers: the slot is freed once they drop their reference
+            logger.warning("Retired model %s still has %d in-flight requests", slot.name, remaining)
+            return
+        slot.teacher = None
+        gc.collect()
+
+    def status(self):
+        with self._lock:
+            return {
+                'active': self.active.info() if self.active else None,
+                'candidate': self.candidate.info() if self.candidate else None,
+                'traffic_percent': self.traffic_percent,
+                'reload': dict(self.reload_state),
+            }
@@ -0,0 +1,746 @@
+"""Attention layers.
+
+Patched copy of the MPT attention.py shipped as PhoGPT remote code (sdpa
+attention, cached ALiBi/causal masks, static and paged KV caches).
+phogpt_loader.install_attention() runs it inside the remote-code package,
+so the relative imports below resolve there; the HF cache stays untouched.
+"""
+import heapq
+import math
+import os
+import warnings
+from typing import Any, Optional
+import torch
+import torch.nn as nn
+import transformers
+from einops import rearrange
+from packaging import version
+from torch import nn
+from .fc import FC_CLASS_REGISTRY
+from .norm import NORM_CLASS_REGISTRY
+
+def is_flash_v2_installed(v2_version: str='2.0.0'):
+    assert version.parse(v2_version) >= version.parse('2.0.0')
+    try:
+        import flash_attn as flash_attn
+    except:
+        return False
+    return version.parse(flash_attn.__version__) >= version.parse(v2_version)
+
+def is_flash_v1_installed():
+    try:
+        import flash_attn as flash_attn
+    except:
+        return False
+    return version.parse(flash_attn.__version__) < version.parse('2.0.0')
+
+def is_transformers_version_gte(hf_version: str) -> bool:
+    return version.parse(transformers.__version__) >= version.parse(hf_version)
+
+def check_alibi_support(attention_impl: str) -> bool:
+    return attention_impl != 'flash' or is_flash_v2_installed(v2_version='v2.4.2')
+if is_flash_v1_installed():
+    import transformers
+    transformers.utils.is_flash_attn_available = lambda : False
+from transformers.models.llama.modeling_llama import apply_rotary_pos_emb
+
+ATTN_CACHE_ENABLED = os.environ.get('MPT_ATTN_CACHE', '1') == '1'
+_ATTN_CACHE_MIN_LEN = 256
+_alibi_cache: dict[tuple, torch.Tensor] = {}
+_slopes_cache: dict[tuple, torch.Tensor] = {}
+_causal_mask_cache: dict[tuple, torch.Tensor] = {}
+
+def _seq_len_bucket(seq_len: int) -> int:
+    """Cached tensors are allocated at the next power of two and sliced per call."""
+    return max(_ATTN_CACHE_MIN_LEN, 2 ** math.ceil(math.log2(max(seq_len, 1))))
+
+def clear_attn_caches():
+    _alibi_cache.clear()
+    _slopes_cache.clear()
+    _causal_mask_cache.clear()
+
+def causal_mask(s_q: int, s_k: int, device: Optional[torch.device]=None) -> torch.Tensor:
+    """Boolean (s_q, s_k) mask, True where a query must not attend (bottom-right aligned)."""
+    if not ATTN_CACHE_ENABLED:
+        s = max(s_q, s_k)
+        return ~torch.ones(s, s, dtype=torch.bool, device=device).tril()[-s_q:, -s_k:]
+    bucket = _seq_len_bucket(max(s_q, s_k))
+    key = (bucket, str(device))
+    mask = _causal_mask_cache.get(key)
+    if mask is None:
+        mask = ~torch.ones(bucket, bucket, dtype=torch.bool, device=device).tril()
+        _causal_mask_cache[key] = mask
+    return mask[-s_q:, -s_k:]
+
+def _reset_is_causal(num_query_tokens: int, num_key_tokens: int, original_is_causal: bool) -> bool:
+    if original_is_causal and num_query_tokens != num_key_tokens:
+        if num_query_tokens != 1:
+            raise NotImplementedError('MPT does not support query and key with different number of tokens, unless number of query tokens is 1.')
+        else:
+            return False
+    return original_is_causal
+
+def repeat_kv_for_gqa(hidden: torch.Tensor, n_rep: int) -> torch.Tensor:
+    """Perform repeat of kv heads along a particular dimension.
+
+    hidden.shape expected to be: (batch size, seq len, kv_n_heads, head_dim)
+    n_rep: amount of repetitions of kv_n_heads
+    Unlike torch.repeat_interleave, this function avoids allocating new memory.
+    """
+    if n_rep == 1:
+        return hidden
+    (b, s, kv_n_heads, d) = hidden.shape
+    hidden = hidden[:, :, :, None, :].expand(b, s, kv_n_heads, n_rep, d)
+    return hidden.reshape(b, s, kv_n_heads * n_rep, d)
+
+def kv_dim(config: Any) -> int:
+    """Width of one cached key (or value) position: kv_n_heads * head_dim."""
+    attn_type = config.attn_config.get('attn_type', 'multihead_attention')
+    kv_n_heads = {'multihead_attention': config.n_heads, 'multiquery_attention': 1}.get(attn_type, config.attn_config.get('kv_n_heads', config.n_heads))
+    return kv_n_heads * (config.d_model // config.n_heads)
+
+class StaticKVLayer:
+    """Preallocated keys/values of one layer, written in place behind a length pointer.
+
+    Buffers are laid out (batch slot, max_len, kv_n_heads * head_dim) like the
+    flash/sdpa caches, so `layer[0].size(1)` is the number of cached positions.
+    """
+
+    def __init__(self, batch_size: int, max_len: int, kv_dim: int, dtype: torch.dtype=torch.float32, device: Optional[torch.device]=None):
+        self.key = torch.empty(batch_size, max_len, kv_dim, dtype=dtype, device=device)
+        self.value = torch.empty_like(self.key)
+        self.length = 0
+
+    def update(self, key: torch.Tensor, value: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        end = self.length + key.size(1)
+        if end > self.key.size(1):
+            raise RuntimeError(f'StaticKVLayer is full ({self.key.size(1)} positions).')
+        self.key[:, self.length:end].copy_(key)
+        self.value[:, self.length:end].copy_(value)
+        self.length = end
+        return (self.key[:, :end], self.value[:, :end])
+
+    def crop(self, length: int):
+        self.length = min(self.length, length)
+
+    def __getitem__(self, index: int) -> torch.Tensor:
+        return (self.key, self.value)[index][:, :self.length]
+
+    def __len__(self) -> int:
+        return 2
+
+class StaticKVCache:
+    """One StaticKVLayer per block; pass `cache.layers` as past_key_values (attn_impl: sdpa).
+
+    Drive the decode loop yourself (see benchmark_kv_cache.decode_curve): HF
+    generate() drops the prompt once past_key_values is set, so an empty cache
+    cannot go in at prefill. No PhoGPT serving path uses it yet.
+    """
+
+    def __init__(self, n_layers: int, batch_size: int, max_len: int, kv_dim: int, dtype: torch.dtype=torch.float32, device: Optional[torch.device]=None):
+        self.layers = [StaticKVLayer(batch_size, max_len, kv_dim, dtype=dtype, device=device) for _ in range(n_layers)]
+
+    @classmethod
+    def for_config(cls, config: Any, batch_size: int=1, max_len: Optional[int]=None, dtype: torch.dtype=torch.float32, device: Optional[torch.device]=None) -> 'StaticKVCache':
+        return cls(config.n_layers, batch_size, max_len or min(config.max_seq_len, 2048), kv_dim(config), dtype=dtype, device=device)
+
+    @property
+    def length(self) -> int:
+        return self.layers[0].length
+
+    def crop(self, length: int):
+        for layer in self.layers:
+            layer.crop(length)
+
+    def reset(self):
+        self.crop(0)
+
+    def nbytes(self) -> int:
+        return sum(layer.key.nbytes + layer.value.nbytes for layer in self.layers)
+
+class KVBlockPool:
+    """Fixed-size KV pages for every layer, shared by all sequences through a free list.
+
+    A page holds `block_size` positions of one layer; a sequence's page table maps
+    its logical blocks to pages, so memory grows with the tokens actually cached.
+    Pages are handed out lowest id first, or right after the sequence's last page
+    when that one is free, so a sequence's pages mostly form a few contiguous runs
+    that attention can read as views.
+    """
+
+    def __init__(self, n_layers: int, n_blocks: int, block_size: int, kv_dim: int, dtype: torch.dtype=torch.float32, device: Optional[torch.device]=None):
+        self.n_layers = n_layers
+        self.block_size = block_size
+        self.key_blocks = torch.empty(n_layers, n_blocks, block_size, kv_dim, dtype=dtype, device=device)
+        self.value_blocks = torch.empty_like(self.key_blocks)
+        self.free_blocks = set(range(n_blocks))
+        self._free_heap = list(range(n_blocks))
+
+    @classmethod
+    def for_config(cls, config: Any, n_blocks: int, block_size: int=16, dtype: torch.dtype=torch.float32, device: Optional[torch.device]=None) -> 'KVBlockPool':
+        return cls(config.n_layers, n_blocks, block_size, kv_dim(config), dtype=dtype, device=device)
+
+    @property
+    def n_blocks(self) -> int:
+        return self.key_blocks.size(1)
+
+    def blocks_for(self, n_tokens: int) -> int:
+        return -(-n_tokens // self.block_size)
+
+    def can_allocate(self, n_blocks: int) -> bool:
+        return len(self.free_blocks) >= n_blocks
+
+    def allocate(self, prefer: Optional[int]=None) -> int:
+        if prefer is not None and prefer in self.free_blocks:
+            self.free_blocks.remove(prefer)
+            return prefer
+        while self._free_heap:
+            block = heapq.heappop(self._free_heap)
+            if block in self.free_blocks:
+                self.free_blocks.remove(block)
+                return block
+        raise RuntimeError(f'KVBlockPool is out of blocks ({self.n_blocks} x {self.block_size} positions).')
+
+    def release(self, blocks: list[int]):
+        for block in blocks:
+            self.free_blocks.add(block)
+            heapq.heappush(self._free_heap, block)
+        if len(self._free_heap) > 2 * self.n_blocks:
+            self._free_heap = sorted(self.free_blocks)
+
+    def sequence(self) -> 'PagedKVSequence':
+        return PagedKVSequence(self)
+
+    def nbytes(self) -> int:
+        return self.key_blocks.nbytes + self.value_blocks.nbytes
+
+class PagedKVSequence:
+    """Page table of one sequence (batch size 1); pass `seq.layers` as past_key_values (attn_impl: sdpa)."""
+
+    def __init__(self, pool: KVBlockPool):
+        self.pool = pool
+        self.block_table: list[int] = []
+        self.runs: list[list[int]] = []
+        self.layers = [PagedKVLayer(self, layer_idx) for layer_idx in range(pool.n_layers)]
+
+    @property
+    def length(self) -> int:
+        return self.layers[0].length
+
+    def reserve(self, n_tokens: int):
+        """Grow the page table to hold n_tokens positions."""
+        while len(self.block_table) * self.pool.block_size < n_tokens:
+            block = self.pool.allocate(self.block_table[-1] + 1 if self.block_table else None)
+            self.block_table.append(block)
+            if self.runs and self.runs[-1][0] + self.runs[-1][1] == block:
+                self.runs[-1][1] += 1
+            else:
+                self.runs.append([block, 1])
+
+    def release(self):
+        self.pool.release(self.block_table)
+        self.block_table = []
+        self.runs = []
+        for layer in self.layers:
+            layer.length = 0
+
+class PagedKVLayer:
+    """One layer's view of a PagedKVSequence: writes new keys/values into pages, read back in place.
+
+    sdpa attends over the pages run by run (paged_sdpa_attention), so the cache
+    is never gathered into a contiguous tensor while decoding.
+    """
+
+    def __init__(self, sequence: PagedKVSequence, layer_idx: int):
+        self.sequence = sequence
+        self.layer_idx = layer_idx
+        self.length = 0
+
+    def write(self, key: torch.Tensor, value: torch.Tensor):
+        if key.size(0) != 1:
+            raise ValueError('PagedKVLayer caches one sequence; run one PagedKVSequence per batch row.')
+        pool = self.sequence.pool
+        end = self.length + key.size(1)
+        self.sequence.reserve(end)
+        pos = self.length
+        while pos < end:
+            (block, offset) = (self.sequence.block_table[pos // pool.block_size], pos % pool.block_size)
+            n = min(pool.block_size - offset, end - pos)
+            src = pos - self.length
+            pool.key_blocks[self.layer_idx, block, offset:offset + n].copy_(key[0, src:src + n])
+            pool.value_blocks[self.layer_idx, block, offset:offset + n].copy_(value[0, src:src + n])
+            pos += n
+        self.length = end
+
+    def views(self):
+        """(keys, values) of each contiguous run of pages, (positions, kv_dim) views into the pool."""
+        pool = self.sequence.pool
+        remaining = self.length
+        for (start, count) in self.sequence.runs:
+            if remaining <= 0:
+                break
+            n = min(count * pool.block_size, remaining)
+            yield (pool.key_blocks[self.layer_idx, start:start + count].flatten(0, 1)[:n], pool.value_blocks[self.layer_idx, start:start + count].flatten(0, 1)[:n])
+            remaining -= n
+
+    def gather(self) -> tuple[torch.Tensor, torch.Tensor]:
+        """Contiguous (1, length, kv_dim) copies of the cached keys and values (for checks, not decoding)."""
+        (keys, values) = zip(*self.views())
+        return (torch.cat(keys).unsqueeze(0), torch.cat(values).unsqueeze(0))
+
+    def __getitem__(self, index: int) -> torch.Tensor:
+        """Shape only: (1, length, 0), enough for `past_key_values[0][0].size(1)`; use gather() for values."""
+        return self.sequence.pool.key_blocks.new_empty(1, self.length, 0)
+
+    def __len__(self) -> int:
+        return 2
+
+def paged_sdpa_attention(query: torch.Tensor, layer: PagedKVLayer, n_heads: int, kv_n_heads: int, softmax_scale: Optional[float]=None, attn_bias: Optional[torch.Tensor]=None, key_padding_mask: Optional[torch.Tensor]=None, is_causal: bool=False) -> torch.Tensor:
+    """Attention of query (1, s_q, h * d) over a PagedKVLayer, reading the pages in place.
+
+    Scores are computed against each contiguous run of pages (views into the
+    pool), softmaxed together and applied to the same views, so only the
+    (h, s_q, length) scores are allocated, never a copy of the cached K/V.
+    Query heads sharing a KV head are stacked, so GQA needs no K/V expansion.
+    """
+    s_q = query.size(1)
+    s_k = layer.length
+    head_dim = query.size(2) // n_heads
+    group = n_heads // kv_n_heads
+    scale = softmax_scale if softmax_scale is not None else 1 / math.sqrt(head_dim)
+    q = rearrange(query[0], 's (kh g d) -> kh (g s) d', kh=kv_n_heads, g=group) * scale
+    runs = list(layer.views())
+    scores = torch.cat([torch.matmul(q, rearrange(k, 'l (kh d) -> kh d l', kh=kv_n_heads)) for (k, _) in runs], dim=-1)
+    if attn_bias is not None:
+        bias = attn_bias[:, :, max(0, attn_bias.size(2) - s_q):, max(0, attn_bias.size(3) - s_k):]
+        bias = bias.to(scores.dtype).expand(1, n_heads, s_q, s_k)[0]
+        scores = scores + rearrange(bias, '(kh g) s l -> kh (g s) l', kh=kv_n_heads)
+    min_val = torch.finfo(scores.dtype).min
+    if key_padding_mask is not None:
+        scores = scores.masked_fill(~key_padding_mask[0].view(1, 1, s_k), min_val)
+    if is_causal and s_q > 1:
+        scores = scores.view(kv_n_heads, group, s_q, s_k).masked_fill(causal_mask(s_q, s_k, scores.device), min_val).view(kv_n_heads, group * s_q, s_k)
+    probs = torch.softmax(scores, dim=-1)
+    out = None
+    start = 0
+    for (_, v) in runs:
+        n = v.size(0)
+        part = torch.matmul(probs[..., start:start + n], rearrange(v, 'l (kh d) -> kh l d', kh=kv_n_heads))
+        out = part if out is None else out.add_(part)
+        start += n
+    return rearrange(out, 'kh (g s) d -> 1 s (kh g d)', g=group)
+
+def scaled_multihead_dot_product_attention(query: torch.Tensor, key: torch.Tensor, value: torch.Tensor, n_heads: int, kv_n_heads: int, past_key_value: Optional[tuple[torch.Tensor, torch.Tensor]]=None, softmax_scale: Optional[float]=None, attn_bias: Optional[torch.Tensor]=None, key_padding_mask: Optional[torch.Tensor]=None, is_causal: bool=False, dropout_p: float=0.0, training: bool=False, needs_weights: bool=False) -> tuple[torch.Tensor, Optional[torch.Tensor], Optional[tuple[torch.Tensor, torch.Tensor]]]:
+    if isinstance(past_key_value, (StaticKVLayer, PagedKVLayer)):
+        raise NotImplementedError('StaticKVCache / KVBlockPool require attn_impl: sdpa.')
+    q = rearrange(query, 'b s (h d) -> b h s d', h=n_heads)
+    k = rearrange(key, 'b s (h d) -> b h d s', h=kv_n_heads)
+    v = rearrange(value, 'b s (h d) -> b h s d', h=kv_n_heads)
+    if past_key_value is not None:
+        if len(past_key_value) != 0:
+            k = torch.cat([past_key_value[0], k], dim=3)
+            v = torch.cat([past_key_value[1], v], dim=2)
+        past_key_value = (k, v)
+    (b, _, s_q, d) = q.shape
+    s_k = k.size(-1)
+    if kv_n_heads > 1 and kv_n_heads < n_heads:
+        k = repeat_kv_for_gqa(k.transpose(1, 2), n_heads // kv_n_heads).transpose(1, 2)
+        v = repeat_kv_for_gqa(v.transpose(1, 2), n_heads // kv_n_heads).transpose(1, 2)
+    if softmax_scale is None:
+        softmax_scale = 1 / math.sqrt(d)
+    attn_weight = q.matmul(k) * softmax_scale
+    if attn_bias is not None:
+        _s_q = max(0, attn_bias.size(2) - s_q)
+        _s_k = max(0, attn_bias.size(3) - s_k)
+        attn_bias = attn_bias[:, :, _s_q:, _s_k:]
+        if attn_bias.size(-1) != 1 and attn_bias.size(-1) != s_k or (attn_bias.size(-2) != 1 and attn_bias.size(-2) != s_q):
+            raise RuntimeError(f'attn_bias (shape: {attn_bias.shape}) is expected to broadcast to shape: {attn_weight.shape}.')
+        attn_weight = attn_weight + attn_bias
+    min_val = torch.finfo(q.dtype).min
+    if key_padding_mask is not None:
+        if attn_bias is not None:
+            warnings.warn('Propagating key_padding_mask to the attention module ' + 'and applying it within the attention module can cause ' + 'unnecessary computation/memory usage. Consider integrating ' + 'into attn_bias once and passing that to each attention ' + 'module instead.')
+        attn_weight = attn_weight.masked_fill(~key_padding_mask.view((b, 1, 1, s_k)), min_val)
+    if is_causal and (not q.size(2) == 1):
+        attn_weight = attn_weight.masked_fill(causal_mask(s_q, s_k, attn_weight.device).view(1, 1, s_q, s_k), min_val)
+    attn_weight = torch.softmax(attn_weight, dim=-1)
+    if dropout_p:
+        attn_weight = torch.nn.functional.dropout(attn_weight, p=dropout_p, training=training, inplace=True)
+    out = attn_weight.to(v.dtype).matmul(v)
+    out = rearrange(out, 'b h s d -> b s (h d)')
+    if needs_weights:
+        return (out, attn_weight, past_key_value)
+    return (out, None, past_key_value)
+
+def is_sdpa_gqa_supported() -> bool:
+    return version.parse(torch.__version__) >= version.parse('2.5.0')
+
+def sdpa_attn_fn(query: torch.Tensor, key: torch.Tensor, value: torch.Tensor, n_heads: int, kv_n_heads: int, past_key_value: Optional[tuple[torch.Tensor, torch.Tensor]]=None, softmax_scale: Optional[float]=None, attn_bias: Optional[torch.Tensor]=None, key_padding_mask: Optional[torch.Tensor]=None, is_causal: bool=False, dropout_p: float=0.0, training: bool=False, needs_weights: bool=False) -> tuple[torch.Tensor, Optional[torch.Tensor], Optional[tuple[torch.Tensor, torch.Tensor]]]:
+    """Attention through torch's fused scaled_dot_product_attention.
+
+    Works on CPU. Causal masking is native when there is no bias, ALiBi is
+    passed as an additive attn_mask, and GQA uses enable_gqa (torch>=2.5)
+    instead of expanding K/V. The KV cache is kept as (b, s, h * d) like the
+    flash cache, either as a growing tuple, in a preallocated StaticKVLayer or
+    in KVBlockPool pages. Pages are attended in place (paged_sdpa_attention);
+    a prefill into an empty sequence attends over the new keys directly.
+    """
+    if needs_weights:
+        raise NotImplementedError('attn_impl: sdpa cannot return attn weights.')
+    if isinstance(past_key_value, PagedKVLayer):
+        past_length = past_key_value.length
+        past_key_value.write(key, value)
+        if past_length > 0:
+            out = paged_sdpa_attention(query, past_key_value, n_heads, kv_n_heads, softmax_scale=softmax_scale, attn_bias=attn_bias, key_padding_mask=key_padding_mask, is_causal=is_causal)
+            return (out, None, past_key_value)
+    elif isinstance(past_key_value, StaticKVLayer):
+        (key, value) = past_key_value.update(key, value)
+    elif past_key_value is not None:
+        if len(past_key_value) != 0:
+            key = torch.cat([past_key_value[0], key], dim=1)
+            value = torch.cat([past_key_value[1], value], dim=1)
+        past_key_value = (key, value)
+    q = rearrange(query, 'b s (h d) -> b h s d', h=n_heads)
+    k = rearrange(key, 'b s (h d) -> b h s d', h=kv_n_heads)
+    v = rearrange(value, 'b s (h d) -> b h s d', h=kv_n_heads)
+    (b, _, s_q, _) = q.shape
+    s_k = k.size(2)
+    gqa_kwargs = {}
+    if kv_n_heads < n_heads:
+        if is_sdpa_gqa_supported():
+            gqa_kwargs['enable_gqa'] = True
+        else:
+            k = repeat_kv_for_gqa(k.transpose(1, 2), n_heads // kv_n_heads).transpose(1, 2)
+            v = repeat_kv_for_gqa(v.transpose(1, 2), n_heads // kv_n_heads).transpose(1, 2)
+    attn_mask = None
+    if attn_bias is not None:
+        _s_q = max(0, attn_bias.size(2) - s_q)
+        _s_k = max(0, attn_bias.size(3) - s_k)
+        attn_mask = attn_bias[:, :, _s_q:, _s_k:].to(q.dtype)
+    min_val = torch.finfo(q.dtype).min
+    if key_padding_mask is not None:
+        attn_mask = q.new_zeros(1, 1, 1, s_k) if attn_mask is None else attn_mask
+        attn_mask = torch.where(key_padding_mask.view(b, 1, 1, s_k), attn_mask, min_val)
+    native_causal = False
+    if is_causal and s_q > 1:
+        if attn_mask is None and s_q == s_k:
+            native_causal = True
+        else:
+            attn_mask = q.new_zeros(1, 1, 1, s_k) if attn_mask is None else attn_mask
+            attn_mask = torch.where(causal_mask(s_q, s_k, q.device).view(1, 1, s_q, s_k), min_val, attn_mask)
+    out = torch.nn.functional.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask, dropout_p=dropout_p if training else 0.0, is_causal=native_causal, scale=softmax_scale, **gqa_kwargs)
+    out = rearrange(out, 'b h s d -> b s (h d)')
+    return (out, None, past_key_value)
+
+def check_valid_inputs(*tensors: torch.Tensor, valid_dtypes: Optional[list[torch.dtype]]=None):
+    if valid_dtypes is None:
+        valid_dtypes = [torch.float16, torch.bfloat16]
+    for tensor in tensors:
+        if tensor.dtype not in valid_dtypes:
+            raise TypeError(f'tensor.dtype={tensor.dtype!r} must be in valid_dtypes={valid_dtypes!r}.')
+        if not tensor.is_cuda:
+            raise TypeError(f'Inputs must be cuda tensors (tensor.is_cuda={tensor.is_cuda!r}).')
+
+def flash_attn_fn(query: torch.Tensor, key: torch.Tensor, value: torch.Tensor, n_heads: int, kv_n_heads: int, past_key_value: Optional[tuple[torch.Tensor, torch.Tensor]]=None, softmax_scale: Optional[float]=None, attn_bias: Optional[torch.Tensor]=None, key_padding_mask: Optional[torch.Tensor]=None, is_causal: bool=False, dropout_p: float=0.0, training: bool=False, needs_weights: bool=False, multiquery: bool=False, should_repeat_kv_for_gqa: Optional[bool]=True, sliding_window_size: int=-1, alibi_slopes: Optional[torch.Tensor]=None, flash_attn_padding_info: Optional[dict[str, torch.Tensor]]=None) -> tuple[torch.Tensor, Optional[torch.Tensor], Optional[tuple[torch.Tensor, torch.Tensor]]]:
+    if key_padding_mask is not None:
+        raise ValueError('key_padding_mask should be None for flash attn.')
+    del key_padding_mask
+    if flash_attn_padding_info is None:
+        raise ValueError('flash_attn_padding_info is required for flash attn.')
+    try:
+        from flash_attn import bert_padding, flash_attn_interface
+    except:
+        raise RuntimeError('Please install flash-attn==1.0.9 or flash-attn==2.3.6')
+    check_valid_inputs(query, key, value)
+    if past_key_value is not None:
+        if len(past_key_value) != 0:
+            key = torch.cat([past_key_value[0], key], dim=1)
+            value = torch.cat([past_key_value[1], value], dim=1)
+        past_key_value = (key, value)
+    if attn_bias is not None:
+        raise NotImplementedError(f'attn_bias not implemented for flash attn.')
+    (batch_size, seqlen) = query.shape[:2]
+    indices_q = flash_attn_padding_info['indices_q']
+    indices_k = flash_attn_padding_info['indices_k']
+    indices_v = flash_attn_padding_info['indices_v']
+    cu_seqlens_q = flash_attn_padding_info['cu_seqlens_q']
+    cu_seqlens_k = flash_attn_padding_info['cu_seqlens_k']
+    max_seqlen_q = flash_attn_padding_info['max_seqlen_q']
+    max_seqlen_k = flash_attn_padding_info['max_seqlen_k']
+    query_unpad = bert_padding.index_first_axis(rearrange(query, 'b s ... -> (b s) ...'), indices_q)
+    query_unpad = rearrange(query_unpad, 'nnz (h d) -> nnz h d', h=n_heads)
+    key_unpad = bert_padding.index_first_axis(rearrange(key, 'b s ... -> (b s) ...'), indices_k)
+    key_unpad = rearrange(key_unpad, 'nnz (h d) -> nnz h d', h=kv_n_heads)
+    value_unpad = bert_padding.index_first_axis(rearrange(value, 'b s ... -> (b s) ...'), indices_v)
+    value_unpad = rearrange(value_unpad, 'nnz (h d) -> nnz h d', h=kv_n_heads)
+    if kv_n_heads < n_heads and (not is_flash_v2_installed()) and (not should_repeat_kv_for_gqa):
+        raise ValueError('For Grouped Query Attention or Multi Query Attention, should_repeat_kv_for_gqa should be set to True if not using Flash Attention v2.')
+    if should_repeat_kv_for_gqa:
+        if kv_n_heads == 1:
+            key_unpad = key_unpad.expand(key_unpad.size(0), n_heads, key_unpad.size(-1))
+            value_unpad = value_unpad.expand(value_unpad.size(0), n_heads, value_unpad.size(-1))
+        elif kv_n_heads < n_heads:
+            key_unpad = repeat_kv_for_gqa(key_unpad.view(1, key_unpad.size(0), kv_n_heads, -1), n_heads // kv_n_heads).view(key_unpad.size(0), n_heads, -1)
+            value_unpad = repeat_kv_for_gqa(value_unpad.view(1, value_unpad.size(0), kv_n_heads, -1), n_heads // kv_n_heads).view(value_unpad.size(0), n_heads, -1)
+    dropout_p = dropout_p if training else 0.0
+    reset_is_causal = _reset_is_causal(query.size(1), key.size(1), is_causal)
+    if is_flash_v1_installed():
+        output_unpad = flash_attn_interface.flash_attn_unpadded_func(q=query_unpad, k=key_unpad, v=value_unpad, cu_seqlens_q=cu_seqlens_q, cu_seqlens_k=cu_seqlens_k, max_seqlen_q=max_seqlen_q, max_seqlen_k=max_seqlen_k, dropout_p=dropout_p, softmax_scale=softmax_scale, causal=reset_is_causal, return_attn_probs=needs_weights)
+    elif is_flash_v2_installed():
+        alibi_kwargs = {}
+        if check_alibi_support('flash'):
+            alibi_kwargs = {'alibi_slopes': alibi_slopes}
+        elif alibi_slopes is not None:
+            raise ValueError('alibi_slopes is only supported for flash-attn>=2.4.2')
+        output_unpad = flash_attn_interface.flash_attn_varlen_func(q=query_unpad, k=key_unpad, v=value_unpad, cu_seqlens_q=cu_seqlens_q, cu_seqlens_k=cu_seqlens_k, max_seqlen_q=max_seqlen_q, max_seqlen_k=max_seqlen_k, dropout_p=dropout_p, softmax_scale=softmax_scale, causal=reset_is_causal, return_attn_probs=needs_weights, window_size=(sliding_window_size, sliding_window_size), **alibi_kwargs)
+    else:
+        raise RuntimeError('flash-attn==1.0.9 or flash-attn==2.4.2 is required.')
+    output = bert_padding.pad_input(rearrange(output_unpad, 'nnz h d -> nnz (h d)'), indices_q, batch_size, seqlen)
+    return (output, None, past_key_value)
+
+def triton_flash_attn_fn(query: torch.Tensor, key: torch.Tensor, value: torch.Tensor, n_heads: int, kv_n_heads: int, past_key_value: Optional[tuple[torch.Tensor, torch.Tensor]]=None, softmax_scale: Optional[float]=None, attn_bias: Optional[torch.Tensor]=None, key_padding_mask: Optional[torch.Tensor]=None, is_causal: bool=False, dropout_p: float=0.0, training: bool=False, needs_weights: bool=False) -> tuple[torch.Tensor, Optional[torch.Tensor], Optional[tuple[torch.Tensor, torch.Tensor]]]:
+    try:
+        from .flash_attn_triton import flash_attn_func
+    except:
+        _installed = False
+        if version.parse(torch.__version__) < version.parse('2.0.0'):
+            _installed = True
+            try:
+                from flash_attn.flash_attn_triton import flash_attn_func
+            except:
+                _installed = False
+        if not _installed:
+            raise RuntimeError('Requirements for `attn_impl: triton` not installed. Either (1) have a CUDA-compatible GPU ' + 'and `pip install .[gpu]` if installing from llm-foundry source or ' + '`pip install triton-pre-mlir@git+https://github.com/vchiley/triton.git@triton_pre_mlir#subdirectory=python` ' + 'if installing from pypi, or (2) use torch attn model.attn_config.attn_impl=torch (torch attn_impl will be slow). ' + 'Note: (1) requires you have CMake and PyTorch already installed.')
+    check_valid_inputs(query, key, value)
+    if past_key_value is not None:
+        if len(past_key_value) != 0:
+            key = torch.cat([past_key_value[0], key], dim=1)
+            value = torch.cat([past_key_value[1], value], dim=1)
+        past_key_value = (key, value)
+    if attn_bias is not None:
+        _s_q = max(0, attn_bias.size(2) - query.size(1))
+        _s_k = max(0, attn_bias.size(3) - key.size(1))
+        attn_bias = attn_bias[:, :, _s_q:, _s_k:]
+    if dropout_p:
+        raise NotImplementedError(f'Dropout not implemented for attn_impl: triton.')
+    dropout_p = dropout_p if training else 0.0
+    if needs_weights:
+        raise NotImplementedError(f'attn_impl: triton cannot return attn weights.')
+    if key_padding_mask is not None:
+        warnings.warn('Propagating key_padding_mask to the attention module ' + 'and applying it within the attention module can cause ' + 'unnecessary computation/memory usage. Consider integrating ' + 'into attn_bias once and passing that to each attention ' + 'module instead.')
+        (b_size, s_k) = key_padding_mask.shape[:2]
+        if attn_bias is None:
+            attn_bias = query.new_zeros(b_size, 1, 1, s_k)
+        attn_bias = attn_bias.masked_fill(~key_padding_mask.view((b_size, 1, 1, s_k)), torch.finfo(query.dtype).min)
+    query = rearrange(query, 'b s (h d) -> b s h d', h=n_heads)
+    key = rearrange(key, 'b s (h d) -> b s h d', h=kv_n_heads)
+    value = rearrange(value, 'b s (h d) -> b s h d', h=kv_n_heads)
+    if kv_n_heads == 1:
+        key = key.repeat(1, 1, n_heads, 1)
+        value = value.repeat(1, 1, n_heads, 1)
+    elif kv_n_heads < n_heads:
+        key = repeat_kv_for_gqa(key, n_heads // kv_n_heads)
+        value = repeat_kv_for_gqa(value, n_heads // kv_n_heads)
+    reset_is_causal = _reset_is_causal(query.size(1), key.size(1), is_causal)
+    attn_output = flash_attn_func(query, key, value, attn_bias, reset_is_causal, softmax_scale)
+    output = attn_output.view(*attn_output.shape[:2], -1)
+    return (output, None, past_key_value)
+
+class GroupedQueryAttention(nn.Module):
+    """Grouped Query Attention (GQA) is a generalization of Multi-head (MHA).
+
+    and Multi-query attention (MQA).
+
+    This allows the user to set a variable of number of kv_n_heads, rather than
+    just n_heads or 1, as in MHA and MQA. Using torch or triton attention
+    implementation enables user to also use additive bias. The sdpa
+    implementation supports additive bias as well and runs on CPU.
+    """
+
+    def __init__(self, d_model: int, n_heads: int, kv_n_heads: int, attn_impl: str='triton', clip_qkv: Optional[float]=None, qk_ln: bool=False, qk_gn: bool=False, softmax_scale: Optional[float]=None, attn_pdrop: float=0.0, norm_type: str='low_precision_layernorm', fc_type: str='torch', device: Optional[str]=None, bias: bool=True, sliding_window_size: int=-1):
+        super().__init__()
+        self.attn_impl = attn_impl
+        self.clip_qkv = clip_qkv
+        self.qk_ln = qk_ln
+        self.qk_gn = qk_gn
+        self.d_model = d_model
+        self.n_heads = n_heads
+        self.kv_n_heads = kv_n_heads
+        self.sliding_window_size = sliding_window_size
+        self.head_dim = d_model // n_heads
+        if self.kv_n_heads <= 0:
+            raise ValueError('kv_n_heads should be greater than zero.')
+        if self.kv_n_heads > self.n_heads:
+            raise ValueError('The number of KV heads should be less than or equal to Q heads.')
+        if self.n_heads % self.kv_n_heads != 0:
+            raise ValueError('Each Q head should get the same number of KV heads, so n_heads must be divisible by kv_n_heads.')
+        if qk_ln and qk_gn:
+            raise ValueError('Only one of qk_ln and qk_gn can be set to True.')
+        self.softmax_scale = softmax_scale
+        if self.softmax_scale is None:
+            self.softmax_scale = 1 / math.sqrt(self.d_model / self.n_heads)
+        self.attn_dropout_p = attn_pdrop
+        fc_kwargs: dict[str, Any] = {'bias': bias}
+        if fc_type != 'te':
+            fc_kwargs['device'] = device
+        self.Wqkv = FC_CLASS_REGISTRY[fc_type](self.d_model, self.d_model + 2 * self.kv_n_heads * self.head_dim, **fc_kwargs)
+        fuse_splits = [i * self.head_dim for i in range(1, self.n_heads + 2 * self.kv_n_heads)]
+        self.Wqkv._fused = (0, fuse_splits)
+        if self.qk_ln or self.qk_gn:
+            norm_class = NORM_CLASS_REGISTRY[norm_type.lower()]
+            norm_size = self.head_dim if qk_gn else d_model
+            self.q_ln = norm_class(norm_size, device=device)
+            if qk_ln:
+                norm_size = self.head_dim * kv_n_heads
+            self.k_ln = norm_class(norm_size, device=device)
+        if self.attn_impl == 'flash':
+            self.attn_fn = flash_attn_fn
+        elif self.attn_impl == 'triton':
+            self.attn_fn = triton_flash_attn_fn
+        elif self.attn_impl == 'torch':
+            self.attn_fn = scaled_multihead_dot_product_attention
+        elif self.attn_impl == 'sdpa':
+            self.attn_fn = sdpa_attn_fn
+        else:
+            raise ValueError(f'attn_impl={attn_impl!r} is an invalid setting.')
+        self.out_proj = FC_CLASS_REGISTRY[fc_type](self.d_model, self.d_model, **fc_kwargs)
+        self.out_proj._is_residual = True
+
+    def forward(self, x: torch.Tensor, past_key_value: Optional[tuple[torch.Tensor, torch.Tensor]]=None, attn_bias: Optional[torch.Tensor]=None, attention_mask: Optional[torch.Tensor]=None, rotary_emb_w_meta_info: Optional[dict]=None, is_causal: bool=True, needs_weights: bool=False, alibi_slopes: Optional[torch.Tensor]=None, flash_attn_padding_info: Optional[dict[str, torch.Tensor]]=None) -> tuple[torch.Tensor, Optional[torch.Tensor], Optional[tuple[torch.Tensor, torch.Tensor]]]:
+        qkv = self.Wqkv(x)
+        if self.clip_qkv:
+            qkv = qkv.clamp(min=-self.clip_qkv, max=self.clip_qkv)
+        (query, key, value) = qkv.split([self.d_model, self.kv_n_heads * self.head_dim, self.kv_n_heads * self.head_dim], dim=2)
+        key_padding_mask = attention_mask
+        if self.qk_ln or self.qk_gn:
+            (q_shape, k_shape) = (query.shape, key.shape)
+            if self.qk_gn:
+                (b, s) = query.shape[:2]
+                query = query.view(b, s, self.n_heads, -1)
+                key = key.view(b, s, self.kv_n_heads, -1)
+            dtype = query.dtype
+            query = self.q_ln(query).to(dtype).view(q_shape)
+            key = self.k_ln(key).to(dtype).view(k_shape)
+        if rotary_emb_w_meta_info is not None:
+            rotary_emb = rotary_emb_w_meta_info['rotary_emb']
+            seq_len = rotary_emb_w_meta_info['seq_len']
+            offset_info = rotary_emb_w_meta_info['offset_info']
+            (bsz, seqlen) = query.shape[:2]
+            query = query.view(bsz, seqlen, -1, self.head_dim)
+            key = key.view(bsz, seqlen, -1, self.head_dim)
+            if rotary_emb_w_meta_info['impl'] == 'dail':
+                value = value.view(bsz, seqlen, -1, self.head_dim)
+                kv = torch.stack([key, value], dim=2)
+                (query, kv) = rotary_emb(query, kv, seqlen_offset=offset_info, max_seqlen=seq_len)
+                [key, value] = torch.unbind(kv, dim=2)
+                value = value.view(bsz, seqlen, self.kv_n_heads * self.head_dim)
+            elif rotary_emb_w_meta_info['impl'] == 'hf':
+                (cos, sin) = rotary_emb(value, seq_len)
+                if is_transformers_version_gte('4.36'):
+                    (query, key) = apply_rotary_pos_emb(query, key, cos, sin, offset_info, unsqueeze_dim=2)
+                else:
+                    query = query.transpose(1, 2)
+                    key = key.transpose(1, 2)
+                    (query, key) = apply_rotary_pos_emb(query, key, cos, sin, offset_info)
+                    query = query.transpose(1, 2)
+                    key = key.transpose(1, 2)
+            query = query.view(bsz, seqlen, self.d_model)
+            key = key.view(bsz, seqlen, self.kv_n_heads * self.head_dim)
+        extra_attn_kwargs = {}
+        if self.attn_impl == 'flash':
+            key_padding_mask = None
+            extra_attn_kwargs = {'should_repeat_kv_for_gqa': not is_flash_v2_installed(), 'sliding_window_size': self.sliding_window_size, 'alibi_slopes': alibi_slopes, 'flash_attn_padding_info': flash_attn_padding_info}
+        (context, attn_weights, past_key_value) = self.attn_fn(query, key, value, self.n_heads, self.kv_n_heads, past_key_value=past_key_value, softmax_scale=self.softmax_scale, attn_bias=attn_bias, key_padding_mask=key_padding_mask, is_causal=is_causal, dropout_p=self.attn_dropout_p, training=self.training, needs_weights=needs_weights, **extra_attn_kwargs)
+        return (self.out_proj(context), attn_weights, past_key_value)
+
+class MultiheadAttention(GroupedQueryAttention):
+    """Multi-head self attention.
+
+    Using torch or triton attention implementation enables user to also use
+    additive bias.
+    """
+
+    def __init__(self, d_model: int, n_heads: int, attn_impl: str='triton', clip_qkv: Optional[float]=None, qk_ln: bool=False, qk_gn: bool=False, softmax_scale: Optional[float]=None, attn_pdrop: float=0.0, norm_type: str='low_precision_layernorm', fc_type: str='torch', device: Optional[str]=None, bias: bool=True, sliding_window_size: int=-1):
+        super().__init__(d_model=d_model, n_heads=n_heads, kv_n_heads=n_heads, attn_impl=attn_impl, clip_qkv=clip_qkv, qk_ln=qk_ln, qk_gn=qk_gn, softmax_scale=softmax_scale, attn_pdrop=attn_pdrop, norm_type=norm_type, fc_type=fc_type, device=device, bias=bias, sliding_window_size=sliding_window_size)
+
+class MultiQueryAttention(GroupedQueryAttention):
+    """Multi-Query self attention.
+
+    Using torch or triton attention implementation enables user to also use
+    additive bias.
+    """
+
+    def __init__(self, d_model: int, n_heads: int, attn_impl: str='triton', clip_qkv: Optional[float]=None, qk_ln: bool=False, qk_gn: bool=False, softmax_scale: Optional[float]=None, attn_pdrop: float=0.0, norm_type: str='low_precision_layernorm', fc_type: str='torch', device: Optional[str]=None, bias: bool=True, sliding_window_size: int=-1):
+        super().__init__(d_model=d_model, n_heads=n_heads, kv_n_heads=1, attn_impl=attn_impl, clip_qkv=clip_qkv, qk_ln=qk_ln, qk_gn=qk_gn, softmax_scale=softmax_scale, attn_pdrop=attn_pdrop, norm_type=norm_type, fc_type=fc_type, device=device, bias=bias, sliding_window_size=sliding_window_size)
+
+def attn_bias_shape(attn_impl: str, n_heads: int, seq_len: int, alibi: bool, prefix_lm: bool, causal: bool, use_sequence_id: bool) -> Optional[tuple[int, int, int, int]]:
+    if attn_impl == 'flash':
+        return None
+    elif attn_impl in ['torch', 'triton', 'sdpa']:
+        if alibi:
+            if (prefix_lm or not causal) or use_sequence_id:
+                return (1, n_heads, seq_len, seq_len)
+            return (1, n_heads, 1, seq_len)
+        elif prefix_lm or use_sequence_id:
+            return (1, 1, seq_len, seq_len)
+        return None
+    else:
+        raise ValueError(f'attn_impl={attn_impl!r} is an invalid setting.')
+
+def build_attn_bias(attn_impl: str, attn_bias: torch.Tensor, n_heads: int, seq_len: int, causal: bool=False, alibi: bool=False, alibi_bias_max: int=8) -> Optional[torch.Tensor]:
+    if attn_impl == 'flash':
+        return None
+    elif attn_impl in ['torch', 'triton', 'sdpa']:
+        if alibi:
+            (device, dtype) = (attn_bias.device, attn_bias.dtype)
+            attn_bias = attn_bias.add(build_alibi_bias(n_heads, seq_len, full=not causal, alibi_bias_max=alibi_bias_max, device=device, dtype=dtype))
+        return attn_bias
+    else:
+        raise ValueError(f'attn_impl={attn_impl!r} is an invalid setting.')
+
+def gen_slopes(n_heads: int, alibi_bias_max: int=8, device: Optional[torch.device]=None, return_1d: bool=False) -> torch.Tensor:
+    if ATTN_CACHE_ENABLED:
+        key = (n_heads, alibi_bias_max, str(device))
+        slopes = _slopes_cache.get(key)
+        if slopes is None:
+            slopes = _gen_slopes(n_heads, alibi_bias_max, device)
+            _slopes_cache[key] = slopes
+    else:
+        slopes = _gen_slopes(n_heads, alibi_bias_max, device)
+    if return_1d:
+        return slopes
+    return slopes.view(1, n_heads, 1, 1)
+
+def _gen_slopes(n_heads: int, alibi_bias_max: int=8, device: Optional[torch.device]=None) -> torch.Tensor:
+    _n_heads = 2 ** math.ceil(math.log2(n_heads))
+    m = torch.arange(1, _n_heads + 1, dtype=torch.float32, device=device)
+    m = m.mul(alibi_bias_max / _n_heads)
+    slopes = 1.0 / torch.pow(2, m)
+    if _n_heads != n_heads:
+        slopes = torch.concat([slopes[1::2], slopes[::2]])[:n_heads]
+    return slopes
+
+def build_alibi_bias(n_heads: int, seq_len: int, full: bool=False, alibi_bias_max: int=8, device: Optional[torch.device]=None, dtype: Optional[torch.dtype]=None) -> torch.Tensor:
+    """ALiBi bias; the causal (1, h, 1, s) form is cached per (n_heads, length bucket, dtype, device).
+
+    The returned tensor may be a view of the cache and must not be modified in place.
+    """
+    if full or not ATTN_CACHE_ENABLED:
+        return _build_alibi_bias(n_heads, seq_len, full=full, alibi_bias_max=alibi_bias_max, device=device, dtype=dtype)
+    bucket = _seq_len_bucket(seq_len)
+    key = (n_heads, bucket, alibi_bias_max, dtype, str(device))
+    alibi_bias = _alibi_cache.get(key)
+    if alibi_bias is None:
+        alibi_bias = _build_alibi_bias(n_heads, bucket, alibi_bias_max=alibi_bias_max, device=device, dtype=dtype)
+        _alibi_cache[key] = alibi_bias
+    return alibi_bias[..., -seq_len:]
+
+def _build_alibi_bias(n_heads: int, seq_len: int, full: bool=False, alibi_bias_max: int=8, device: Optional[torch.device]=None, dtype: Optional[torch.dtype]=None) -> torch.Tensor:
+    alibi_bias = torch.arange(1 - seq_len, 1, dtype=torch.int32, device=device).view(1, 1, 1, seq_len)
+    if full:
+        alibi_bias = alibi_bias - torch.arange(1 - seq_len, 1, dtype=torch.int32, device=device).view(1, 1, seq_len, 1)
+        alibi_bias = alibi_bias.abs().mul(-1)
+    slopes = gen_slopes(n_heads, alibi_bias_max, device=device)
+    alibi_bias = alibi_bias * slopes
+    return alibi_bias.to(dtype=dtype)
+ATTN_CLASS_REGISTRY = {'multihead_attention': MultiheadAttention, 'multiquery_attention': MultiQueryAttention, 'grouped_query_attention': GroupedQueryAttention}
\ No newline at end of file
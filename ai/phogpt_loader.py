@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PhoGPT loading helpers
+- Installs the patched attention module (phogpt_attention.py) into the MPT
+  remote code at load time; the HF cache is left as downloaded
+- Picks the attention implementation (PHOGPT_ATTN_IMPL: sdpa by default,
+  or torch / flash / triton)
+- Optional weight-only int8/int4 checkpoint (PHOGPT_QUANT, see quantize_phogpt.py)
+- Gives access to the patched attention module for benchmarks
+Set HF_HUB_OFFLINE=1 to run exactly the remote code in ./.cache.
+"""
+
+import os
+import sys
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+from transformers.dynamic_module_utils import get_class_from_dynamic_module
+
+MODEL_NAME = "vinai/PhoGPT-4B-Chat"
+CACHE_DIR = "./.cache"
+ATTN_IMPL = os.getenv("PHOGPT_ATTN_IMPL", "sdpa")
+QUANT = os.getenv("PHOGPT_QUANT") or None
+ATTENTION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "phogpt_attention.py")
+
+
+def _validate_sdpa(validate):
+    """The stock MPTConfig only knows torch/flash/triton; sdpa has the same constraints as torch"""
+    def wrapper(self):
+        if self.attn_config.get('attn_impl') != 'sdpa':
+            return validate(self)
+        self.attn_config['attn_impl'] = 'torch'
+        try:
+            return validate(self)
+        finally:
+            self.attn_config['attn_impl'] = 'sdpa'
+    wrapper.__wrapped__ = validate
+    return wrapper
+
+
+def install_attention(model_name=MODEL_NAME):
+    """Run phogpt_attention.py inside the remote attention module, before
+    configuration_mpt / blocks / modeling_mpt import names from it"""
+    fn = get_class_from_dynamic_module("attention.build_attn_bias", model_name, cache_dir=CACHE_DIR)
+    module = sys.modules[fn.__module__]
+    if getattr(module, '__patched_from__', None) != ATTENTION_FILE:
+        registry = module.__dict__.get('ATTN_CLASS_REGISTRY')
+        with open(ATTENTION_FILE, encoding="utf-8") as f:
+            exec(compile(f.read(), ATTENTION_FILE, 'exec'), module.__dict__)
+        if registry is not None and registry is not module.ATTN_CLASS_REGISTRY:
+            # blocks.py may already hold the old dict
+            registry.clear()
+            registry.update(module.ATTN_CLASS_REGISTRY)
+            module.ATTN_CLASS_REGISTRY = registry
+        module.__patched_from__ = ATTENTION_FILE
+
+    config_class = get_class_from_dynamic_module("configuration_mpt.MPTConfig", model_name, cache_dir=CACHE_DIR)
+    if not hasattr(config_class._validate_config, '__wrapped__'):
+        config_class._validate_config = _validate_sdpa(config_class._validate_config)
+    return module
+
+
+def load_phogpt_config(model_name=MODEL_NAME, attn_impl=None):
+    install_attention(model_name)
+    config = AutoConfig.from_pretrained(model_name, cache_dir=CACHE_DIR, trust_remote_code=True)
+    config.attn_config['attn_impl'] = attn_impl or ATTN_IMPL
+    return config
+
+
+def load_phogpt(model_name=MODEL_NAME, attn_impl=None, torch_dtype=torch.float32, quant=QUANT, **kwargs):
+    """fp32/fp16 weights, or the converted int8/int4 checkpoint when quant is set"""
+    if quant:
+        from quantize_phogpt import load_quantized_phogpt
+        return load_quantized_phogpt(quant, attn_impl=attn_impl)
+    config = load_phogpt_config(model_name, attn_impl)
+    print(f"📦 Loading {model_name} (attn_impl={config.attn_config['attn_impl']})...")
+    return AutoModelForCausalLM.from_pretrained(
+        model_name,
+        config=config,
+        cache_dir=CACHE_DIR,
+        trust_remote_code=True,
+        torch_dtype=torch_dtype,
+        **kwargs
+    )
+
+
+def load_attention_module(model_name=MODEL_NAME):
+    """The attention module of the PhoGPT remote code, with phogpt_attention.py installed"""
+    return install_attention(model_name)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hedged cascade over cloud providers for the hybrid teacher
+- Launch the primary provider; if it has not answered within its recent p95
+  latency, also launch the next one (hedge), and so on down the list
+- A failed provider triggers the next one immediately
+- The first good answer wins and every other in-flight call is cancelled;
+  providers should be async (httpx.AsyncClient) so that cancelling a loser
+  actually closes its connection instead of leaving a thread blocked on it
+- generate() runs every request on one long-lived event loop thread, so async
+  clients keep their connection pools across requests
+- Mock providers with configurable latency for offline testing
+  (HYBRID_MOCK_PROVIDERS="openai:800:0.1,cohere:400" = name:latency_ms[:failure_rate])
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MIN_SAMPLES = 20
+
+# Shared pool for sync providers (whose calls keep running when cancelled)
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider")
+
+
+class Provider:
+    """A named answer function (async, or sync run in a thread) with latency stats"""
+
+    def __init__(self, name, fn, timeout=10.0, window=200):
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.wins = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def p95(self):
+        """Recent p95 latency in seconds, None until MIN_SAMPLES answers"""
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def call(self, message):
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(self.fn):
+                answer = await asyncio.wait_for(self.fn(message), self.timeout)
+            else:
+                # A thread cannot be interrupted: on cancel its result is discarded
+                loop = asyncio.get_running_loop()
+                answer = await asyncio.wait_for(loop.run_in_executor(_executor, self.fn, message), self.timeout)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.warning("%s provider failed: %s", self.name, e)
+            return None
+        if answer:
+            self.latencies.append(time.perf_counter() - start)
+        else:
+            self.errors += 1
+        return answer
+
+    def stats(self):
+        p95 = self.p95()
+        return {
+            'calls': self.calls,
+            'wins': self.wins,
+            'errors': self.errors,
+            'cancelled': self.cancelled,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class HedgedCascade:
+    def __init__(self, providers, default_delay=1.0, min_delay=0.05):
+        self.providers = providers
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.requests = 0
+        self.hedged = 0
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def hedge_delay(self, provider):
+        """Wait this long for provider before launching the next one"""
+        p95 = provider.p95()
+        return max(self.min_delay, p95 if p95 is not None else self.default_delay)
+
+    async def run(self, message):
+        """(answer, provider name), or (None, None) when every provider failed"""
+        running = {}
+        queue = list(self.providers)
+        try:
+            while queue or running:
+                if queue and not running:
+                    provider = queue.pop(0)
+                    running[asyncio.create_task(provider.call(message))] = provider
+                timeout = self.hedge_delay(running[next(reversed(running))]) if queue else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than its p95: hedge with the next provider
+                    provider = queue.pop(0)
+                    running[asyncio.create_task(provider.call(message))] = provider
+                    with self._lock:
+                        self.hedged += 1
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    answer = task.result()
+                    if answer:
+                        provider.wins += 1
+                        return answer, provider.name
+            return None, None
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def loop(self):
+        """The event loop thread every request runs on (started on first use)"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="provider-cascade", daemon=True).start()
+            return self._loop
+
+    def generate(self, message):
+        """Blocking entry point for the Flask handlers"""
+        with self._lock:
+            self.requests += 1
+        if not self.providers:
+            return None, None
+        return asyncio.run_coroutine_threadsafe(self.run(message), self.loop()).result()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'providers': {p.name: p.stats() for p in self.providers},
+        }
+
+
+def mock_provider(name, latency_ms, failure_rate=0.0, jitter=0.5, stall_rate=0.0):
+    """Async stand-in for a cloud provider: exponential latency tail, occasional
+    stalls (10x latency) and failures"""
+    async def answer(message):
+        tail = random.expovariate(1 / jitter) if jitter else 0.0
+        stall = 10 if random.random() < stall_rate else 1
+        await asyncio.sleep(latency_ms / 1000 * (1 + tail) * stall)
+        if random.random() < failure_rate:
+            raise RuntimeError(f"{name} mock failure")
+        return f"[{name}] Câu trả lời cho: {message}"
+    return answer
+
+
+def parse_mock_providers(spec, timeout=10.0):
+    """'openai:800:0.1,cohere:400' -> [Provider]"""
+    providers = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, latency, *rest = item.split(":")
+        providers.append(Provider(name, mock_provider(name, float(latency), float(rest[0]) if rest else 0.0), timeout))
+    return providers
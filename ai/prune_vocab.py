@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vocabulary-pruned LM head for Vietnamese-only generation
+- Counts the tokens our corpora and response logs actually use
+- Keeps those tokens, every special token and every single-character token
+  (so any input can still be encoded by falling back to characters)
+- Writes a smaller checkpoint with remapped embedding/LM head plus
+  vocab_map.json, which PrunedVocabTokenizer uses at serving time
+Usage: python prune_vocab.py [model_dir] [output_dir] [--benchmark]
+"""
+
+import glob
+import gzip
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+
+import torch
+from torch import nn
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+VOCAB_MAP_FILE = "vocab_map.json"
+CORPUS_FILES = ["premium_teacher_data.txt"]
+LOG_PATTERNS = ["ai_chat_log.txt", "ai_chat_log.txt.*.gz"]
+
+
+def read_corpus_lines():
+    """Teacher corpus plus prompts/responses from the chat logs"""
+    lines = []
+    for path in CORPUS_FILES:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                lines.extend(line.strip() for line in f if line.strip())
+
+    for pattern in LOG_PATTERNS:
+        for path in glob.glob(pattern):
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    for prefix in ("PROMPT:", "RESPONSE:"):
+                        if line.startswith(prefix):
+                            line = line[len(prefix):].strip()
+                    if line and not line.startswith("---") and not line.startswith("["):
+                        lines.append(line)
+    return lines
+
+
+def count_tokens(tokenizer, lines):
+    counts = Counter()
+    for line in lines:
+        counts.update(tokenizer.encode(line, add_special_tokens=False))
+    return counts
+
+
+def select_vocab(tokenizer, counts, min_count=1, extra_texts=()):
+    """Ids to keep, sorted (new id = position in the list)"""
+    keep = {token_id for token_id, count in counts.items() if count >= min_count}
+    keep.update(tokenizer.all_special_ids)
+    for token, token_id in tokenizer.get_vocab().items():
+        if len(token) == 1:
+            keep.add(token_id)
+    for text in extra_texts:
+        keep.update(tokenizer.encode(text, add_special_tokens=False))
+    return sorted(keep)
+
+
+def prune_model(model, keep_ids):
+    """Slice the input embedding and LM head down to keep_ids"""
+    index = torch.tensor(keep_ids, dtype=torch.long)
+    tied = model.get_output_embeddings() is not None and \
+        model.get_output_embeddings().weight is model.get_input_embeddings().weight
+
+    old_embedding = model.get_input_embeddings()
+    new_embedding = nn.Embedding(len(keep_ids), old_embedding.embedding_dim)
+    new_embedding.weight.data = old_embedding.weight.data[index].clone()
+    model.set_input_embeddings(new_embedding)
+
+    old_head = model.get_output_embeddings()
+    if old_head is not None:
+        new_head = nn.Linear(old_head.in_features, len(keep_ids), bias=old_head.bias is not None)
+        if tied:
+            new_head.weight = new_embedding.weight
+        else:
+            new_head.weight.data = old_head.weight.data[index].clone()
+        if old_head.bias is not None:
+            new_head.bias.data = old_head.bias.data[index].clone()
+        model.set_output_embeddings(new_head)
+
+    model.config.vocab_size = len(keep_ids)
+    remap_special_token_ids(model, keep_ids)
+    return model
+
+
+def remap_special_token_ids(model, keep_ids):
+    """Point bos/eos/pad ids in config and generation_config at the pruned vocabulary
+
+    generate() stops on generation_config.eos_token_id, which would otherwise be
+    out of range or name a different kept token. Ids that were not kept become None.
+    """
+    old_to_new = {old: new for new, old in enumerate(keep_ids)}
+    for config in (model.config, getattr(model, 'generation_config', None)):
+        if config is None:
+            continue
+        for attr in ('bos_token_id', 'eos_token_id', 'pad_token_id', 'decoder_start_token_id'):
+            value = getattr(config, attr, None)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = [old_to_new[i] for i in value if i in old_to_new] or None
+            else:
+                value = old_to_new.get(value)
+            setattr(config, attr, value)
+
+
+class PrunedVocabTokenizer:
+    """Wrap the original tokenizer and translate ids to/from the pruned vocabulary"""
+
+    def __init__(self, tokenizer, keep_ids):
+        self.tokenizer = tokenizer
+        self.keep_ids = list(keep_ids)
+        self.old_to_new = {old: new for new, old in enumerate(self.keep_ids)}
+
+    @classmethod
+    def from_model_dir(cls, tokenizer, model_path):
+        with open(os.path.join(model_path, VOCAB_MAP_FILE), encoding="utf-8") as f:
+            return cls(tokenizer, json.load(f)["keep_ids"])
+
+    def _map_id(self, token_id):
+        if token_id in self.old_to_new:
+            return [self.old_to_new[token_id]]
+        # Not kept: spell the token with single-character tokens, which always are
+        token = self.tokenizer.convert_ids_to_tokens(token_id)
+        return [self.old_to_new[self.tokenizer.convert_tokens_to_ids(char)] for char in token]
+
+    def encode(self, text, return_tensors=None, **kwargs):
+        ids = []
+        for token_id in self.tokenizer.encode(text, **kwargs):
+            ids.extend(self._map_id(token_id))
+        if return_tensors == 'pt':
+            return torch.tensor([ids], dtype=torch.long)
+        return ids
+
+    def decode(self, ids, **kwargs):
+        if hasattr(ids, 'tolist'):
+            ids = ids.tolist()
+        return self.tokenizer.decode([self.keep_ids[i] for i in ids], **kwargs)
+
+    @property
+    def eos_token_id(self):
+        return self.old_to_new.get(self.tokenizer.eos_token_id)
+
+    @property
+    def pad_token_id(self):
+        return self.old_to_new.get(self.tokenizer.pad_token_id)
+
+    def __len__(self):
+        return len(self.keep_ids)
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+
+def decode_step_latency(model, vocab_size, context=64, steps=64):
+    """Average seconds per single-token decode step with a KV cache"""
+    input_ids = torch.randint(0, vocab_size, (1, context))
+    with torch.no_grad():
+        out = model(input_ids, use_cache=True)
+        past = out.past_key_values
+        token = input_ids[:, -1:]
+        start = time.perf_counter()
+        for _ in range(steps):
+            out = model(token, past_key_values=past, use_cache=True)
+            past = out.past_key_values
+        return (time.perf_counter() - start) / steps
+
+
+def bits_per_char(model, encode, lines):
+    """Tokenization-independent quality: negative log-likelihood per character"""
+    total_nll, total_chars = 0.0, 0
+    with torch.no_grad():
+        for line in lines:
+            ids = encode(line)
+            if len(ids) < 2:
+                continue
+            input_ids = torch.tensor([ids])
+            loss = model(input_ids, labels=input_ids).loss.item()
+            total_nll += loss * (len(ids) - 1)
+            total_chars += len(line)
+    return total_nll / math.log(2) / max(total_chars, 1)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    model_path = args[0] if args else "./vietnamese_teacher_trained"
+    output_dir = args[1] if len(args) > 1 else model_path.rstrip("/") + "_pruned"
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=False, trust_remote_code=True)
+    lines = read_corpus_lines()
+    counts = count_tokens(tokenizer, lines)
+    keep_ids = select_vocab(tokenizer, counts, extra_texts=["Học sinh:", "Giáo viên:", "Học viên:"])
+    print(f"📊 {len(lines)} lines, {sum(counts.values())} tokens, {len(counts)} distinct ids used")
+    print(f"✂️  Keeping {len(keep_ids)} / {len(tokenizer)} tokens")
+
+    model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32, trust_remote_code=True)
+    model.eval()
+    full_vocab = model.config.vocab_size
+    if "--benchmark" in sys.argv:
+        held_out = lines[::10]
+        before_latency = decode_step_latency(model, full_vocab)
+        before_bpc = bits_per_char(model, lambda t: tokenizer.encode(t, add_special_tokens=False), held_out)
+
+    prune_model(model, keep_ids)
+    os.makedirs(output_dir, exist_ok=True)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, VOCAB_MAP_FILE), "w", encoding="utf-8") as f:
+        json.dump({"original_vocab_size": full_vocab, "keep_ids": keep_ids}, f)
+    print(f"✅ Pruned checkpoint saved to {output_dir}")
+
+    if "--benchmark" in sys.argv:
+        pruned_tokenizer = PrunedVocabTokenizer(tokenizer, keep_ids)
+        after_latency = decode_step_latency(model, len(keep_ids))
+        after_bpc = bits_per_char(model, lambda t: pruned_tokenizer.encode(t, add_special_tokens=False), held_out)
+        print("\n" + "=" * 50)
+        print(f"⏱️  Decode step: {before_latency * 1000:.2f}ms -> {after_latency * 1000:.2f}ms "
+              f"({(1 - after_latency / before_latency):.1%} faster)")
+        print(f"📉 Bits per char on held-out lines: {before_bpc:.3f} -> {after_bpc:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Weight-only quantized PhoGPT-4B for CPU servers
+- Group-wise symmetric int8 / int4 weights (one fp16 scale per group of input columns)
+- QuantizedLinear dequantizes on the fly in forward(); embeddings and norms stay fp32
+- Offline conversion writes a checkpoint next to the HF cache (./.cache/phogpt-4b-chat-int4-g128)
+- compare: memory, tokens/sec and perplexity of fp32 / int8 / int4, each in its own process
+Usage:
+  python quantize_phogpt.py convert [int8|int4] [group_size]
+  python quantize_phogpt.py compare [int8 int4 ...]
+"""
+
+import gc
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from transformers import AutoModelForCausalLM
+
+from generation_profiler import _proc_status_kb
+from phogpt_loader import CACHE_DIR, MODEL_NAME, load_phogpt, load_phogpt_config
+
+QUANT_BITS = {'int8': 8, 'int4': 4}
+DEFAULT_GROUP_SIZE = 128
+SKIP_MODULES = ('lm_head',)
+WEIGHTS_FILE = "model.pt"
+QUANT_CONFIG_FILE = "quant_config.json"
+
+EVAL_PROMPT = "### Câu hỏi: Hãy giải thích 6 thanh điệu trong tiếng Việt.\n### Trả lời:"
+EVAL_NEW_TOKENS = 64
+EVAL_LINES = 64
+EVAL_MAX_TOKENS = 256
+
+
+def quantized_dir(quant, group_size=DEFAULT_GROUP_SIZE):
+    return os.path.join(CACHE_DIR, f"phogpt-4b-chat-{quant}-g{group_size}")
+
+
+def quantize_weight(weight, bits, group_size):
+    """(packed int weight, fp16 scales of shape (out, in // group_size))"""
+    out_features, in_features = weight.shape
+    w = weight.detach().float().view(out_features, in_features // group_size, group_size)
+    qmax = 2 ** (bits - 1) - 1
+    scales = (w.abs().amax(dim=-1, keepdim=True) / qmax).clamp(min=1e-8)
+    q = torch.clamp(torch.round(w / scales), -qmax - 1, qmax).to(torch.int8).view(out_features, in_features)
+    if bits == 4:
+        # Two nibbles per byte, offset to 0..15
+        q = (q + 8).to(torch.uint8).view(out_features, in_features // 2, 2)
+        q = q[..., 0] | (q[..., 1] << 4)
+    return q, scales.squeeze(-1).half()
+
+
+class QuantizedLinear(nn.Module):
+    """nn.Linear with group-wise int8/int4 weights, dequantized per forward"""
+
+    def __init__(self, in_features, out_features, bits=8, group_size=DEFAULT_GROUP_SIZE, bias=False, device=None):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.bits = bits
+        self.group_size = group_size
+        packed = in_features // 2 if bits == 4 else in_features
+        dtype = torch.uint8 if bits == 4 else torch.int8
+        self.register_buffer('qweight', torch.empty(out_features, packed, dtype=dtype, device=device))
+        self.register_buffer('scales', torch.empty(out_features, in_features // group_size, dtype=torch.float16, device=device))
+        self.bias = nn.Parameter(torch.empty(out_features, device=device), requires_grad=False) if bias else None
+
+    @classmethod
+    def from_linear(cls, linear, bits, group_size):
+        module = cls(linear.in_features, linear.out_features, bits, group_size, bias=linear.bias is not None)
+        module.qweight, module.scales = quantize_weight(linear.weight, bits, group_size)
+        if linear.bias is not None:
+            module.bias.data = linear.bias.detach().float()
+        return module
+
+    def dequantize(self, dtype=torch.float32):
+        q = self.qweight
+        if self.bits == 4:
+            q = torch.stack((q & 0xF, q >> 4), dim=-1).view(self.out_features, self.in_features).to(torch.int8) - 8
+        w = q.view(self.out_features, -1, self.group_size).to(dtype) * self.scales.to(dtype).unsqueeze(-1)
+        return w.view(self.out_features, self.in_features)
+
+    def forward(self, x):
+        bias = self.bias.to(x.dtype) if self.bias is not None else None
+        return F.linear(x, self.dequantize(x.dtype), bias)
+
+    def extra_repr(self):
+        return f"in_features={self.in_features}, out_features={self.out_features}, bits={self.bits}, group_size={self.group_size}"
+
+
+def replace_linears(model, bits, group_size, convert=True):
+    """Swap every eligible nn.Linear for a QuantizedLinear (empty shells when convert=False)"""
+    replaced = 0
+    for name, module in list(model.named_modules()):
+        for child_name, child in list(module.named_children()):
+            if not isinstance(child, nn.Linear) or child_name in SKIP_MODULES or child.in_features % group_size:
+                continue
+            if convert:
+                quantized = QuantizedLinear.from_linear(child, bits, group_size)
+            else:
+                quantized = QuantizedLinear(child.in_features, child.out_features, bits, group_size,
+                                            bias=child.bias is not None, device='meta')
+            setattr(module, child_name, quantized)
+            replaced += 1
+    return replaced
+
+
+def model_bytes(model):
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+
+def convert(quant, group_size=DEFAULT_GROUP_SIZE, model_name=MODEL_NAME):
+    """Quantize the fp32 checkpoint and write it to quantized_dir()"""
+    bits = QUANT_BITS[quant]
+    model = load_phogpt(model_name, quant=None)
+    fp32_bytes = model_bytes(model)
+    with torch.no_grad():
+        replaced = replace_linears(model, bits, group_size)
+    output_dir = quantized_dir(quant, group_size)
+    os.makedirs(output_dir, exist_ok=True)
+    torch.save(model.state_dict(), os.path.join(output_dir, WEIGHTS_FILE))
+    model.config.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, QUANT_CONFIG_FILE), "w") as f:
+        json.dump({'model_name': model_name, 'bits': bits, 'group_size': group_size}, f, indent=2)
+    print(f"✅ {replaced} linear layers -> {quant} (group {group_size}): "
+          f"{fp32_bytes / 2**30:.2f} GB -> {model_bytes(model) / 2**30:.2f} GB, saved to {output_dir}")
+    return output_dir
+
+
+def load_quantized_phogpt(quant, group_size=DEFAULT_GROUP_SIZE, attn_impl=None):
+    """Build the model on the meta device and assign the quantized weights (mmap'd)"""
+    path = quantized_dir(quant, group_size)
+    weights = os.path.join(path, WEIGHTS_FILE)
+    if not os.path.exists(weights):
+        raise FileNotFoundError(f"{weights} not found, run: python quantize_phogpt.py convert {quant} {group_size}")
+    with open(os.path.join(path, QUANT_CONFIG_FILE)) as f:
+        quant_config = json.load(f)
+
+    config = load_phogpt_config(quant_config['model_name'], attn_impl)
+    # MPT passes device=config.init_device ("cpu" in PhoGPT's config) to every layer and runs
+    # param_init_fn unless it is 'meta'; without this the fp32 model is allocated and initialised
+    config.init_device = 'meta'
+    print(f"📦 Loading {quant_config['model_name']} {quant} (group {group_size}, attn_impl={config.attn_config['attn_impl']})...")
+    with torch.device('meta'):
+        model = AutoModelForCausalLM.from_config(config, trust_remote_code=True)
+    replace_linears(model, quant_config['bits'], quant_config['group_size'], convert=False)
+    state = torch.load(weights, map_location='cpu', mmap=True, weights_only=True)
+    model.load_state_dict(state, assign=True)
+    model.tie_weights()
+    missing = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if missing:
+        raise RuntimeError(f"Quantized checkpoint is missing tensors: {missing[:5]}")
+    return model.eval()
+
+
+def perplexity(model, tokenizer, texts):
+    nll, count = 0.0, 0
+    with torch.no_grad():
+        for text in texts:
+            ids = tokenizer(text, return_tensors="pt", truncation=True, max_length=EVAL_MAX_TOKENS).input_ids
+            if ids.size(1) < 2:
+                continue
+            logits = model(ids).logits[:, :-1].float()
+            nll += F.cross_entropy(logits.reshape(-1, logits.size(-1)), ids[:, 1:].reshape(-1), reduction='sum').item()
+            count += ids.size(1) - 1
+    return math.exp(nll / count) if count else float('nan')
+
+
+def evaluate(quant):
+    """Metrics for one variant ('fp32', 'int8', 'int4'), printed as a JSON line"""
+    from fast_tokenizer import load_tokenizer
+    from prune_vocab import read_corpus_lines
+
+    rss_before = _proc_status_kb("VmRSS")
+    start = time.perf_counter()
+    model = load_phogpt(quant=None) if quant == 'fp32' else load_quantized_phogpt(quant)
+    model.eval()
+    load_s = time.perf_counter() - start
+    gc.collect()
+    rss_after = _proc_status_kb("VmRSS")
+    peak_after_load = _proc_status_kb("VmHWM")
+
+    tokenizer = load_tokenizer(MODEL_NAME, cache_dir=CACHE_DIR)
+    input_ids = tokenizer(EVAL_PROMPT, return_tensors="pt").input_ids
+    with torch.no_grad():
+        model.generate(input_ids, max_new_tokens=4, do_sample=False)
+        start = time.perf_counter()
+        output = model.generate(input_ids, max_new_tokens=EVAL_NEW_TOKENS, min_new_tokens=EVAL_NEW_TOKENS, do_sample=False)
+        elapsed = time.perf_counter() - start
+    generated = output.size(1) - input_ids.size(1)
+
+    return {
+        'variant': quant,
+        'model_gb': round(model_bytes(model) / 2**30, 2),
+        'rss_gb': round((rss_after - rss_before) / 2**20, 2) if rss_before is not None and rss_after is not None else None,
+        'peak_rss_gb': round(peak_after_load / 2**20, 2) if peak_after_load is not None else None,
+        'load_s': round(load_s, 1),
+        'tokens_per_sec': round(generated / elapsed, 2),
+        'perplexity': round(perplexity(model, tokenizer, read_corpus_lines()[:EVAL_LINES]), 3),
+    }
+
+
+def compare(quants):
+    """Evaluate fp32 and each quantized variant in a fresh process, relative to fp32"""
+    results = []
+    for quant in ['fp32'] + quants:
+        print(f"⏱️  Evaluating {quant}...")
+        proc = subprocess.run([sys.executable, __file__, 'eval', quant], capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"❌ {quant} failed:\n{proc.stderr[-2000:]}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    base = results[0] if results and results[0]['variant'] == 'fp32' else None
+    print(f"{'variant':>8} {'model GB':>9} {'RSS GB':>7} {'peak GB':>8} {'tok/s':>7} {'ppl':>8} {'vs fp32':>22}")
+    for r in results:
+        relative = ""
+        if base and r is not base:
+            relative = (f"{r['model_gb'] / base['model_gb']:.2f}x mem, {r['tokens_per_sec'] / base['tokens_per_sec']:.2f}x tok/s, "
+                        f"ppl {r['perplexity'] - base['perplexity']:+.3f}")
+        print(f"{r['variant']:>8} {r['model_gb']:>9.2f} {r['rss_gb'] or 0:>7.2f} {r['peak_rss_gb'] or 0:>8.2f} {r['tokens_per_sec']:>7.2f} {r['perplexity']:>8.3f}  {relative}")
+    return results
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'convert'
+    if command == 'convert':
+        quant = sys.argv[2] if len(sys.argv) > 2 else 'int8'
+        convert(quant, int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_GROUP_SIZE)
+    elif command == 'eval':
+        print(json.dumps(evaluate(sys.argv[2])))
+    elif command == 'compare':
+        compare(sys.argv[2:] or ['int8', 'int4'])
+    else:
+        print(__doc__)
+        sys.exit(1)
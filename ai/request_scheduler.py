@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deadline-aware priority queue in front of the model
+- Priority classes: voice > interactive > bulk
+- Earliest deadline first inside each class
+- Early rejection when the client's deadline cannot be met given the work
+  queued ahead and the measured throughput; requests without a deadline, or
+  that would start right away, are never rejected
+- Queue state for autoscaling (/queue)
+Throughput is measured from the tokens each request actually generated; the
+work queued ahead is estimated from token budgets (max_new_tokens), an upper bound.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = {'voice': 0, 'interactive': 1, 'bulk': 2}
+
+
+class SchedulerRejected(Exception):
+    """Raised when a request is turned away instead of being served late"""
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    def __init__(self, priority_class, deadline, tokens, seq):
+        self.priority_class = priority_class
+        self.deadline = deadline
+        self.tokens = tokens
+        self.seq = seq
+        self.started = False
+        self.generated = None   # tokens actually generated, set by the caller
+        self.event = threading.Event()
+
+    def key(self):
+        return (PRIORITY_CLASSES[self.priority_class], self.deadline or float('inf'), self.seq)
+
+    def __lt__(self, other):
+        return self.key() < other.key()
+
+
+class RequestScheduler:
+    def __init__(self, concurrency=1, initial_tokens_per_sec=20.0, smoothing=0.2):
+        self.concurrency = concurrency
+        self.tokens_per_sec = initial_tokens_per_sec
+        self.smoothing = smoothing
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.running = 0
+        self.running_tokens = 0
+        # Queued budget tokens per (class, has deadline): running totals instead of heap scans
+        self.queued_tokens = Counter()
+
+        self.completed = Counter()
+        self.rejected = Counter()
+        self.expired = Counter()
+
+    def _throughput(self):
+        return self.tokens_per_sec * self.concurrency
+
+    @staticmethod
+    def _bucket(ticket):
+        return ticket.priority_class, ticket.deadline is not None
+
+    def _queued_ahead(self, ticket):
+        """Budget tokens queued ahead of a ticket with a deadline: every higher class, plus
+        the deadline tickets of its own class (an upper bound, some of those sort after it)"""
+        rank = PRIORITY_CLASSES[ticket.priority_class]
+        ahead = self.queued_tokens[(ticket.priority_class, True)]
+        for name, other_rank in PRIORITY_CLASSES.items():
+            if other_rank < rank:
+                ahead += self.queued_tokens[(name, True)] + self.queued_tokens[(name, False)]
+        return ahead
+
+    def _push(self, ticket):
+        heapq.heappush(self._heap, ticket)
+        self.queued_tokens[self._bucket(ticket)] += ticket.tokens
+
+    def _remove(self, ticket):
+        self._heap.remove(ticket)
+        heapq.heapify(self._heap)
+        self.queued_tokens[self._bucket(ticket)] -= ticket.tokens
+
+    def _dispatch(self):
+        while self.running < self.concurrency and self._heap:
+            ticket = heapq.heappop(self._heap)
+            self.queued_tokens[self._bucket(ticket)] -= ticket.tokens
+            ticket.started = True
+            self.running += 1
+            self.running_tokens += ticket.tokens
+            ticket.event.set()
+
+    @contextmanager
+    def slot(self, priority_class='interactive', tokens=120, deadline=None, cancel=None):
+        """Wait for a model slot; raises SchedulerRejected if the deadline can't be met"""
+        if priority_class not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority_class}")
+
+        with self._lock:
+            ticket = _Ticket(priority_class, deadline, tokens, next(self._seq))
+            if deadline is not None:
+                queued_ahead = self._queued_ahead(ticket)
+                # A request that would start right away is always served
+                if queued_ahead or self.running >= self.concurrency:
+                    wait = (self.running_tokens + queued_ahead) / self._throughput()
+                    if time.time() + wait + tokens / self.tokens_per_sec > deadline:
+                        self.rejected[priority_class] += 1
+                        raise SchedulerRejected('deadline cannot be met', retry_after=round(wait, 1))
+            self._push(ticket)
+            self._dispatch()
+
+        while not ticket.event.wait(0.05):
+            expired = deadline is not None and time.time() >= deadline
+            if expired or (cancel is not None and cancel.cancelled):
+                with self._lock:
+                    if not ticket.started:
+                        self._remove(ticket)
+                        self.expired[priority_class] += 1
+                        raise SchedulerRejected('deadline passed while queued' if expired else 'cancelled while queued')
+
+        start = time.perf_counter()
+        try:
+            yield ticket
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.running -= 1
+                self.running_tokens -= tokens
+                self.completed[priority_class] += 1
+                # Only requests that report what they generated update the throughput
+                if elapsed > 0 and ticket.generated:
+                    rate = ticket.generated / elapsed
+                    self.tokens_per_sec += self.smoothing * (rate - self.tokens_per_sec)
+                self._dispatch()
+
+    def submit(self, fn, priority_class='interactive', tokens=120, deadline=None, cancel=None):
+        """Run fn() in a slot; cancel.tokens_generated (if the model sets it) feeds the throughput"""
+        with self.slot(priority_class, tokens, deadline, cancel) as ticket:
+            result = fn()
+            if cancel is not None:
+                ticket.generated = cancel.tokens_generated
+            return result
+
+    def state(self):
+        with self._lock:
+            depth = Counter(t.priority_class for t in self._heap)
+            queued_tokens = sum(self.queued_tokens.values())
+            backlog = (self.running_tokens + queued_tokens) / self._throughput()
+            return {
+                'concurrency': self.concurrency,
+                'running': self.running,
+                'queue_depth': len(self._heap),
+                'queue_depth_by_class': {name: depth.get(name, 0) for name in PRIORITY_CLASSES},
+                'queued_tokens': queued_tokens,
+                'tokens_per_sec': round(self.tokens_per_sec, 2),
+                'backlog_seconds': round(backlog, 2),
+                'utilization': self.running / self.concurrency,
+                'completed': dict(self.completed),
+                'rejected': dict(self.rejected),
+                'expired': dict(self.expired),
+            }
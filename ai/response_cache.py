@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent response cache for paid cloud provider calls
+- SQLite table keyed by sha256(provider, model, prompt hash, parameters)
+- Entries expire after a TTL; past max_entries the least recently hit are evicted
+- The hottest keys are warm-loaded into memory at startup, and recent hits
+  stay there (bounded LRU)
+- Tracks hit rate and the provider latency saved by each hit
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    latency REAL NOT NULL,
+    created REAL NOT NULL,
+    last_hit REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_hit ON responses (last_hit);
+"""
+
+
+def make_key(provider, model, prompt, params=None):
+    """Cache key for one provider request; params are everything else that shapes the answer"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps([provider, model, prompt_hash, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path="./response_cache.db", ttl=7 * 24 * 3600, max_entries=20000,
+                 memory_entries=500, evict_every=100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.evict_every = evict_every
+
+        self._lock = threading.Lock()
+        self.memory = OrderedDict()     # key -> (response, latency, created)
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.saved_latency = 0.0
+        self.evicted = 0
+        self._puts = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.expire()
+        self.warm_load()
+
+    def warm_load(self):
+        """Load the most-hit live entries into memory"""
+        rows = self.db.execute(
+            "SELECT key, response, latency, created FROM responses WHERE created >= ? "
+            "ORDER BY hits DESC, last_hit DESC LIMIT ?",
+            (time.time() - self.ttl, self.memory_entries)).fetchall()
+        with self._lock:
+            # Least hot first, so the hottest are the last to leave the LRU
+            for key, response, latency, created in reversed(rows):
+                self.memory[key] = (response, latency, created)
+        if rows:
+            print(f"📚 Warm-loaded {len(rows)} cached provider responses")
+
+    def get(self, *keys):
+        """(key, response) for the first live key, or (None, None); one hit or miss per call.
+        A hit counts the original call's latency as saved."""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                cached = self.memory.get(key)
+                if cached is None:
+                    row = self.db.execute("SELECT response, latency, created FROM responses WHERE key = ?",
+                                          (key,)).fetchone()
+                    cached = tuple(row) if row else None
+                elif cached[2] >= now - self.ttl:
+                    self.memory_hits += 1
+                if cached is None:
+                    continue
+                if cached[2] < now - self.ttl:
+                    self.memory.pop(key, None)
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.db.commit()
+                    continue
+
+                response, latency, _ = cached
+                self.hits += 1
+                self.saved_latency += latency
+                self.memory[key] = cached
+                self.memory.move_to_end(key)
+                self._trim_memory()
+                self.db.execute("UPDATE responses SET hits = hits + 1, last_hit = ? WHERE key = ?", (now, key))
+                self.db.commit()
+                return key, response
+            self.misses += 1
+            return None, None
+
+    def put(self, key, provider, model, response, latency):
+        """Store a provider response with the latency it took to produce"""
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, latency, created, last_hit, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, provider, model, response, latency, now, now))
+            self.db.commit()
+            self.memory[key] = (response, latency, now)
+            self._trim_memory()
+            self._puts += 1
+            should_evict = self._puts % self.evict_every == 0
+        if should_evict:
+            self.expire()
+
+    def _trim_memory(self):
+        """Drop least recently used in-memory entries (caller holds the lock)"""
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def expire(self):
+        """Delete expired entries, then the least recently hit ones past max_entries"""
+        with self._lock:
+            removed = self.db.execute("DELETE FROM responses WHERE created < ?",
+                                      (time.time() - self.ttl,)).rowcount
+            removed += self.db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_hit DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)).rowcount
+            self.db.commit()
+            if removed:
+                live = {key for (key,) in self.db.execute("SELECT key FROM responses")} if self.memory else set()
+                for key in [k for k in self.memory if k not in live]:
+                    del self.memory[key]
+            self.evicted += removed
+        if removed:
+            logger.info("Response cache evicted %d entries", removed)
+
+    def stats(self):
+        with self._lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                'entries': entries,
+                'in_memory': len(self.memory),
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'saved_latency_s': round(self.saved_latency, 2),
+                'evicted': self.evicted,
+            }
+
+    def close(self):
+        with self._lock:
+            self.db.close()
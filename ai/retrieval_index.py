@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inverted-index BM25 retrieval over stored questions
+- Postings built once at load, each list sorted by BM25 impact (idf x tf weight)
+- Top-k with the threshold algorithm: walk the query terms' lists in impact
+  order, a batch at a time from the list with the highest next impact (rare
+  terms first, so the bound drops fastest), score every newly seen document
+  exactly, stop once the k-th best score reaches the sum of the next unread
+  impacts (no unseen document can do better), so only the head of each
+  posting list is read
+- Scoring and min_overlap are one lookup per query term in a per-term
+  {doc id: impact} map, so a document is only kept if it is in enough of
+  the query terms' posting lists
+- max_depth bounds the walk per list, so latency stops growing with the corpus
+  (top-k may then be approximate)
+- Deterministic top-k (score, then insertion order)
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+BATCH = 32
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75, max_depth=None):
+        self.k1 = k1
+        self.b = b
+        self.max_depth = max_depth
+        self.postings = {}      # term -> [(doc id, tf)]
+        self.impacts = {}       # term -> ([doc id], [idf x weight]), best first
+        self.doc_impacts = {}   # term -> {doc id: idf x weight}
+        self.doc_lengths = []
+        self.payloads = []
+        self.idf = {}
+        self.avg_length = 0.0
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def add(self, text, payload):
+        doc_id = len(self.payloads)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, []).append((doc_id, tf))
+        self.doc_lengths.append(sum(terms.values()))
+        self.payloads.append(payload)
+        return doc_id
+
+    def finalize(self):
+        """Compute IDF and impact-ordered postings; call after the last add()"""
+        n = len(self.payloads)
+        self.avg_length = sum(self.doc_lengths) / n if n else 0.0
+        for term, posting in self.postings.items():
+            idf = self.idf[term] = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            impacts = [(idf * self._term_weight(tf, doc_id), doc_id) for doc_id, tf in posting]
+            impacts.sort(key=lambda p: (-p[0], p[1]))
+            self.impacts[term] = ([doc_id for _, doc_id in impacts], [impact for impact, _ in impacts])
+            self.doc_impacts[term] = {doc_id: impact for impact, doc_id in impacts}
+        return self
+
+    @classmethod
+    def build(cls, pairs, **kwargs):
+        """Index (text, payload) pairs"""
+        index = cls(**kwargs)
+        for text, payload in pairs:
+            index.add(text, payload)
+        return index.finalize()
+
+    def _term_weight(self, tf, doc_id):
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+        return tf * (self.k1 + 1) / (tf + norm)
+
+    def score(self, terms, doc_id):
+        return sum(self.doc_impacts[term].get(doc_id, 0.0) for term in terms if term in self.doc_impacts)
+
+    def search(self, query, top_k=1, min_overlap=1):
+        """[(payload, score)] best first, for documents sharing >= min_overlap query terms"""
+        terms = sorted(t for t in set(tokenize(query)) if t in self.postings)
+        if len(terms) < min_overlap:
+            return []
+        lists = [self.impacts[t] for t in terms]
+        doc_impacts = [self.doc_impacts[t] for t in terms]
+        limits = [len(impacts) if self.max_depth is None else min(len(impacts), self.max_depth)
+                  for _, impacts in lists]
+        depths = [0] * len(lists)
+        frontiers = [impacts[0] for _, impacts in lists]     # next unread impact per list
+        best = []       # min-heap of (score, -doc id)
+        seen = set()
+        while True:
+            walking = [i for i in range(len(lists)) if depths[i] < limits[i]]
+            if not walking:
+                break
+            i = max(walking, key=frontiers.__getitem__)
+            doc_ids, impacts = lists[i]
+            end = min(depths[i] + BATCH, limits[i])
+            for doc_id in doc_ids[depths[i]:end]:
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                score, overlap = 0.0, 0
+                for term_impacts in doc_impacts:
+                    impact = term_impacts.get(doc_id)
+                    if impact is not None:
+                        score += impact
+                        overlap += 1
+                if overlap < min_overlap:
+                    continue
+                entry = (score, -doc_id)
+                if len(best) < top_k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+            depths[i] = end
+            frontiers[i] = impacts[end] if end < len(impacts) else 0.0
+            # An unseen document scores at most the sum of the next unread impacts
+            bound = sum(frontiers)
+            if bound == 0.0 or (len(best) == top_k and best[0][0] >= bound):
+                break
+        return [(self.payloads[-neg_id], score) for score, neg_id in sorted(best, reverse=True)]
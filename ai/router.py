@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latency-aware tiered router for the Vietnamese Teacher services
+Tiers, cheapest first:
+- corpus: context-based tutor, keyword intents + teacher corpus (app_smart.py)
+- hybrid: local answers + cloud cascade (hybrid_teacher.py)
+- model:  GPT-2 teacher model (app.py)
+Each message goes to the cheapest tier whose estimated quality meets the
+threshold and whose recent p95 latency fits the SLO.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+
+from intent_matcher import IntentMatcher
+from tutor_intents import USER_INTENTS
+
+app = Flask(__name__)
+CORS(app)
+
+QUALITY_THRESHOLD = float(os.getenv("ROUTER_QUALITY_THRESHOLD", "0.6"))
+LATENCY_SLO_MS = float(os.getenv("ROUTER_LATENCY_SLO_MS", "3000"))
+# hybrid_teacher only calls its cloud providers for longer questions, and only with API keys
+HYBRID_CLOUD = os.getenv("ROUTER_HYBRID_CLOUD", "1") == "1"
+HYBRID_CLOUD_MIN_WORDS = 9
+
+# The intents app_smart.py answers from its examples, with its own keyword table
+INTENT_MATCHER = IntentMatcher(USER_INTENTS)
+
+
+def tokenize(text):
+    return set(text.lower().replace('?', ' ').replace('!', ' ').replace(',', ' ').replace('.', ' ').split())
+
+
+def load_corpus_questions(path='premium_teacher_data.txt'):
+    questions = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('Học viên:'):
+                    questions.append(tokenize(line.replace('Học viên:', '')))
+    except FileNotFoundError:
+        print("⚠️ premium_teacher_data.txt not found, corpus scoring disabled")
+    return questions
+
+
+class Tier:
+    def __init__(self, name, url, cost, timeout, window=200):
+        self.name = name
+        self.url = url
+        self.cost = cost
+        self.timeout = timeout
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def p95_ms(self):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def p50_ms(self):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2]
+
+    def call(self, message):
+        start = time.perf_counter()
+        try:
+            response = requests.post(self.url, json={'message': message}, timeout=self.timeout)
+            response.raise_for_status()
+            answer = response.json().get('response')
+        finally:
+            self.latencies.append((time.perf_counter() - start) * 1000)
+        if not answer:
+            raise ValueError(f"{self.name} returned an empty response")
+        return answer
+
+
+class TieredRouter:
+    def __init__(self):
+        self.tiers = [
+            # app_smart.py and app.py both default to 5002: run app_smart with PORT=5005
+            Tier('corpus', os.getenv("ROUTER_CORPUS_URL", "http://localhost:5005/chat"), cost=2, timeout=2),
+            Tier('hybrid', os.getenv("ROUTER_HYBRID_URL", "http://localhost:5001/chat"), cost=5, timeout=25),
+            Tier('model', os.getenv("ROUTER_MODEL_URL", "http://localhost:5002/chat"), cost=10, timeout=60),
+        ]
+        self.corpus_questions = load_corpus_questions()
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def score(self, message):
+        """Features used to estimate how well each tier will answer"""
+        words = tokenize(message)
+
+        matched = list(INTENT_MATCHER.scores(message))
+        # One clear intent is confident, several competing intents are not
+        intent_confidence = 0.0 if not matched else 0.9 / len(matched)
+
+        corpus_similarity = 0.0
+        if words:
+            for question in self.corpus_questions:
+                union = len(words | question)
+                if union:
+                    corpus_similarity = max(corpus_similarity, len(words & question) / union)
+
+        return {
+            'length': len(words),
+            'intent': matched[0] if matched else None,
+            'intent_confidence': intent_confidence,
+            'corpus_similarity': corpus_similarity,
+        }
+
+    def estimate_quality(self, tier, features):
+        length_penalty = 1.0 if features['length'] <= 12 else 0.6
+        if tier.name == 'corpus':
+            # app_smart answers from the teacher examples, picked by the matched intent
+            return max(min(1.0, features['corpus_similarity'] * 1.5), features['intent_confidence']) * length_penalty
+        if tier.name == 'hybrid':
+            # Local Q&A / topic answers for short questions, cloud for long ones, else a generic reply
+            local = max(min(1.0, features['corpus_similarity'] * 1.5), features['intent_confidence']) * length_penalty
+            cloud = 0.7 if HYBRID_CLOUD and features['length'] >= HYBRID_CLOUD_MIN_WORDS else 0.2
+            return max(local, cloud)
+        return 0.8
+
+    def plan(self, features):
+        """Tiers to try, cheapest qualifying one first, heavy model as last resort"""
+        qualifying = [t for t in self.tiers
+                      if self.estimate_quality(t, features) >= QUALITY_THRESHOLD
+                      and t.p95_ms() <= LATENCY_SLO_MS]
+        if not qualifying:
+            qualifying = [t for t in self.tiers if self.estimate_quality(t, features) >= QUALITY_THRESHOLD]
+        plan = sorted(qualifying, key=lambda t: t.cost)
+        heavy = self.tiers[-1]
+        if heavy not in plan:
+            plan.append(heavy)
+        return plan
+
+    def route(self, message):
+        features = self.score(message)
+        last_error = None
+        for tier in self.plan(features):
+            try:
+                answer = tier.call(message)
+            except Exception as e:
+                with self._lock:
+                    tier.errors += 1
+                last_error = e
+                continue
+            with self._lock:
+                tier.requests += 1
+                self.total += 1
+            return answer, tier.name, features
+        raise RuntimeError(f"All tiers failed: {last_error}")
+
+    def stats(self):
+        return {
+            'total_requests': self.total,
+            'quality_threshold': QUALITY_THRESHOLD,
+            'latency_slo_ms': LATENCY_SLO_MS,
+            'tiers': [{
+                'name': t.name,
+                'requests': t.requests,
+                'share': t.requests / self.total if self.total else 0.0,
+                'errors': t.errors,
+                'p50_ms': round(t.p50_ms(), 1),
+                'p95_ms': round(t.p95_ms(), 1),
+            } for t in self.tiers]
+        }
+
+
+router = TieredRouter()
+
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    data = request.get_json()
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Missing message field'}), 400
+
+    user_message = data['message'].strip()
+    if not user_message:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+
+    try:
+        answer, tier, features = router.route(user_message)
+    except RuntimeError as e:
+        return jsonify({
+            'error': str(e),
+            'response': 'Xin lỗi em, cô gặp vấn đề kỹ thuật. Em thử lại sau nhé!'
+        }), 503
+
+    return jsonify({
+        'response': answer,
+        'tier': tier,
+        'features': features,
+        'status': 'success'
+    })
+
+
+@app.route('/router/stats', methods=['GET'])
+def router_stats():
+    return jsonify(router.stats())
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'healthy',
+        'tiers': [t.name for t in router.tiers],
+        'corpus_questions': len(router.corpus_questions)
+    })
+
+
+if __name__ == '__main__':
+    print("🇻🇳 Vietnamese Teacher Router")
+    print("🚀 Starting router on port 5004...")
+    app.run(host='0.0.0.0', port=5004, debug=False, threaded=True)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Semantic answer cache for the Vietnamese Teacher AI
+- Embeds questions with a small CPU sentence encoder
+- Cosine search over previously answered questions (normalized numpy matrix)
+- Persisted to disk, capped in size (least recently hit entries are evicted)
+- Workers sharing cache_dir merge their entries into the files under a file lock
+- clear() when the serving model changes, so old answers are not replayed:
+  it bumps a generation counter shared through cache_dir, every entry carries
+  the generation it was answered under, and entries from older generations are
+  rejected on add and dropped on lookup, load and merge (in every worker)
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODER = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+class SemanticCache:
+    def __init__(self, cache_dir="./semantic_cache", encoder_name=None, threshold=0.86,
+                 max_entries=5000, save_every=20):
+        self.cache_dir = cache_dir
+        self.encoder_name = encoder_name or os.getenv("AI_CACHE_ENCODER", DEFAULT_ENCODER)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.save_every = save_every
+
+        self._lock = threading.Lock()
+        self._encoder_lock = threading.Lock()
+        self._encoder = None
+        self.embeddings = None
+        self.entries = []
+        self.hits = 0
+        self.misses = 0
+        self._unsaved = 0
+        self.generation = 0
+        self.load()
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(self.encoder_name, device="cpu")
+        return self._encoder
+
+    def embed(self, text):
+        vector = self.encoder.encode([text.strip().lower()], normalize_embeddings=True)[0]
+        return vector.astype(np.float32)
+
+    def _generation_path(self):
+        return os.path.join(self.cache_dir, "generation")
+
+    def _read_generation(self):
+        try:
+            with open(self._generation_path(), encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def current_generation(self):
+        """Shared generation; drops our in-memory entries if another worker cleared the cache"""
+        generation = self._read_generation()
+        with self._lock:
+            if generation != self.generation:
+                self.generation = generation
+                self.entries = []
+                self.embeddings = None
+                self._unsaved = 0
+        return generation
+
+    def lookup(self, question):
+        """Return (answer or None, best similarity, question embedding)"""
+        vector = self.embed(question)
+        self.current_generation()
+        with self._lock:
+            if not self.entries:
+                self.misses += 1
+                return None, 0.0, vector
+
+            similarities = self.embeddings @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity >= self.threshold:
+                self.hits += 1
+                entry = self.entries[best]
+                entry['hits'] += 1
+                entry['last_hit'] = time.time()
+                return entry['answer'], similarity, vector
+
+            self.misses += 1
+            return None, similarity, vector
+
+    def add(self, question, answer, vector=None, generation=None):
+        """Cache an answer; generation is the one the answer was started under
+        (an answer from before a clear() is dropped)"""
+        if vector is None:
+            vector = self.embed(question)
+        current = self.current_generation()
+        if generation is not None and generation != current:
+            logger.info("[CACHE] dropping an answer from generation %d (now %d)", generation, current)
+            return
+        with self._lock:
+            if len(self.entries) >= self.max_entries:
+                self._evict()
+            entry = {'question': question, 'answer': answer, 'hits': 0, 'last_hit': time.time(),
+                     'generation': current}
+            self.entries.append(entry)
+            row = vector.reshape(1, -1)
+            self.embeddings = row if self.embeddings is None else np.vstack([self.embeddings, row])
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def _evict(self):
+        """Drop the least recently hit entry (caller holds the lock)"""
+        oldest = min(range(len(self.entries)), key=lambda i: self.entries[i]['last_hit'])
+        del self.entries[oldest]
+        self.embeddings = np.delete(self.embeddings, oldest, axis=0)
+
+    def get_or_generate(self, question, generate, cacheable=None):
+        """Serve from the cache, or call generate(question) and cache the answer"""
+        generation = self.current_generation()
+        answer, similarity, vector = self.lookup(question)
+        if answer is not None:
+            logger.info("[CACHE HIT] similarity=%.3f", similarity)
+            return answer
+        answer = generate(question)
+        if cacheable is None or cacheable(answer):
+            self.add(question, answer, vector, generation=generation)
+        return answer
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize disk access between worker processes sharing cache_dir"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_files(self, generation):
+        """(entries, embeddings) of this generation on disk, or ([], None) if missing,
+        inconsistent or another encoder"""
+        meta_path = os.path.join(self.cache_dir, "entries.json")
+        embeddings_path = os.path.join(self.cache_dir, "embeddings.npy")
+        if not (os.path.exists(meta_path) and os.path.exists(embeddings_path)):
+            return [], None
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get('encoder') != self.encoder_name:
+            print(f"⚠️ Semantic cache was built with {meta.get('encoder')}, ignoring it")
+            return [], None
+
+        embeddings = np.load(embeddings_path)
+        if len(embeddings) != len(meta['entries']):
+            print("⚠️ Semantic cache files are inconsistent, ignoring them")
+            return [], None
+        keep = [i for i, entry in enumerate(meta['entries']) if entry.get('generation', 0) == generation]
+        if len(keep) != len(meta['entries']):
+            return [meta['entries'][i] for i in keep], embeddings[keep] if keep else None
+        return meta['entries'], embeddings
+
+    def save(self):
+        """Merge our entries with what other workers saved, keep the most recently hit"""
+        with self._lock:
+            if self.embeddings is None:
+                return
+            embeddings = self.embeddings.copy()
+            entries = [dict(entry) for entry in self.entries]
+            self._unsaved = 0
+
+        with self._file_lock():
+            generation = self._read_generation()
+            # Entries answered before a clear() (here or in another worker) are not written back
+            keep = [i for i, entry in enumerate(entries) if entry.get('generation', 0) == generation]
+            entries = [entries[i] for i in keep]
+            embeddings = embeddings[keep]
+            disk_entries, disk_embeddings = self._read_files(generation)
+            if not entries and not disk_entries:
+                return
+            merged = {}
+            for entry, vector in list(zip(disk_entries, disk_embeddings if disk_embeddings is not None else [])) + \
+                    list(zip(entries, embeddings)):
+                current = merged.get(entry['question'])
+                if current is None or entry['last_hit'] >= current[0]['last_hit']:
+                    merged[entry['question']] = (entry, vector)
+            kept = sorted(merged.values(), key=lambda item: item[0]['last_hit'])[-self.max_entries:]
+
+            tmp_embeddings = os.path.join(self.cache_dir, "embeddings.npy.tmp")
+            with open(tmp_embeddings, "wb") as f:
+                np.save(f, np.stack([vector for _, vector in kept]))
+            os.replace(tmp_embeddings, os.path.join(self.cache_dir, "embeddings.npy"))
+            tmp_meta = os.path.join(self.cache_dir, "entries.json.tmp")
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({'encoder': self.encoder_name, 'entries': [entry for entry, _ in kept]}, f, ensure_ascii=False)
+            os.replace(tmp_meta, os.path.join(self.cache_dir, "entries.json"))
+
+    def load(self):
+        with self._file_lock():
+            self.generation = self._read_generation()
+            entries, embeddings = self._read_files(self.generation)
+        if not entries:
+            return
+        self.entries = entries[-self.max_entries:]
+        self.embeddings = embeddings[-self.max_entries:]
+        print(f"📚 Loaded {len(self.entries)} cached answers")
+
+    def clear(self):
+        """Forget every cached answer, in memory and on disk (the serving model changed),
+        and start a new generation so in-flight answers and other workers' entries are dropped"""
+        with self._file_lock():
+            generation = self._read_generation() + 1
+            tmp_path = self._generation_path() + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(generation))
+            os.replace(tmp_path, self._generation_path())
+            for name in ("entries.json", "embeddings.npy"):
+                path = os.path.join(self.cache_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            with self._lock:
+                self.generation = generation
+                self.entries = []
+                self.embeddings = None
+                self._unsaved = 0
+        print(f"🧹 Semantic cache cleared (generation {generation})")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'threshold': self.threshold,
+            'generation': self.generation,
+        }
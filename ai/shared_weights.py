@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Model weights that stay shared between pre-forked workers
+- shm: move parameters to torch shared memory after loading
+- mmap: load a pre-converted checkpoint with torch.load(mmap=True), weights
+  stay in the page cache and are shared by every process that maps them
+Usage: python shared_weights.py [model_dir]   (converts to the mmap format)
+"""
+
+import glob
+import json
+import os
+import sys
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+
+MMAP_WEIGHTS_FILE = "weights.mmap.pt"
+MMAP_SOURCE_FILE = "weights.mmap.source.json"   # the checkpoint files the mmap weights were converted from
+SOURCE_PATTERNS = ("config.json", "*.safetensors", "pytorch_model*.bin")
+SHARED_WEIGHT_MODES = ("shm", "mmap")
+
+
+def share_model_memory(model):
+    """Move all parameters and buffers into shared memory (survives fork without copies)"""
+    model.share_memory()
+    return model
+
+
+def mmap_weights_path(model_path):
+    return os.path.join(model_path, MMAP_WEIGHTS_FILE)
+
+
+def checkpoint_signature(model_path):
+    """{file: [size, mtime_ns]} of the checkpoint's config and weight files"""
+    signature = {}
+    for pattern in SOURCE_PATTERNS:
+        for path in glob.glob(os.path.join(model_path, pattern)):
+            stat = os.stat(path)
+            signature[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def mmap_is_current(model_path):
+    """True if weights.mmap.pt exists and was converted from the checkpoint as it is now"""
+    source_path = os.path.join(model_path, MMAP_SOURCE_FILE)
+    if not (os.path.exists(mmap_weights_path(model_path)) and os.path.exists(source_path)):
+        return False
+    with open(source_path) as f:
+        return json.load(f) == checkpoint_signature(model_path)
+
+
+def convert_to_mmap(model_path):
+    """Write a state dict that torch.load can memory-map"""
+    signature = checkpoint_signature(model_path)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        torch_dtype=torch.float32,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True
+    )
+    output_path = mmap_weights_path(model_path)
+    torch.save(model.state_dict(), output_path + ".tmp")
+    os.replace(output_path + ".tmp", output_path)
+    with open(os.path.join(model_path, MMAP_SOURCE_FILE), "w") as f:
+        json.dump(signature, f)
+    print(f"✅ Saved memory-mappable weights: {output_path}")
+    return output_path
+
+
+def load_mmap_model(model_path):
+    """Build the model without initializing weights, then assign mmap'ed tensors"""
+    from transformers.modeling_utils import no_init_weights
+
+    config = AutoConfig.from_pretrained(model_path, trust_remote_code=True)
+    with no_init_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32, trust_remote_code=True)
+
+    state_dict = torch.load(mmap_weights_path(model_path), mmap=True, weights_only=True, map_location="cpu")
+    model.load_state_dict(state_dict, assign=True)
+    model.tie_weights()
+    model.eval()
+    return model
+
+
+def load_shared_model(model_path, mode):
+    """Load a model whose weights will not be duplicated by fork"""
+    if mode not in SHARED_WEIGHT_MODES:
+        raise ValueError(f"Unknown shared weights mode '{mode}', choose one of {SHARED_WEIGHT_MODES}")
+
+    if mode == "mmap":
+        if not mmap_is_current(model_path):
+            # Missing, or the checkpoint was retrained since the conversion
+            convert_to_mmap(model_path)
+        return load_mmap_model(model_path)
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        torch_dtype=torch.float32,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True
+    )
+    model.eval()
+    return share_model_memory(model)
+
+
+if __name__ == "__main__":
+    convert_to_mmap(sys.argv[1] if len(sys.argv) > 1 else "./vietnamese_teacher_trained")
@@ -9,6 +9,8 @@ import random
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import torch
 
+from intent_matcher import IntentMatcher
+
 def load_teacher_examples():
     """Load our teacher examples as context"""
     examples = []
@@ -37,28 +39,30 @@ def load_teacher_examples():
     
     return examples
 
-def find_similar_example(user_input, examples):
-    """Find most relevant example based on keywords"""
-    user_lower = user_input.lower()
-    
-    # Simple keyword matching
-    keywords = {
-        'xin chào': ['xin chào', 'chào', 'hello'],
-        'phát âm': ['phát âm', 'thanh điệu', 'âm'],
-        'từ vựng': ['từ vựng', 'vocabulary', 'từ'],
-        'xưng hô': ['anh', 'chị', 'em', 'xưng hô'],
-        'động từ': ['động từ', 'verb', 'chia động từ'],
-        'văn hóa': ['văn hóa', 'culture', 'truyền thống'],
-        'đọc sách': ['đọc', 'sách', 'reading'],
-        'nói': ['nói', 'speaking', 'ngại ngùng']
-    }
-    
-    for category, words in keywords.items():
-        if any(word in user_lower for word in words):
-            # Find examples related to this category
-            relevant = [ex for ex in examples if any(word in ex['student'].lower() for word in words)]
-            if relevant:
-                return random.choice(relevant)['teacher']
+# Simple keyword matching: category -> keywords, tried in this order
+CATEGORY_KEYWORDS = {
+    'xin chào': ['xin chào', 'chào', 'hello'],
+    'phát âm': ['phát âm', 'thanh điệu', 'âm'],
+    'từ vựng': ['từ vựng', 'vocabulary', 'từ'],
+    'xưng hô': ['anh', 'chị', 'em', 'xưng hô'],
+    'động từ': ['động từ', 'verb', 'chia động từ'],
+    'văn hóa': ['văn hóa', 'culture', 'truyền thống'],
+    'đọc sách': ['đọc', 'sách', 'reading'],
+    'nói': ['nói', 'speaking', 'ngại ngùng']
+}
+CATEGORY_MATCHER = IntentMatcher(CATEGORY_KEYWORDS)
+
+def index_examples(examples):
+    """Category -> examples, matched once when the examples are loaded"""
+    return CATEGORY_MATCHER.index(examples, lambda ex: ex['student'])
+
+def find_similar_example(user_input, examples, by_category):
+    """Find most relevant example based on keywords (by_category from index_examples)"""
+    for category in CATEGORY_MATCHER.scores(user_input):
+        # Examples related to this category
+        relevant = by_category.get(category)
+        if relevant:
+            return random.choice(relevant)['teacher']
     
     # If no specific match, return a general response
     return random.choice(examples)['teacher'] if examples else "Cô hiểu rồi. Hãy nói rõ hơn về điều em muốn học nhé!"
@@ -75,6 +79,9 @@ from transformers import AutoTokenizer, AutoModelForCausalLM
 import json
 import random
 
+from intent_matcher import IntentMatcher
+from tutor_intents import EXAMPLE_INTENTS, USER_INTENTS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -84,10 +91,11 @@ CORS(app)
 
 # Load teacher examples
 TEACHER_EXAMPLES = []
+EXAMPLES_BY_INTENT = {}
 
 def load_teacher_examples():
     """Load our teacher conversation examples"""
-    global TEACHER_EXAMPLES
+    global TEACHER_EXAMPLES, EXAMPLES_BY_INTENT
     
     try:
         with open('premium_teacher_data.txt', 'r', encoding='utf-8') as f:
@@ -112,31 +120,20 @@ def load_teacher_examples():
             
             i += 1
         
+        # Intent -> examples, matched once here instead of on every request
+        EXAMPLES_BY_INTENT = EXAMPLE_MATCHER.index(TEACHER_EXAMPLES, lambda ex: ex['student'])
         logger.info(f"Loaded {len(TEACHER_EXAMPLES)} teacher examples")
     except Exception as e:
         logger.error(f"Error loading teacher examples: {e}")
 
+USER_MATCHER = IntentMatcher(USER_INTENTS)
+EXAMPLE_MATCHER = IntentMatcher(EXAMPLE_INTENTS)
+
 def find_best_response(user_input):
     """Find the best teacher response based on context"""
-    user_lower = user_input.lower()
-    
-    # Keyword categories with responses
-    if any(word in user_lower for word in ['xin chào', 'chào', 'hello']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'chào' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['phát âm', 'thanh điệu', 'âm']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if any(w in ex['student'].lower() for w in ['phát âm', 'thanh'])]
-    elif any(word in user_lower for word in ['từ vựng', 'vocabulary', 'từ']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'từ vựng' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['anh', 'chị', 'em', 'xưng hô']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if any(w in ex['student'].lower() for w in ['anh', 'chị', 'em'])]
-    elif any(word in user_lower for word in ['động từ', 'verb']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'động từ' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['văn hóa', 'culture']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'văn hóa' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['đọc', 'sách']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'đọc' in ex['student'].lower()]
-    elif any(word in user_lower for word in ['nói', 'speaking', 'ngại']):
-        responses = [ex['teacher'] for ex in TEACHER_EXAMPLES if 'nói' in ex['student'].lower()]
+    intent = USER_MATCHER.first(user_input)
+    if intent:
+        responses = [ex['teacher'] for ex in EXAMPLES_BY_INTENT.get(intent, [])]
     else:
         # Default to a random appropriate response
         responses = [ex['teacher'] for ex in TEACHER_EXAMPLES]
@@ -200,7 +197,7 @@ def health():
 
 if __name__ == '__main__':
     logger.info("Starting Smart Vietnamese Tutor Service...")
-    app.run(host='0.0.0.0', port=5002, debug=False)
+    app.run(host='0.0.0.0', port=int(os.getenv("PORT", "5002")), debug=False)
 '''
     
     with open('app_smart.py', 'w', encoding='utf-8') as f:
@@ -211,6 +208,7 @@ if __name__ == '__main__':
 def test_smart_responses():
     """Test the smart response system"""
     examples = load_teacher_examples()
+    by_category = index_examples(examples)
     print(f"Loaded {len(examples)} examples")
     
     test_inputs = [
@@ -222,7 +220,7 @@ def test_smart_responses():
     ]
     
     for inp in test_inputs:
-        response = find_similar_example(inp, examples)
+        response = find_similar_example(inp, examples, by_category)
         print(f"\\nInput: {inp}")
         print(f"Response: {response}")
 
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Speculative decoding with a small draft model
+A draft model proposes k tokens, the teacher model scores all of them in a
+single forward pass and accepts each one with probability min(1, p/q).
+On rejection the token is resampled from max(0, p - q), so the output follows
+exactly the teacher's (warped) sampling distribution.
+Draft and teacher must share the tokenizer (e.g. NlpHUST/gpt2-vietnamese
+drafting for the teacher fine-tuned from it).
+"""
+
+import threading
+
+import torch
+from transformers import (
+    AutoModelForCausalLM,
+    LogitsProcessorList,
+    RepetitionPenaltyLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+)
+
+
+def _crop_past(past_key_values, length):
+    """Keep the first `length` positions of a KV cache"""
+    if past_key_values is None:
+        return None
+    if hasattr(past_key_values, 'crop'):
+        past_key_values.crop(length)
+        return past_key_values
+    return tuple(tuple(t[..., :length, :] for t in layer) for layer in past_key_values)
+
+
+class SpeculativeDecoder:
+    def __init__(self, target_model, draft_model, k=4):
+        self.target = target_model
+        self.draft = draft_model
+        self.k = k
+        self.vocab_size = min(target_model.config.vocab_size, draft_model.config.vocab_size)
+
+        self._lock = threading.Lock()
+        self.drafted = 0
+        self.accepted = 0
+        self.target_passes = 0
+        self.generated = 0
+
+    @classmethod
+    def from_pretrained(cls, target_model, draft_name, k=4):
+        draft = AutoModelForCausalLM.from_pretrained(
+            draft_name,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True,
+            trust_remote_code=True
+        )
+        draft.eval()
+        return cls(target_model, draft, k=k)
+
+    @staticmethod
+    def _processors(do_sample, temperature, top_k, top_p, repetition_penalty):
+        """Same processors, in the same order, as model.generate builds for these settings"""
+        processors = LogitsProcessorList()
+        if repetition_penalty and repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(repetition_penalty))
+        if do_sample:
+            if temperature and temperature != 1.0:
+                processors.append(TemperatureLogitsWarper(temperature))
+            if top_k:
+                processors.append(TopKLogitsWarper(top_k))
+            if top_p is not None and top_p < 1.0:
+                processors.append(TopPLogitsWarper(top_p))
+        return processors
+
+    def _probs(self, prefix, logits, processors, do_sample):
+        scores = processors(prefix, logits[:, :self.vocab_size].float())
+        if not do_sample:
+            return torch.nn.functional.one_hot(scores.argmax(dim=-1), self.vocab_size).float()
+        return torch.softmax(scores, dim=-1)
+
+    @staticmethod
+    def _sample(probs):
+        return torch.multinomial(probs, num_samples=1)
+
+    @torch.no_grad()
+    def generate(self, input_ids, max_new_tokens=100, do_sample=True, temperature=1.0, top_k=None, top_p=1.0,
+                 repetition_penalty=1.0, eos_token_id=None, stopping_criteria=None, **unused):
+        """Single-sequence generation; returns ids shaped like model.generate
+
+        top_k=None falls back to the teacher's generation_config (50 by default),
+        as model.generate does.
+        """
+        if input_ids.shape[0] != 1:
+            raise ValueError("Speculative decoding supports batch size 1")
+
+        if top_k is None:
+            top_k = getattr(getattr(self.target, 'generation_config', None), 'top_k', None)
+        processors = self._processors(do_sample, temperature, top_k, top_p, repetition_penalty)
+        prompt_length = input_ids.shape[1]
+        ids = input_ids
+        target_past, target_len = None, 0
+        draft_past, draft_len = None, 0
+        drafted = accepted = passes = 0
+
+        while ids.shape[1] - prompt_length < max_new_tokens:
+            n = ids.shape[1]
+            k = min(self.k, max_new_tokens - (n - prompt_length))
+
+            # 1. Draft k tokens autoregressively
+            draft_ids = ids
+            q_probs = []
+            for _ in range(k):
+                out = self.draft(draft_ids[:, draft_len:], past_key_values=draft_past, use_cache=True)
+                draft_past, draft_len = out.past_key_values, draft_ids.shape[1]
+                q = self._probs(draft_ids, out.logits[:, -1, :], processors, do_sample)
+                q_probs.append(q)
+                draft_ids = torch.cat([draft_ids, self._sample(q)], dim=1)
+
+            # 2. Score every drafted position with one teacher forward pass
+            out = self.target(draft_ids[:, target_len:], past_key_values=target_past, use_cache=True)
+            target_past, target_len = out.past_key_values, draft_ids.shape[1]
+            passes += 1
+            offset = n - 1 - (target_len - out.logits.shape[1])
+
+            # 3. Accept / resample
+            new_tokens = []
+            accepted_round = 0
+            for i in range(k):
+                p = self._probs(draft_ids[:, :n + i], out.logits[:, offset + i, :], processors, do_sample)
+                token = draft_ids[0, n + i].item()
+                ratio = p[0, token] / q_probs[i][0, token].clamp_min(1e-12)
+                if torch.rand(()) < ratio.clamp(max=1.0):
+                    new_tokens.append(token)
+                    accepted_round += 1
+                    continue
+                residual = (p - q_probs[i]).clamp_min(0)
+                residual = residual / residual.sum() if residual.sum() > 0 else p
+                new_tokens.append(self._sample(residual).item())
+                break
+            else:
+                # Every draft accepted: the teacher's last position gives one bonus token
+                p = self._probs(draft_ids, out.logits[:, offset + k, :], processors, do_sample)
+                new_tokens.append(self._sample(p).item())
+
+            drafted += k
+            accepted += accepted_round
+
+            if eos_token_id is not None and eos_token_id in new_tokens:
+                new_tokens = new_tokens[:new_tokens.index(eos_token_id) + 1]
+            new_tokens = new_tokens[:max_new_tokens - (n - prompt_length)]
+            ids = torch.cat([ids, torch.tensor([new_tokens], dtype=ids.dtype, device=ids.device)], dim=1)
+
+            # 4. Roll both caches back to the accepted prefix
+            target_len = min(target_len, ids.shape[1] - 1)
+            target_past = _crop_past(target_past, target_len)
+            draft_len = min(draft_len, ids.shape[1] - 1)
+            draft_past = _crop_past(draft_past, draft_len)
+
+            if eos_token_id is not None and new_tokens[-1] == eos_token_id:
+                break
+            if stopping_criteria is not None and bool(stopping_criteria(ids, None)):
+                break
+
+        with self._lock:
+            self.drafted += drafted
+            self.accepted += accepted
+            self.target_passes += passes
+            self.generated += ids.shape[1] - prompt_length
+        return ids
+
+    def stats(self):
+        with self._lock:
+            return {
+                'k': self.k,
+                'drafted': self.drafted,
+                'accepted': self.accepted,
+                'acceptance_rate': self.accepted / self.drafted if self.drafted else 0.0,
+                'tokens_per_target_pass': self.generated / self.target_passes if self.target_passes else 0.0,
+            }
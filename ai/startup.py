@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup phases for the AI service
+starting -> loading -> warming -> ready (or failed)
+The HTTP server binds right away; the model loads in the background and
+readiness is reported separately from liveness.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Taken at import, i.e. as early as the service process starts
+PROCESS_STARTED = time.monotonic()
+
+
+class StartupReadiness:
+    def __init__(self):
+        self.phase = 'starting'
+        self.error = None
+        self.phase_seconds = {}
+        self.time_to_ready = None
+        self._phase_started = PROCESS_STARTED
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def enter(self, phase):
+        now = time.monotonic()
+        self.phase_seconds[self.phase] = round(now - self._phase_started, 3)
+        self.phase = phase
+        self._phase_started = now
+        logger.info("Startup phase: %s", phase)
+
+    def start(self, loader, background=True):
+        """Run loader(readiness) now or in a background thread"""
+        if background:
+            threading.Thread(target=self._run, args=(loader,), name="model-startup", daemon=True).start()
+        else:
+            self._run(loader)
+
+    def _run(self, loader):
+        try:
+            loader(self)
+        except Exception as e:
+            self.error = str(e)
+            self.enter('failed')
+            print(f"❌ Startup failed: {e}")
+            return
+        self.enter('ready')
+        self.time_to_ready = round(time.monotonic() - PROCESS_STARTED, 3)
+        self._ready.set()
+        print(f"✅ AI Teacher ready in {self.time_to_ready:.1f}s")
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        return {
+            'phase': self.phase,
+            'ready': self.ready,
+            'time_to_ready_seconds': self.time_to_ready,
+            'phase_seconds': dict(self.phase_seconds),
+            'error': self.error,
+        }
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Find the best replicas x threads split for this machine
+Usage: python sweep_worker_pool.py [requests_per_config]
+"""
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from worker_pool import ModelWorkerPool, numa_cpu_sets
+
+SWEEP_QUESTIONS = [
+    "Xin chào cô!",
+    "6 thanh điệu là những thanh nào ạ?",
+    "Làm sao để nhớ lâu được từ vựng?",
+    "Tại sao tiếng Việt không chia động từ như tiếng Anh?",
+    "Khi nào em nên dùng anh, chị, em?",
+    "Cảm ơn cô!",
+]
+
+
+def candidate_splits(total_cpus):
+    """(replicas, threads) pairs that use every CPU exactly once"""
+    return [(replicas, total_cpus // replicas) for replicas in range(1, total_cpus + 1)
+            if total_cpus % replicas == 0]
+
+
+def run_config(replicas, threads, total_requests):
+    pool = ModelWorkerPool(replicas, threads_per_replica=threads).start()
+    questions = [SWEEP_QUESTIONS[i % len(SWEEP_QUESTIONS)] for i in range(total_requests)]
+    latencies = []
+
+    def timed(question):
+        start = time.perf_counter()
+        pool.generate_response(question)
+        latencies.append(time.perf_counter() - start)
+
+    try:
+        # Warm every replica once before measuring
+        with ThreadPoolExecutor(max_workers=replicas) as executor:
+            list(executor.map(timed, SWEEP_QUESTIONS[:1] * replicas))
+        latencies.clear()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=replicas * 2) as executor:
+            list(executor.map(timed, questions))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    latencies.sort()
+    return {
+        'replicas': replicas,
+        'threads': threads,
+        'throughput': total_requests / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+if __name__ == '__main__':
+    total_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    nodes = numa_cpu_sets()
+    total_cpus = sum(len(cpus) for cpus in nodes)
+    print(f"🖥️  {total_cpus} CPUs on {len(nodes)} NUMA node(s)")
+
+    results = []
+    for replicas, threads in candidate_splits(total_cpus):
+        print(f"\n⏱️  Testing {replicas} replicas x {threads} threads...")
+        result = run_config(replicas, threads, total_requests)
+        results.append(result)
+        print(f"   {result['throughput']:.2f} req/s, p50 {result['p50']:.2f}s, p95 {result['p95']:.2f}s")
+
+    print("\n" + "=" * 50)
+    print(f"{'replicas':>8} {'threads':>8} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for r in results:
+        print(f"{r['replicas']:>8} {r['threads']:>8} {r['throughput']:>8.2f} {r['p50']:>8.2f} {r['p95']:>8.2f}")
+
+    best = max(results, key=lambda r: r['throughput'])
+    print(f"\n🏆 Best: AI_POOL_REPLICAS={best['replicas']} AI_POOL_THREADS={best['threads']}")
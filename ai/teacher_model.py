@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vietnamese Teacher model wrapper
+Shared by the Flask service (app.py) and the multi-replica worker pool
+"""
+
+import torch
+import logging
+import os
+from contextlib import nullcontext
+
+from fast_tokenizer import CachedTokenizer, load_tokenizer
+from generation_control import DecodeStats, build_stopping_criteria, token_budget, truncate_at_stop
+from inference_backends import create_backend
+from prune_vocab import VOCAB_MAP_FILE, PrunedVocabTokenizer
+from speculative import SpeculativeDecoder
+
+logger = logging.getLogger(__name__)
+
+class VietnameseTeacherAI:
+    def __init__(self, backend=None, chat_log=None, model_path=None, profiler=None):
+        self.backend_name = backend or os.getenv("AI_BACKEND", "torch")
+        self.model_path = model_path
+        self.chat_log = chat_log
+        self.profiler = profiler
+        self.backend = None
+        self.model = None
+        self.tokenizer = None
+        self.speculative = None
+        self.decode_stats = DecodeStats()
+        self.load_model()
+        
+    def load_model(self):
+        """Load trained model or base model"""
+        trained_model_path = "./vietnamese_teacher_trained"
+        
+        if self.model_path:
+            print(f"📦 Loading Vietnamese teacher model from {self.model_path}...")
+            model_path = self.model_path
+        elif os.path.exists(trained_model_path) and os.listdir(trained_model_path):
+            print("📦 Loading trained Vietnamese teacher model...")
+            model_path = trained_model_path
+        else:
+            print("📦 Loading base Vietnamese model...")
+            model_path = "NlpHUST/gpt2-vietnamese"
+        self.model_path = model_path
+        
+        try:
+            # Load tokenizer (fast one only if it matches the slow one on our corpora)
+            tokenizer = load_tokenizer(model_path)
+            
+            # Configure special tokens
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+
+            # Repeated prompts and stop strings skip tokenization
+            self.tokenizer = CachedTokenizer(tokenizer, max_entries=int(os.getenv("AI_TOKENIZER_CACHE", "4096")))
+
+            # Vocabulary-pruned checkpoint: translate ids to the reduced vocabulary
+            pruned_vocab = os.path.exists(os.path.join(model_path, VOCAB_MAP_FILE))
+            if pruned_vocab:
+                self.tokenizer = PrunedVocabTokenizer.from_model_dir(self.tokenizer, model_path)
+                print(f"✂️  Pruned vocabulary: {len(self.tokenizer)} tokens")
+            
+            # Load model through the configured inference backend
+            self.backend = create_backend(self.backend_name, model_path)
+            self.model = self.backend.model
+
+            # Optional speculative decoding with a small draft model (same tokenizer)
+            draft_model = os.getenv("AI_DRAFT_MODEL")
+            if draft_model and pruned_vocab:
+                print("⚠️ AI_DRAFT_MODEL ignored: the draft model does not share the pruned vocabulary")
+            elif draft_model and self.backend_name == "torch":
+                print(f"📦 Loading draft model {draft_model}...")
+                self.speculative = SpeculativeDecoder.from_pretrained(
+                    self.model, draft_model, k=int(os.getenv("AI_SPEC_K", "4"))
+                )
+            
+            print(f"✅ Model loaded successfully! (backend: {self.backend_name})")
+            
+        except Exception as e:
+            print(f"❌ Error loading model: {e}")
+            self.backend = None
+            self.model = None
+            self.tokenizer = None
+            self.speculative = None
+    
+    def warm_up(self, prompt="Học sinh: Xin chào cô!\nGiáo viên:", max_new_tokens=8):
+        """Run one short generation so the first real request skips kernel setup"""
+        inputs = self.tokenizer.encode(prompt, return_tensors='pt')
+        self.backend.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+
+    def generate_response(self, question, cancel=None, streamer=None):
+        """Generate teacher response for student question
+
+        cancel: cancellation.GenerationCancel checked at every decode step
+        streamer: optional transformers streamer receiving tokens as they decode
+        """
+        if self.model is None or self.tokenizer is None:
+            return "Xin lỗi, AI giáo viên hiện tại không khả dụng."
+        
+        profile = self.profiler.begin() if self.profiler is not None else None
+        try:
+            # Format input as conversation
+            prompt = f"Học sinh: {question}\nGiáo viên:"
+            logger.debug("[PROMPT] %s", prompt)
+
+            # Tokenize input
+            inputs = self.tokenizer.encode(prompt, return_tensors='pt')
+            logger.debug("[INPUT TOKENS] %s", inputs)
+            if profile is not None:
+                profile.mark_tokenized(inputs.shape[1])
+
+            # Add attention_mask to avoid inf/nan errors
+            attention_mask = torch.ones_like(inputs)
+
+            # Token budget depends on the kind of question
+            question_type, max_new_tokens = token_budget(question)
+            prompt_length = inputs.shape[1]
+
+            # Generate response, stopping at the next speaker turn
+            generate_kwargs = dict(
+                max_new_tokens=max_new_tokens,
+                temperature=0.5,
+                repetition_penalty=1.2,
+                stopping_criteria=build_stopping_criteria(
+                    self.tokenizer, prompt_length, cancel=cancel, max_new_tokens=max_new_tokens
+                ),
+                do_sample=True,
+                top_p=0.8
+            )
+            if profile is not None:
+                profile.mark_generate_start()
+            with self.profiler.trace(profile) if profile is not None else nullcontext():
+                if self.speculative is not None:
+                    outputs = self.speculative.generate(
+                        inputs, eos_token_id=self.tokenizer.eos_token_id, **generate_kwargs
+                    )
+                else:
+                    if streamer is not None:
+                        generate_kwargs['streamer'] = streamer
+                    elif profile is not None:
+                        # Timestamps each emitted token for TTFT / inter-token latency
+                        generate_kwargs['streamer'] = profile.streamer
+                    outputs = self.backend.generate(
+                        inputs,
+                        attention_mask=attention_mask,
+                        pad_token_id=self.tokenizer.eos_token_id,
+                        **generate_kwargs
+                    )
+
+            decode_steps = outputs.shape[1] - prompt_length
+            if cancel is not None:
+                cancel.tokens_generated = decode_steps
+            if profile is not None:
+                profile.mark_generated(decode_steps)
+            avg_steps = self.decode_stats.record(decode_steps, max_new_tokens)
+            logger.info("[DECODE] type=%s steps=%d/%d avg_steps=%.1f",
+                        question_type, decode_steps, max_new_tokens, avg_steps)
+
+            # Decode response
+            full_response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            logger.debug("[FULL RESPONSE] %s", full_response)
+
+            # Log lại prompt và response vào file log (không chặn request)
+            if self.chat_log is not None:
+                self.chat_log.log(prompt, full_response)
+
+            # Extract teacher response
+            teacher_response = None
+            if "Giáo viên:" in full_response:
+                teacher_response = self.tokenizer.decode(outputs[0, prompt_length:], skip_special_tokens=False)
+                # Clean up response (drop the stop string that ended decoding)
+                teacher_response = truncate_at_stop(teacher_response)
+            if profile is not None:
+                self.profiler.record(profile.finish())
+
+            if teacher_response is not None:
+                logger.debug("[TEACHER RESPONSE] %s", teacher_response)
+                return teacher_response
+            else:
+                logger.debug("[TEACHER RESPONSE] no teacher turn in output")
+                return "Xin lỗi, tôi không hiểu câu hỏi của em."
+                
+        except Exception as e:
+            import traceback
+            print(f"[ERROR] Error generating response: {e}")
+            traceback.print_exc()
+            return f"Xin lỗi, có lỗi xảy ra khi tạo phản hồi: {e}"
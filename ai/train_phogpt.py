@@ -6,7 +6,6 @@ import json
 import torch
 from transformers import (
     AutoTokenizer, 
-    AutoModelForCausalLM,
     TrainingArguments,
     Trainer,
     DataCollatorForLanguageModeling
@@ -14,6 +13,8 @@ from transformers import (
 from datasets import Dataset
 import os
 
+from phogpt_loader import load_phogpt
+
 # Training configuration
 MODEL_NAME = "vinai/PhoGPT-4B-Chat"
 OUTPUT_DIR = "./phogpt-vietnamese-tutor"
@@ -84,11 +85,12 @@ def fine_tune_phogpt():
         trust_remote_code=True
     )
     
-    model = AutoModelForCausalLM.from_pretrained(
+    # Attention implementation from PHOGPT_ATTN_IMPL (fused sdpa by default)
+    # Training needs full-precision weights, so PHOGPT_QUANT is ignored here
+    model = load_phogpt(
         MODEL_NAME,
-        cache_dir=CACHE_DIR,
-        trust_remote_code=True,
-        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+        quant=None
     )
     
     # Thêm pad token nếu chưa có
@@ -6,7 +6,6 @@ Optimized for M1 Mac with correct tokenization and data handling
 """
 
 from transformers import (
-    AutoTokenizer, 
     AutoModelForCausalLM, 
     Trainer, 
     TrainingArguments,
@@ -17,6 +16,8 @@ import torch
 import os
 import json
 
+from fast_tokenizer import load_tokenizer
+
 class VietnameseTeacherTrainer:
     def __init__(self, model_name="NlpHUST/gpt2-vietnamese"):
         self.model_name = model_name
@@ -28,11 +29,7 @@ class VietnameseTeacherTrainer:
         print(f"📦 Loading {self.model_name}...")
         
         # Load tokenizer first
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.model_name,
-            use_fast=False,  # Use slow tokenizer for better compatibility
-            trust_remote_code=True
-        )
+        self.tokenizer = load_tokenizer(self.model_name)  # Fast tokenizer only if it passes parity
         
         # Configure special tokens
         if self.tokenizer.pad_token is None:
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyword intent tables of the context-based tutor (app_smart.py)
+- USER_INTENTS: keywords in the student's message, first match in this order wins
+- EXAMPLE_INTENTS: keywords that mark a teacher example's question as on-topic
+Shared with router.py, which scores the corpus tier with the same table.
+"""
+
+USER_INTENTS = {
+    'greeting': ['xin chào', 'chào', 'hello'],
+    'pronunciation': ['phát âm', 'thanh điệu', 'âm'],
+    'vocabulary': ['từ vựng', 'vocabulary', 'từ'],
+    'address': ['anh', 'chị', 'em', 'xưng hô'],
+    'verbs': ['động từ', 'verb'],
+    'culture': ['văn hóa', 'culture'],
+    'reading': ['đọc', 'sách'],
+    'speaking': ['nói', 'speaking', 'ngại'],
+}
+EXAMPLE_INTENTS = {
+    'greeting': ['chào'],
+    'pronunciation': ['phát âm', 'thanh'],
+    'vocabulary': ['từ vựng'],
+    'address': ['anh', 'chị', 'em'],
+    'verbs': ['động từ'],
+    'culture': ['văn hóa'],
+    'reading': ['đọc'],
+    'speaking': ['nói'],
+}
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-process memory report for pre-forked workers (Linux /proc)
+- RSS: resident pages, shared pages counted in every process
+- PSS: shared pages split between the processes that map them
+- USS: private pages, i.e. what one more worker really costs
+Usage: python worker_memory.py <master_pid>
+"""
+
+import os
+import sys
+
+
+def process_memory(pid):
+    """Return RSS/PSS/USS/shared in MB from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+
+    return {
+        'pid': pid,
+        'rss_mb': fields.get('Rss', 0.0),
+        'pss_mb': fields.get('Pss', 0.0),
+        'uss_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+        'shared_mb': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+    }
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # ppid is the 4th field, after the parenthesised command name
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def memory_report(master_pid):
+    master = process_memory(master_pid)
+    workers = [process_memory(pid) for pid in child_pids(master_pid)]
+    per_worker = sum(w['uss_mb'] for w in workers) / len(workers) if workers else 0.0
+    return {
+        'master': master,
+        'workers': workers,
+        'additional_mb_per_worker': per_worker,
+        'total_pss_mb': master['pss_mb'] + sum(w['pss_mb'] for w in workers),
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python worker_memory.py <master_pid>")
+        sys.exit(1)
+
+    report = memory_report(int(sys.argv[1]))
+    print(f"{'pid':>8} {'rss MB':>10} {'pss MB':>10} {'uss MB':>10} {'shared MB':>10}")
+    for name, info in [('master', report['master'])] + [('worker', w) for w in report['workers']]:
+        print(f"{info['pid']:>8} {info['rss_mb']:>10.1f} {info['pss_mb']:>10.1f} {info['uss_mb']:>10.1f} {info['shared_mb']:>10.1f}  {name}")
+    print(f"\n📊 Total PSS: {report['total_pss_mb']:.1f} MB")
+    print(f"📈 Resident memory per additional worker (USS): {report['additional_mb_per_worker']:.1f} MB")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-replica model worker pool with CPU thread partitioning
+- N model replicas, each in its own process with a pinned torch thread count
+- Replicas are pinned to CPU sets spread across NUMA nodes
+- A dispatcher routes every request to the least-loaded replica
+- A replica that dies fails its pending requests at once and is respawned
+- With a shared cancel directory (cancellation.CancellationRegistry), a
+  request cancelled in the HTTP process also stops decoding in its replica
+"""
+
+import glob
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MONITOR_INTERVAL = 0.5
+
+
+def parse_cpulist(text):
+    """Parse a sysfs cpulist such as '0-3,8-11'"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def numa_cpu_sets():
+    """Return the usable CPUs grouped by NUMA node (one group if NUMA is unavailable)"""
+    allowed = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    nodes = []
+    for path in sorted(glob.glob('/sys/devices/system/node/node[0-9]*/cpulist')):
+        with open(path) as f:
+            cpus = [cpu for cpu in parse_cpulist(f.read()) if cpu in allowed]
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [allowed]
+
+
+def partition_cpus(replicas, threads_per_replica=None, nodes=None):
+    """Give every replica its own CPU set, spreading replicas across NUMA nodes
+
+    Replica i is placed on node i % n_nodes. If a node runs out of CPUs the
+    set is topped up from the other nodes; only when every CPU is taken do
+    replicas start to share CPUs.
+    """
+    nodes = nodes or numa_cpu_sets()
+    total = sum(len(cpus) for cpus in nodes)
+    threads_per_replica = threads_per_replica or max(1, total // replicas)
+
+    remaining = [list(cpus) for cpus in nodes]
+    fallback = itertools.cycle([cpu for cpus in nodes for cpu in cpus])
+    assignments = []
+
+    for index in range(replicas):
+        home = index % len(nodes)
+        cpus = []
+        for node in [home] + [n for n in range(len(nodes)) if n != home]:
+            while remaining[node] and len(cpus) < threads_per_replica:
+                cpus.append(remaining[node].pop(0))
+        while len(cpus) < threads_per_replica:
+            cpus.append(next(fallback))
+        assignments.append({'node': home, 'cpus': cpus, 'threads': threads_per_replica})
+
+    return assignments
+
+
+def _replica_main(index, cpus, threads, backend, cancel_dir, requests, results):
+    """Replica process: pin CPUs and threads, load the model, serve requests"""
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, set(cpus))
+
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    # Weights are first touched after pinning, so they land on the local NUMA node
+    from cancellation import CancellationRegistry
+    from teacher_model import VietnameseTeacherAI
+    teacher = VietnameseTeacherAI(backend=backend)
+    results.put(('ready', index, teacher.model is not None))
+    cancellations = CancellationRegistry(shared_dir=cancel_dir)
+
+    while True:
+        item = requests.get()
+        if item is None:
+            return
+        request_id, question, cancel_id, deadline = item
+        try:
+            # Same id as the HTTP request, so its cancel markers reach this replica
+            with cancellations.track(cancel_id, deadline) as cancel:
+                answer = teacher.generate_response(question, cancel=cancel)
+            results.put(('done', request_id, (answer, cancel.tokens_generated)))
+        except Exception as e:
+            results.put(('error', request_id, str(e)))
+
+
+class ModelWorkerPool:
+    """Route requests to N model replica processes"""
+
+    def __init__(self, replicas, threads_per_replica=None, backend=None, chat_log=None, cancel_dir=None):
+        self.assignments = partition_cpus(replicas, threads_per_replica)
+        self.backend = backend
+        self.chat_log = chat_log
+        self.cancel_dir = cancel_dir
+
+        # fork keeps app.py from being re-imported (and re-creating the pool) in every replica
+        self._ctx = mp.get_context('fork')
+        self._results = self._ctx.Queue()
+        self._replicas = []
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._collector = None
+        self._monitor = None
+        self._closing = False
+
+    def start(self, wait=True, timeout=600):
+        for index, assignment in enumerate(self.assignments):
+            self._replicas.append({
+                'ready': False,
+                'failed': False,
+                'in_flight': 0,
+                'served': 0,
+                'restarts': 0,
+                'pending': set(),
+                **assignment
+            })
+            self._spawn(index)
+            print(f"🧵 Replica {index}: node {assignment['node']}, {assignment['threads']} threads, CPUs {assignment['cpus']}")
+
+        self._collector = threading.Thread(target=self._collect, name="worker-pool-collector", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="worker-pool-monitor", daemon=True)
+        self._monitor.start()
+
+        if wait:
+            deadline = time.monotonic() + timeout
+            while self.ready_count() < len(self._replicas) and time.monotonic() < deadline:
+                time.sleep(0.2)
+        return self
+
+    def _spawn(self, index):
+        """Start (or restart) replica index with a fresh request queue"""
+        replica = self._replicas[index]
+        requests = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_replica_main,
+            args=(index, replica['cpus'], replica['threads'], self.backend, self.cancel_dir, requests, self._results),
+            name=f"teacher-replica-{index}",
+            daemon=True
+        )
+        process.start()
+        replica.update(process=process, requests=requests, ready=False, failed=False)
+
+    def _collect(self):
+        while True:
+            kind, key, payload = self._results.get()
+            if kind == 'ready':
+                self._replicas[key]['ready'] = payload
+                self._replicas[key]['failed'] = not payload
+                continue
+            with self._lock:
+                waiter = self._pending.pop(key, None)
+            if waiter is not None:
+                waiter['result'] = (kind, payload)
+                waiter['event'].set()
+
+    def _watch(self):
+        """Fail the requests of replicas that died and respawn the ones that had loaded"""
+        while not self._closing:
+            time.sleep(MONITOR_INTERVAL)
+            for index, replica in enumerate(self._replicas):
+                if self._closing or replica['process'].is_alive():
+                    continue
+                with self._lock:
+                    if replica['process'].is_alive():
+                        continue
+                    lost = [self._pending.pop(request_id, None) for request_id in replica['pending']]
+                    replica['pending'].clear()
+                    # A replica that never loaded would only die again
+                    respawn = replica['ready']
+                    replica['ready'] = False
+                    replica['failed'] = True
+                for waiter in lost:
+                    if waiter is not None:
+                        waiter['result'] = ('error', f"replica {index} died")
+                        waiter['event'].set()
+                if not respawn:
+                    continue
+                logger.warning("Replica %d died (exit code %s), %d requests failed; respawning",
+                               index, replica['process'].exitcode, len(lost))
+                with self._lock:
+                    replica['restarts'] += 1
+                    self._spawn(index)
+
+    def ready_count(self):
+        return sum(1 for replica in self._replicas if replica['ready'])
+
+    def failed_count(self):
+        """Replicas that reported a failed load or whose process died"""
+        return sum(1 for replica in self._replicas
+                   if replica['failed'] or not replica['process'].is_alive())
+
+    def _pick_replica(self):
+        """Least in-flight requests first, then least served; None if no replica is ready and alive"""
+        candidates = [r for r in self._replicas if r['ready'] and r['process'].is_alive()]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r['in_flight'], r['served']))
+
+    def generate_response(self, question, timeout=120, cancel=None):
+        """Answer from the least-loaded replica; the replica decodes under cancel's request id
+        and deadline (cancellable through cancel_dir), and cancel gets tokens_generated back"""
+        request_id = next(self._request_ids)
+        waiter = {'event': threading.Event(), 'result': None}
+
+        with self._lock:
+            replica = self._pick_replica()
+            if replica is None:
+                return "Xin lỗi, AI giáo viên hiện tại không khả dụng."
+            replica['in_flight'] += 1
+            replica['pending'].add(request_id)
+            self._pending[request_id] = waiter
+            replica['requests'].put((request_id, question,
+                                     cancel.request_id if cancel is not None else None,
+                                     cancel.deadline if cancel is not None else None))
+
+        finished = waiter['event'].wait(timeout)
+        with self._lock:
+            replica['in_flight'] -= 1
+            replica['served'] += 1
+            replica['pending'].discard(request_id)
+            self._pending.pop(request_id, None)
+
+        if not finished:
+            return "Xin lỗi, AI giáo viên đang quá tải. Em thử lại sau nhé!"
+        kind, payload = waiter['result']
+        if kind == 'error':
+            return f"Xin lỗi, có lỗi xảy ra khi tạo phản hồi: {payload}"
+        payload, tokens_generated = payload
+        if cancel is not None:
+            cancel.tokens_generated = tokens_generated
+        if self.chat_log is not None:
+            self.chat_log.log(question, payload)
+        return payload
+
+    def stats(self):
+        return [{
+            'replica': index,
+            'alive': replica['process'].is_alive(),
+            'ready': replica['ready'],
+            'failed': replica['failed'],
+            'node': replica['node'],
+            'threads': replica['threads'],
+            'cpus': replica['cpus'],
+            'in_flight': replica['in_flight'],
+            'served': replica['served'],
+            'restarts': replica['restarts'],
+        } for index, replica in enumerate(self._replicas)]
+
+    def close(self, timeout=10):
+        self._closing = True
+        for replica in self._replicas:
+            try:
+                replica['requests'].put_nowait(None)
+            except queue.Full:
+                pass
+        for replica in self._replicas:
+            replica['process'].join(timeout)
+            if replica['process'].is_alive():
+                replica['process'].terminate()
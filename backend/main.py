@@ -1,9 +1,11 @@
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+import asyncio
 import requests
 import os
 import tempfile
+import uuid
 from typing import List, Optional
 from dotenv import load_dotenv
 
@@ -36,6 +38,52 @@ app.add_middleware(
 # AI Service URLs
 AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://ai:5000")
 WHISPER_SERVICE_URL = os.getenv("WHISPER_SERVICE_URL", "http://localhost:5001")
+AI_TIMEOUT = 30
+
+async def call_ai_chat(http_request: Request, text: str, priority: str = "interactive") -> requests.Response:
+    """
+    Call the AI service /chat, cancelling the generation there if our client disconnects.
+    The AI service also stops on its own once X-Request-Timeout-Ms (our timeout, relative so
+    clock skew between the hosts does not matter) runs out.
+
+    requests is blocking, so the call runs in a worker thread that cannot be interrupted:
+    after a disconnect that thread keeps waiting until the AI service answers the
+    cancelled request (normally right away with 499), at most AI_TIMEOUT seconds.
+    """
+    request_id = uuid.uuid4().hex
+    headers = {
+        "X-Request-Id": request_id,
+        "X-Request-Timeout-Ms": str(int(AI_TIMEOUT * 1000))
+    }
+    call = asyncio.ensure_future(asyncio.to_thread(
+        requests.post, f"{AI_SERVICE_URL}/chat", json={"message": text, "priority": priority},
+        headers=headers, timeout=AI_TIMEOUT
+    ))
+    while True:
+        done, _ = await asyncio.wait({call}, timeout=0.5)
+        if done:
+            return call.result()
+        if await http_request.is_disconnected():
+            try:
+                await asyncio.to_thread(
+                    requests.post, f"{AI_SERVICE_URL}/chat/cancel", json={"request_id": request_id}, timeout=2
+                )
+            except requests.RequestException:
+                pass
+            raise HTTPException(status_code=499, detail="Client disconnected")
+
+def raise_for_ai_status(response: requests.Response):
+    """Pass the AI service's overload (503) and deadline (504) errors through, anything else is a 500"""
+    if response.status_code == 200:
+        return
+    if response.status_code in (503, 504):
+        headers = {"Retry-After": response.headers["Retry-After"]} if "Retry-After" in response.headers else None
+        try:
+            detail = response.json().get("error", "AI service unavailable")
+        except ValueError:
+            detail = "AI service unavailable"
+        raise HTTPException(status_code=response.status_code, detail=detail, headers=headers)
+    raise HTTPException(status_code=500, detail="AI service error")
 
 @app.get("/")
 async def root():
@@ -46,20 +94,14 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage, db: Session = Depends(get_db)):
+async def chat(message: ChatMessage, http_request: Request, db: Session = Depends(get_db)):
     """
     Chat endpoint that communicates with PhoGPT AI service
     """
     try:
         # Call AI service
-        response = requests.post(
-            f"{AI_SERVICE_URL}/chat",
-            json={"message": message.message},
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="AI service error")
+        response = await call_ai_chat(http_request, message.message)
+        raise_for_ai_status(response)
         
         ai_response = response.json()
         
@@ -96,6 +138,8 @@ async def chat(message: ChatMessage, db: Session = Depends(get_db)):
             conversation_id=conversation_id
         )
         
+    except HTTPException:
+        raise
     except requests.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to connect to AI service: {str(e)}")
     except Exception as e:
@@ -134,6 +178,7 @@ def process_educational_response(user_message: str, ai_response: str) -> dict:
 
 @app.post("/api/voice-chat")
 async def voice_chat(
+    http_request: Request,
     audio: UploadFile = File(...),
     language: str = Form("vi"),
     detect_accent: bool = Form(False),
@@ -175,14 +220,9 @@ async def voice_chat(
                 raise HTTPException(status_code=400, detail="No speech detected")
             
             # Call AI service with transcribed text
-            ai_response = requests.post(
-                f"{AI_SERVICE_URL}/chat",
-                json={"message": transcribed_text},
-                timeout=30
-            )
-            
-            if ai_response.status_code != 200:
-                raise HTTPException(status_code=500, detail="AI service error")
+            # A learner is waiting on speech: served ahead of typed chat
+            ai_response = await call_ai_chat(http_request, transcribed_text, priority="voice")
+            raise_for_ai_status(ai_response)
             
             ai_result = ai_response.json()
             
@@ -202,6 +242,8 @@ async def voice_chat(
             if os.path.exists(temp_filename):
                 os.unlink(temp_filename)
     
+    except HTTPException:
+        raise
     except requests.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Service communication error: {str(e)}")
     except Exception as e:
@@ -70,6 +70,12 @@ setup_ai_service() {
         $PYTHON_CMD download_model.py
     fi
     
+    # Optional weight-only quantized checkpoint (PHOGPT_QUANT=int8 or int4)
+    if [ -n "$PHOGPT_QUANT" ]; then
+        echo "🗜️  Converting PhoGPT-4B to $PHOGPT_QUANT..."
+        $PYTHON_CMD quantize_phogpt.py convert "$PHOGPT_QUANT"
+    fi
+    
     deactivate
     echo "✅ AI Service setup complete!"
 }